@@ -0,0 +1 @@
+"""NekoShelf 基准测试 (合成书库 + 关键路径计时)，用法见 benchmarks/run.py"""
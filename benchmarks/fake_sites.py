@@ -0,0 +1,633 @@
+"""Kemono / Pixiv 替身服务器
+
+在本地实现下载插件用到的接口，让插件 (以及 pull) 完全离线地跑压测：
+
+  Kemono  /api/v1/{service}/user/{id}/posts?o=N   每页 50 帖，越界时返回 400 (与真站一致)
+          /api/v1/{service}/user/{id}/profile
+          /api/v1/{service}/user/{id}/post/{post_id}
+          /{service}/user/{id}                     作者主页 HTML (Profile 接口失败时的回退)
+          /data/ab/cd/<sha256>.zip|.jpg            附件 (整包 zip + 逐页图片)，内容的 SHA-256 与路径一致，插件的哈希校验能通过
+  Pixiv   /ajax/user/{id}?full=1  /ajax/user/{id}/profile/all  /ajax/user/{id}/profile/illusts?ids[]=...
+          /ajax/illust/{id}  /ajax/illust/{id}/pages  /ajax/novel/{id}  /users/{id}
+          /img-original/img/.../{id}_p{n}.jpg      原图，由 /pages 返回的地址指向本服务器
+  控制    /__stats                                 请求数、状态码、发送字节数 (不受延迟/限流影响)
+
+所有作者、作品、图片都由种子确定：同样的参数每次生成完全相同的内容。
+可以注入固定延迟 (加随机抖动)、按比例或按每秒请求数返回 429、限制总带宽；附件支持 Range (206/416)，
+大文件能走插件的分段下载。
+
+用法:
+  python -m benchmarks.fake_sites [--port=8765] [--latency=30] [--rate-429=0.05] [--bandwidth=2048] ...
+
+然后把插件指过去 (config.py 也读这两个环境变量)：
+  NEKOSHELF_KEMONO_BASE_URL=http://127.0.0.1:8765 NEKOSHELF_PIXIV_BASE_URL=http://127.0.0.1:8765 python main.py
+订阅链接照常用真实站点的写法 (https://kemono.cr/patreon/user/100000、https://www.pixiv.net/users/200000)。
+"""
+
+import argparse
+import hashlib
+import html
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+import urllib.parse
+import zipfile
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from .synth import FILLER, FIXED_TIME, TAGS, WORDS_A, WORDS_B, _author_name, _noise_jpeg, _title
+
+KEMONO_SERVICE = "patreon"
+KEMONO_PAGE = 50
+KEMONO_FIRST_ID = 100000
+PIXIV_FIRST_ID = 200000
+PUBLISHED = "2024-01-01T00:00:00"
+# 帖子/作品 ID = 作者 ID * ID_STRIDE + 序号，由作品 ID 就能找回作者
+ID_STRIDE = 10000
+
+DEFAULTS = {
+    "seed": 42,
+    "kemono_users": 4,  # Kemono 作者数
+    "kemono_posts": 60,  # 每位 Kemono 作者的帖子数
+    "pixiv_users": 4,  # Pixiv 作者数
+    "pixiv_works": 30,  # 每位 Pixiv 作者的作品数 (插画/漫画/小说混合)
+    "max_pages": 6,  # 每个帖子/作品最多几张图
+    "image_width": 256,  # 图片尺寸，控制附件大小
+    "image_height": 384,
+    "latency_ms": 0.0,  # 每个请求的固定延迟
+    "jitter_ms": 0.0,  # 在固定延迟上再加 0~jitter 的随机延迟
+    "rate_429": 0.0,  # 随机返回 429 的比例 (0~1)
+    "max_rps": 0.0,  # 每秒请求数超过该值时返回 429，0 表示不限
+    "bandwidth_kbps": 0.0,  # 所有连接共享的总带宽 (KB/s)，0 表示不限
+}
+
+
+class _Throttle:
+    """所有连接共享的发送带宽：每次发送按字节数占用一段虚拟时间，超前了就睡到该发的时候"""
+
+    def __init__(self, bytes_per_sec: float):
+        self.rate = float(bytes_per_sec)
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def consume(self, n: int):
+        if self.rate <= 0 or n <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._next = max(now, self._next) + n / self.rate
+            wait = self._next - now
+        if wait > 0:
+            time.sleep(wait)
+
+
+class FakeWorld:
+    """按种子生成的作者/作品数据；同一作者只生成一次，附件内容按路径登记"""
+
+    def __init__(self, opts: Dict):
+        self.opts = opts
+        self.seed = int(opts["seed"])
+        self._lock = threading.Lock()
+        self._kemono: Dict[str, Dict] = {}
+        self._pixiv: Dict[str, Dict] = {}
+        self._blobs: Dict[str, bytes] = {}
+        names = set()
+        rng = random.Random(f"{self.seed}:names")
+        self.kemono_names = [_author_name(rng, names) for _ in range(int(opts["kemono_users"]))]
+        self.pixiv_names = [_author_name(rng, names) for _ in range(int(opts["pixiv_users"]))]
+
+    def _rng(self, *key) -> random.Random:
+        return random.Random(":".join(str(k) for k in (self.seed,) + key))
+
+    def _image(self, rng: random.Random) -> bytes:
+        return _noise_jpeg(rng, int(self.opts["image_width"]), int(self.opts["image_height"]))
+
+    @staticmethod
+    def _zip(pages: List[bytes]) -> bytes:
+        out = io.BytesIO()
+        with zipfile.ZipFile(out, "w", zipfile.ZIP_STORED) as zf:
+            stamp = tuple(FIXED_TIME[:6])
+            for n, data in enumerate(pages):
+                zf.writestr(zipfile.ZipInfo(f"{n + 1:03d}.jpg", stamp), data)
+        return out.getvalue()
+
+    @staticmethod
+    def _file_entry(name: str, data: bytes) -> Dict:
+        digest = hashlib.sha256(data).hexdigest()
+        ext = os.path.splitext(name)[1]
+        return {"name": name, "path": f"/data/{digest[:2]}/{digest[2:4]}/{digest}{ext}", "_data": data}
+
+    def _text(self, rng: random.Random, paragraphs: int) -> List[str]:
+        return ["".join(rng.choice(FILLER) for _ in range(rng.randint(40, 160))) + "。" for _ in range(paragraphs)]
+
+    def _tags(self, rng: random.Random) -> List[str]:
+        return [t.lstrip("#") for t in rng.sample(TAGS, rng.randint(1, 5))]
+
+    # ---- Kemono ----
+
+    def kemono_user_ids(self) -> List[str]:
+        return [str(KEMONO_FIRST_ID + i) for i in range(len(self.kemono_names))]
+
+    def kemono_user(self, user_id: str) -> Optional[Dict]:
+        idx = int(user_id) - KEMONO_FIRST_ID if user_id.isdigit() else -1
+        if not 0 <= idx < len(self.kemono_names):
+            return None
+        with self._lock:
+            user = self._kemono.get(user_id)
+        if user is not None:
+            return user
+
+        posts = []
+        for k in range(int(self.opts["kemono_posts"])):
+            rng = self._rng("kemono", user_id, k)
+            post_id = str(int(user_id) * ID_STRIDE + k)
+            pages = [self._image(rng) for _ in range(rng.randint(1, max(1, int(self.opts["max_pages"]))))]
+            # 和真站常见的帖子一样：主文件是整包 zip (attachment 模式下载它)，逐页图片作为附件 (image 模式下载它们)
+            files = [self._file_entry(f"{post_id}.zip", self._zip(pages))]
+            files += [self._file_entry(f"{n + 1:02d}.jpg", data) for n, data in enumerate(pages)]
+            paragraphs = "".join(f"<p>{p}</p>" for p in self._text(rng, rng.randint(1, 4)))
+            posts.append({
+                "id": post_id,
+                "user": user_id,
+                "service": KEMONO_SERVICE,
+                "title": _title(rng),
+                "content": paragraphs,
+                "published": PUBLISHED,
+                "file": files[0],
+                "attachments": files[1:],
+            })
+        # 接口按发布时间倒序返回：编号大的是新帖
+        posts.reverse()
+        user = {"id": user_id, "name": self.kemono_names[idx], "service": KEMONO_SERVICE, "posts": posts}
+        with self._lock:
+            for post in posts:
+                for f in [post["file"]] + post["attachments"]:
+                    self._blobs[f["path"]] = f.pop("_data")
+            self._kemono.setdefault(user_id, user)
+            return self._kemono[user_id]
+
+    def kemono_post(self, user_id: str, post_id: str) -> Optional[Dict]:
+        user = self.kemono_user(user_id)
+        if user is None:
+            return None
+        return next((p for p in user["posts"] if p["id"] == post_id), None)
+
+    def blob(self, path: str) -> Optional[bytes]:
+        with self._lock:
+            return self._blobs.get(path)
+
+    # ---- Pixiv ----
+
+    def pixiv_user_ids(self) -> List[str]:
+        return [str(PIXIV_FIRST_ID + i) for i in range(len(self.pixiv_names))]
+
+    def pixiv_user(self, user_id: str) -> Optional[Dict]:
+        idx = int(user_id) - PIXIV_FIRST_ID if user_id.isdigit() else -1
+        if not 0 <= idx < len(self.pixiv_names):
+            return None
+        with self._lock:
+            user = self._pixiv.get(user_id)
+        if user is not None:
+            return user
+
+        works = {}
+        for k in range(int(self.opts["pixiv_works"])):
+            rng = self._rng("pixiv", user_id, k)
+            kind = rng.choices(("illusts", "manga", "novels"), weights=(0.5, 0.2, 0.3))[0]
+            wid = str(int(user_id) * ID_STRIDE + k)
+            works[wid] = {
+                "id": wid,
+                "kind": kind,
+                "title": _title(rng),
+                "userId": user_id,
+                "userName": self.pixiv_names[idx],
+                "tags": self._tags(rng),
+                "createDate": "2024-01-02T03:04:05+09:00",
+                "pageCount": rng.randint(1, max(1, int(self.opts["max_pages"]))) if kind != "novels" else 0,
+                "seed": rng.getrandbits(32),
+            }
+        user = {"id": user_id, "name": self.pixiv_names[idx], "works": works}
+        with self._lock:
+            self._pixiv.setdefault(user_id, user)
+            return self._pixiv[user_id]
+
+    def pixiv_work(self, work_id: str) -> Optional[Dict]:
+        if not work_id.isdigit():
+            return None
+        user = self.pixiv_user(str(int(work_id) // ID_STRIDE))
+        return user["works"].get(work_id) if user else None
+
+    def novel_text(self, work: Dict) -> str:
+        rng = random.Random(work["seed"])
+        chapters = []
+        for n in range(rng.randint(1, 5)):
+            chapters.append(f"第{n + 1}章 {rng.choice(WORDS_A)}{rng.choice(WORDS_B)}\n\n" + "\n".join(self._text(rng, rng.randint(5, 20))))
+        return "\n\n".join(chapters)
+
+    def page_image(self, work_id: str, page: int) -> Optional[bytes]:
+        work = self.pixiv_work(work_id)
+        if work is None or work["kind"] == "novels" or not 0 <= page < work["pageCount"]:
+            return None
+        path = f"pixiv:{work_id}:{page}"
+        data = self.blob(path)
+        if data is None:
+            data = self._image(self._rng("pixiv-page", work_id, page))
+            with self._lock:
+                self._blobs[path] = data
+        return data
+
+
+def _pixiv_ok(body) -> Dict:
+    return {"error": False, "message": "", "body": body}
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """解析单段 Range (bytes=a-b / a- / -n)，返回闭区间；范围无法满足时返回 None"""
+    m = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header)
+    if not m.group(1):
+        n = int(m.group(2))
+        return (max(0, size - n), size - 1) if n > 0 and size > 0 else None
+    start = int(m.group(1))
+    end = int(m.group(2)) if m.group(2) else size - 1
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "NekoFakeSites/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def do_HEAD(self):
+        self._handle(head=True)
+
+    def do_GET(self):
+        self._handle(head=False)
+
+    # ---- 响应 ----
+
+    def _send(self, status: int, body: bytes, ctype: str, head: bool = False, headers: Optional[Dict] = None):
+        self.server.count(status=status)
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if head or not body:
+            return
+        chunk = 64 * 1024
+        try:
+            for i in range(0, len(body), chunk):
+                part = body[i:i + chunk]
+                self.server.throttle.consume(len(part))
+                self.wfile.write(part)
+                self.server.count(sent=len(part))
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _json(self, data, status: int = 200, head: bool = False):
+        self._send(status, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8", head)
+
+    def _html(self, text: str, status: int = 200, head: bool = False):
+        self._send(status, text.encode("utf-8"), "text/html; charset=utf-8", head)
+
+    def _not_found(self, head: bool = False):
+        self._json({"error": "not found"}, 404, head)
+
+    def _file(self, data: bytes, head: bool, ctype: str = "image/jpeg"):
+        size = len(data)
+        rng = self.headers.get("Range") or ""
+        # 多段或写法不认识的 Range 按忽略处理，返回完整内容 (与常见 CDN 一致)
+        if not re.fullmatch(r"\s*bytes=(\d+-\d*|-\d+)\s*", rng):
+            self._send(200, data, ctype, head, {"Accept-Ranges": "bytes"})
+            return
+        span = _parse_range(rng, size)
+        if span is None:
+            self._send(416, b"", ctype, head, {"Content-Range": f"bytes */{size}", "Accept-Ranges": "bytes"})
+            return
+        start, end = span
+        self._send(206, data[start:end + 1], ctype, head, {
+            "Content-Range": f"bytes {start}-{end}/{size}",
+            "Accept-Ranges": "bytes",
+        })
+
+    # ---- 路由 ----
+
+    def _handle(self, head: bool):
+        url = urllib.parse.urlsplit(self.path)
+        path = url.path
+        query = urllib.parse.parse_qs(url.query)
+        if path == "/__stats":
+            self._json(self.server.stats(), head=head)
+            return
+
+        self.server.count(route=self._route_name(path))
+        self.server.delay()
+        if self.server.should_throttle():
+            self._send(429, b'{"error": "Too Many Requests"}', "application/json", head, {"Retry-After": "1"})
+            return
+
+        try:
+            self._dispatch(path, query, head)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    @staticmethod
+    def _route_name(path: str) -> str:
+        if path.startswith("/data/") or path.startswith("/img-original/"):
+            return "file"
+        if path.startswith("/api/v1/"):
+            return "kemono_api"
+        if path.startswith("/ajax/"):
+            return "pixiv_api"
+        return "html"
+
+    def _dispatch(self, path: str, query: Dict, head: bool):
+        world = self.server.world
+
+        # ---- Kemono ----
+        if m := re.fullmatch(r"/api/v1/(\w+)/user/(\d+)/posts", path):
+            user = world.kemono_user(m.group(2))
+            if user is None or m.group(1) != KEMONO_SERVICE:
+                return self._not_found(head)
+            try:
+                offset = int((query.get("o") or ["0"])[0])
+            except ValueError:
+                offset = -1
+            if offset < 0 or offset % KEMONO_PAGE or (offset and offset >= len(user["posts"])):
+                return self._json({"error": "Offset provided which is not a multiple of 50 or out of range"}, 400, head)
+            return self._json(user["posts"][offset:offset + KEMONO_PAGE], head=head)
+
+        if m := re.fullmatch(r"/api/v1/(\w+)/user/(\d+)/profile", path):
+            user = world.kemono_user(m.group(2))
+            if user is None or m.group(1) != KEMONO_SERVICE:
+                return self._not_found(head)
+            return self._json({
+                "id": user["id"], "name": user["name"], "service": user["service"],
+                "indexed": PUBLISHED, "updated": PUBLISHED, "post_count": len(user["posts"]),
+            }, head=head)
+
+        if m := re.fullmatch(r"/api/v1/(\w+)/user/(\d+)/post/(\d+)", path):
+            post = world.kemono_post(m.group(2), m.group(3)) if m.group(1) == KEMONO_SERVICE else None
+            if post is None:
+                return self._not_found(head)
+            return self._json({"post": post, "attachments": [], "previews": []}, head=head)
+
+        if path.startswith("/data/"):
+            data = world.blob(path)
+            if data is None:
+                return self._not_found(head)
+            return self._file(data, head, "application/zip" if path.endswith(".zip") else "image/jpeg")
+
+        # ---- Pixiv ----
+        if path == "/ajax/user/extra":
+            return self._json(_pixiv_ok({"following": 0, "followers": 0, "mypixivCount": 0}), head=head)
+
+        if m := re.fullmatch(r"/ajax/user/(\d+)/profile/all", path):
+            user = world.pixiv_user(m.group(1))
+            if user is None:
+                return self._json({"error": True, "message": "User not found", "body": []}, 404, head)
+            body = {"illusts": {}, "manga": {}, "novels": {}}
+            for wid, work in user["works"].items():
+                body[work["kind"]][wid] = None
+            return self._json(_pixiv_ok(body), head=head)
+
+        if m := re.fullmatch(r"/ajax/user/(\d+)/profile/illusts", path):
+            user = world.pixiv_user(m.group(1))
+            if user is None:
+                return self._json({"error": True, "message": "User not found", "body": []}, 404, head)
+            works = {}
+            for wid in query.get("ids[]", []):
+                work = user["works"].get(wid)
+                if work and work["kind"] != "novels":
+                    works[wid] = {
+                        "id": wid, "title": work["title"], "userId": work["userId"], "userName": work["userName"],
+                        "tags": work["tags"], "pageCount": work["pageCount"], "createDate": work["createDate"],
+                        "description": "",
+                    }
+            return self._json(_pixiv_ok({"works": works, "extraData": {}}), head=head)
+
+        if m := re.fullmatch(r"/ajax/user/(\d+)", path):
+            user = world.pixiv_user(m.group(1))
+            if user is None:
+                return self._json({"error": True, "message": "User not found", "body": []}, 404, head)
+            return self._json(_pixiv_ok({"userId": user["id"], "name": user["name"]}), head=head)
+
+        if m := re.fullmatch(r"/ajax/illust/(\d+)(/pages)?", path):
+            work = world.pixiv_work(m.group(1))
+            if work is None or work["kind"] == "novels":
+                return self._json({"error": True, "message": "Work not found", "body": []}, 404, head)
+            if m.group(2):
+                base = self.server.url
+                pages = [{
+                    "urls": {"original": f"{base}/img-original/img/2024/01/02/03/04/05/{work['id']}_p{n}.jpg"},
+                    "width": world.opts["image_width"],
+                    "height": world.opts["image_height"],
+                } for n in range(work["pageCount"])]
+                return self._json(_pixiv_ok(pages), head=head)
+            return self._json(_pixiv_ok({
+                "illustId": work["id"], "title": work["title"], "description": "", "userId": work["userId"],
+                "userName": work["userName"], "createDate": work["createDate"], "uploadDate": work["createDate"],
+                "pageCount": work["pageCount"], "illustType": 1 if work["kind"] == "manga" else 0,
+                "tags": {"tags": [{"tag": t} for t in work["tags"]]}, "seriesNavData": None,
+            }), head=head)
+
+        if m := re.fullmatch(r"/ajax/novel/(\d+)", path):
+            work = world.pixiv_work(m.group(1))
+            if work is None or work["kind"] != "novels":
+                return self._json({"error": True, "message": "Work not found", "body": []}, 404, head)
+            return self._json(_pixiv_ok({
+                "id": work["id"], "title": work["title"], "description": "", "userId": work["userId"],
+                "userName": work["userName"], "createDate": work["createDate"], "uploadDate": work["createDate"],
+                "content": world.novel_text(work), "tags": {"tags": [{"tag": t} for t in work["tags"]]},
+                "seriesNavData": None,
+            }), head=head)
+
+        if m := re.fullmatch(r"/img-original/img/.+/(\d+)_p(\d+)\.jpg", path):
+            data = world.page_image(m.group(1), int(m.group(2)))
+            return self._file(data, head) if data is not None else self._not_found(head)
+
+        if m := re.fullmatch(r"/users/(\d+)", path):
+            user = world.pixiv_user(m.group(1))
+            if user is None:
+                return self._html("<html><title>pixiv</title></html>", 404, head)
+            name = html.escape(user["name"])
+            return self._html(f'<html><head><meta property="og:title" content="{name} - pixiv"><title>{name} - pixiv</title></head></html>', head=head)
+
+        # ---- Kemono 作者主页 (放最后：/{service}/user/{id} 的写法最宽) ----
+        if m := re.fullmatch(r"/(\w+)/user/(\d+)", path):
+            user = world.kemono_user(m.group(2)) if m.group(1) == KEMONO_SERVICE else None
+            if user is None:
+                return self._html("<html><title>Kemono</title></html>", 404, head)
+            name = html.escape(user["name"])
+            return self._html(f'<html><head><meta name="artist_name" content="{name}"><title>{name} | Kemono</title></head></html>', head=head)
+
+        return self._not_found(head)
+
+
+class FakeSitesServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), verbose: bool = False, **opts):
+        unknown = set(opts) - set(DEFAULTS)
+        if unknown:
+            raise TypeError(f"未知的选项: {', '.join(sorted(unknown))}")
+        self.opts = dict(DEFAULTS, **opts)
+        if not 0 <= int(self.opts["kemono_posts"]) < ID_STRIDE or not 0 <= int(self.opts["pixiv_works"]) < ID_STRIDE:
+            raise ValueError(f"每位作者的帖子/作品数必须小于 {ID_STRIDE}")
+        self.verbose = verbose
+        self.world = FakeWorld(self.opts)
+        self.throttle = _Throttle(float(self.opts["bandwidth_kbps"]) * 1024)
+        self._stats_lock = threading.Lock()
+        self._routes = Counter()
+        self._statuses = Counter()
+        self._sent = 0
+        self._fault_rng = random.Random(f"{self.opts['seed']}:faults")
+        self._window = []
+        self._thread = None
+        super().__init__(address, _Handler)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """让插件指向本服务器的环境变量"""
+        return {"NEKOSHELF_KEMONO_BASE_URL": self.url, "NEKOSHELF_PIXIV_BASE_URL": self.url}
+
+    def subscription_urls(self) -> List[str]:
+        """所有作者的真实站点链接 (订阅、下载时照常使用，插件按上面的环境变量把请求发到本服务器)"""
+        return [f"https://kemono.cr/{KEMONO_SERVICE}/user/{uid}" for uid in self.world.kemono_user_ids()] + \
+            [f"https://www.pixiv.net/users/{uid}" for uid in self.world.pixiv_user_ids()]
+
+    # ---- 故障注入 ----
+
+    def delay(self):
+        latency = float(self.opts["latency_ms"])
+        jitter = float(self.opts["jitter_ms"])
+        if jitter > 0:
+            with self._stats_lock:
+                latency += self._fault_rng.uniform(0, jitter)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+    def should_throttle(self) -> bool:
+        rate = float(self.opts["rate_429"])
+        max_rps = float(self.opts["max_rps"])
+        with self._stats_lock:
+            if rate > 0 and self._fault_rng.random() < rate:
+                return True
+            if max_rps > 0:
+                now = time.monotonic()
+                self._window = [t for t in self._window if now - t < 1.0]
+                if len(self._window) >= max_rps:
+                    return True
+                self._window.append(now)
+        return False
+
+    # ---- 统计 ----
+
+    def count(self, route: Optional[str] = None, status: Optional[int] = None, sent: int = 0):
+        with self._stats_lock:
+            if route:
+                self._routes[route] += 1
+            if status:
+                self._statuses[str(status)] += 1
+            self._sent += sent
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                "requests": sum(self._routes.values()),
+                "routes": dict(self._routes),
+                "statuses": dict(self._statuses),
+                "bytes_sent": self._sent,
+            }
+
+    # ---- 后台运行 ----
+
+    def start(self) -> "FakeSitesServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="neko-fake-sites", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def start(host: str = "127.0.0.1", port: int = 0, verbose: bool = False, **opts) -> FakeSitesServer:
+    """在后台线程启动替身服务器 (port=0 时随机分配端口)，用完调用 stop()"""
+    return FakeSitesServer((host, port), verbose=verbose, **opts).start()
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    """替身服务器的数据规模与故障注入选项 (python -m benchmarks pull 共用)"""
+    parser.add_argument("--seed", type=int, default=DEFAULTS["seed"], help="随机种子，相同种子生成相同内容")
+    parser.add_argument("--kemono-users", type=int, default=DEFAULTS["kemono_users"], help="Kemono 作者数")
+    parser.add_argument("--kemono-posts", type=int, default=DEFAULTS["kemono_posts"], help="每位 Kemono 作者的帖子数")
+    parser.add_argument("--pixiv-users", type=int, default=DEFAULTS["pixiv_users"], help="Pixiv 作者数")
+    parser.add_argument("--pixiv-works", type=int, default=DEFAULTS["pixiv_works"], help="每位 Pixiv 作者的作品数")
+    parser.add_argument("--max-pages", type=int, default=DEFAULTS["max_pages"], help="每个帖子/作品最多几张图")
+    parser.add_argument("--latency", type=float, default=DEFAULTS["latency_ms"], help="每个请求的固定延迟 (毫秒)")
+    parser.add_argument("--jitter", type=float, default=DEFAULTS["jitter_ms"], help="额外的随机延迟上限 (毫秒)")
+    parser.add_argument("--rate-429", type=float, default=DEFAULTS["rate_429"], help="随机返回 429 的比例 (0~1)")
+    parser.add_argument("--max-rps", type=float, default=DEFAULTS["max_rps"], help="每秒请求数上限，超出返回 429 (0 不限)")
+    parser.add_argument("--bandwidth", type=float, default=DEFAULTS["bandwidth_kbps"], help="总带宽上限 (KB/s，0 不限)")
+
+
+def server_options(args) -> Dict:
+    return {
+        "seed": args.seed,
+        "kemono_users": args.kemono_users,
+        "kemono_posts": args.kemono_posts,
+        "pixiv_users": args.pixiv_users,
+        "pixiv_works": args.pixiv_works,
+        "max_pages": args.max_pages,
+        "latency_ms": args.latency,
+        "jitter_ms": args.jitter,
+        "rate_429": args.rate_429,
+        "max_rps": args.max_rps,
+        "bandwidth_kbps": args.bandwidth,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.fake_sites", description="本地 Kemono / Pixiv 替身服务器")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址 (默认 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口 (默认 8765)")
+    parser.add_argument("--verbose", action="store_true", help="打印每个请求")
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = FakeSitesServer((args.host, args.port), verbose=args.verbose, **server_options(args))
+    print(f"替身服务器已启动: {server.url}  (统计: {server.url}/__stats)")
+    for k, v in server.env().items():
+        print(f"  export {k}={v}")
+    print("订阅链接:")
+    for u in server.subscription_urls():
+        print(f"  {u}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,142 @@
+"""pull 吞吐基准 (离线)
+
+启动本地替身服务器 (fake_sites)，插件通过 NEKOSHELF_KEMONO_BASE_URL / NEKOSHELF_PIXIV_BASE_URL 指过去，
+在临时书库里订阅全部假作者后计时：
+
+  pull        首次 pull，所有作品都是新的：列表 → 下载 → 打包 → 导入的完整流水线
+  pull_noop   再 pull 一次，没有新作品：只剩列表请求和下载记录比对的开销 (重复 R 次)
+
+用法:
+  python -m benchmarks pull [--kemono-users=4] [--kemono-posts=60] [--pixiv-users=4] [--pixiv-works=30]
+                            [--latency=30] [--jitter=0] [--rate-429=0] [--max-rps=0] [--bandwidth=0]
+                            [--repeat=R] [--workdir=目录] [--keep] [--output=结果.json]
+
+结果格式与 python -m benchmarks 相同，可以直接用 compare 对比。插件自带的礼貌间隔 (翻页等待、
+提交错峰) 照常生效，计入耗时；它们本来就是 pull 真实耗时的一部分。
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict
+
+from . import fake_sites
+from .run import ROOT, _dir_size, _git_commit, _log, _log_result, _result, _timed
+
+
+def run(args) -> Dict:
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="neko_bench_pull_")
+    os.makedirs(workdir, exist_ok=True)
+    db_path = os.path.join(workdir, "library.db")
+    library_dir = os.path.join(workdir, "library")
+    if os.path.exists(db_path) or os.path.exists(library_dir):
+        raise SystemExit(f"{workdir} 里已经有书库了，换一个空目录喵")
+
+    server = fake_sites.start(**fake_sites.server_options(args))
+    # 配置在 core 导入时读取环境变量，必须先设好
+    os.environ.update(server.env())
+    os.environ["NEKOSHELF_DB_PATH"] = db_path
+    os.environ["NEKOSHELF_LIBRARY_PATH"] = library_dir
+    os.environ["NEKOSHELF_TRACE_FILE"] = ""
+    sys.path.insert(0, ROOT)
+    old_cwd = os.getcwd()
+    os.chdir(workdir)
+
+    from core import config
+    from core.cli import MoeCLI
+    from core.download_service import DownloadImportService
+
+    report = {
+        "meta": {
+            "version": config.VERSION,
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "params": dict(fake_sites.server_options(args), repeat=args.repeat),
+        },
+        "library": {},
+        "results": {},
+    }
+    results = report["results"]
+
+    try:
+        cli = MoeCLI()
+        urls = server.subscription_urls()
+        for url in urls:
+            cli.db.add_subscription(url)
+        svc = DownloadImportService(cli.db, cli.fm)
+        summaries = []
+
+        def pull():
+            summaries.append(svc.pull_subscriptions(force_all=True))
+
+        before = server.stats()
+        runs = _timed(pull, 1)
+        after = server.stats()
+        first = summaries[-1]
+        results["pull"] = _result(
+            runs,
+            items=first["downloaded"] or None,
+            subscriptions=len(urls),
+            downloaded=first["downloaded"],
+            failed=first["failed"],
+            requests=after["requests"] - before["requests"],
+            bytes=after["bytes_sent"] - before["bytes_sent"],
+            mb_per_s=round((after["bytes_sent"] - before["bytes_sent"]) / 1024 / 1024 / max(runs[0], 1e-9), 3),
+            statuses=after["statuses"],
+        )
+        _log_result("pull", results["pull"])
+
+        before = server.stats()
+        runs = _timed(pull, args.repeat)
+        after = server.stats()
+        results["pull_noop"] = _result(
+            runs,
+            items=len(urls),
+            downloaded=sum(s["downloaded"] for s in summaries[1:]),
+            requests=(after["requests"] - before["requests"]) // max(1, args.repeat),
+        )
+        _log_result("pull_noop", results["pull_noop"])
+
+        stats = cli.db.get_stats()
+        report["library"] = {
+            "books": stats["total"],
+            "types": dict(stats["types"]),
+            "bytes": _dir_size(library_dir),
+        }
+    finally:
+        os.chdir(old_cwd)
+        server.stop()
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            _log(f"书库保留在 {workdir}")
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks pull", description="用本地替身服务器对 pull 计时")
+    fake_sites.add_server_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=3, help="无新作品的 pull 重复次数，报告中位数 (默认 3)")
+    parser.add_argument("--workdir", default="", help="在指定的空目录里建书库 (默认临时目录，结束后删除)")
+    parser.add_argument("--keep", action="store_true", help="保留临时书库，便于事后排查")
+    parser.add_argument("--output", default="", help="结果 JSON 路径，- 表示输出到标准输出 (默认 bench-pull-时间.json)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        out = args.output or f"bench-pull-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        _log(f"结果已写入 {os.path.abspath(out)}")
+    return 0
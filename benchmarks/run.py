@@ -0,0 +1,322 @@
+"""基准测试入口
+
+用法:
+  python -m benchmarks [--authors=N] [--books=M] [--import-books=K] [--seed=S] [--scale=X]
+                       [--repeat=R] [--only=list,stats] [--workdir=目录] [--keep] [--output=结果.json]
+  python -m benchmarks pull [选项见 --help]       (用本地替身服务器离线测 pull 吞吐，见 pull.py)
+  python -m benchmarks compare 旧.json 新.json [--threshold=0.1]
+
+在临时目录里生成合成书库 (M 本书，其中 K 本走完整导入流程计时，其余直接落库)，
+然后对 import / advanced_search / list / authors / stats / clean (quick、deep) / update 批量 / export 逐项计时，
+每项重复 R 次，结果 (含环境信息和书库规模) 写成 JSON。compare 对比两份结果的中位数，
+变慢超过阈值时以退出码 1 结束，便于在发版前后直接比较。
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from .synth import import_overrides, plan_library, write_sources
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCHMARKS = (
+    "import",
+    "advanced_search",
+    "list",
+    "authors",
+    "stats",
+    "clean_quick",
+    "clean_deep",
+    "update_bulk",
+    "export",
+)
+BENCH_TAG = "#基准测试"
+
+
+@contextlib.contextmanager
+def _quiet():
+    """命令的输出照常格式化，只是不写到终端 (终端渲染速度不该算进命令耗时)"""
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        with contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+            yield
+
+
+def _timed(fn: Callable[[], object], repeat: int, before: Optional[Callable[[], object]] = None) -> List[float]:
+    runs = []
+    for _ in range(max(1, repeat)):
+        if before is not None:
+            with _quiet():
+                before()
+        started = time.perf_counter()
+        with _quiet():
+            fn()
+        runs.append(time.perf_counter() - started)
+    return runs
+
+
+def _result(runs: List[float], items: Optional[int] = None, **extra) -> Dict:
+    out = {
+        "runs": [round(r, 6) for r in runs],
+        "min": round(min(runs), 6),
+        "median": round(statistics.median(runs), 6),
+        "mean": round(statistics.fmean(runs), 6),
+    }
+    if items:
+        out["items"] = items
+        out["per_item_ms"] = round(statistics.median(runs) / items * 1000, 4)
+    out.update(extra)
+    return out
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5,
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _fill(db, fm, specs: List[Dict], src_dir: str, scale: float):
+    """不经过导入流程直接落库 (书库规模的“背景”部分)：文件移入书库目录并写入 books"""
+    for spec, path, digest in write_sources(specs, src_dir, scale):
+        saved_path, file_type = fm.import_file(path, spec["title"], spec["author"], spec["series"], move=True)
+        db.add_book(
+            spec["title"], spec["author"], spec["tags"], spec["status"], spec["series"],
+            saved_path, file_type, file_hash=digest,
+        )
+
+
+def run(args) -> Dict:
+    only = set(filter(None, (args.only or "").split(","))) or set(BENCHMARKS)
+    unknown = only - set(BENCHMARKS)
+    if unknown:
+        raise SystemExit(f"未知的基准项: {', '.join(sorted(unknown))} (可选: {', '.join(BENCHMARKS)})")
+
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="neko_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    db_path = os.path.join(workdir, "library.db")
+    library_dir = os.path.join(workdir, "library")
+    if os.path.exists(db_path) or os.path.exists(library_dir):
+        raise SystemExit(f"{workdir} 里已经有书库了，换一个空目录喵")
+
+    # 配置在 core 导入时读取环境变量，必须先设好；不记录 trace，免得 span 写文件的开销混进结果
+    os.environ["NEKOSHELF_DB_PATH"] = db_path
+    os.environ["NEKOSHELF_LIBRARY_PATH"] = library_dir
+    os.environ["NEKOSHELF_TRACE_FILE"] = ""
+    sys.path.insert(0, ROOT)
+    old_cwd = os.getcwd()
+    os.chdir(workdir)
+
+    from core import config
+    from core.cli import MoeCLI
+    from core.import_engine import ImportEngine
+    from core.utils import parse_query_args
+
+    report = {
+        "meta": {
+            "version": config.VERSION,
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "params": {
+                "authors": args.authors,
+                "books": args.books,
+                "import_books": min(args.import_books, args.books),
+                "seed": args.seed,
+                "scale": args.scale,
+                "repeat": args.repeat,
+            },
+        },
+        "library": {},
+        "results": {},
+    }
+    results = report["results"]
+
+    try:
+        specs = plan_library(args.authors, args.books, seed=args.seed)
+        n_import = min(args.import_books, len(specs)) if "import" in only else 0
+        # 导入的那部分取书目末尾：导入时书库里已经有其余的书，查重/目录解析面对的是完整规模
+        fill_specs, import_specs = specs[: len(specs) - n_import], specs[len(specs) - n_import:]
+
+        cli = MoeCLI()
+        started = time.perf_counter()
+        with _quiet():
+            _fill(cli.db, cli.fm, fill_specs, os.path.join(workdir, "fill_src"), args.scale)
+        report["meta"]["fill_seconds"] = round(time.perf_counter() - started, 3)
+        _log(f"已落库 {len(fill_specs)} 本 ({report['meta']['fill_seconds']}s)")
+
+        if import_specs:
+            src_dir = os.path.join(workdir, "import_src")
+            sources = [(spec, path) for spec, path, _digest in write_sources(import_specs, src_dir, args.scale)]
+            engine = ImportEngine(cli.db, cli.fm, import_exts={".txt", ".pdf", ".cbz"})
+
+            def do_import():
+                for spec, path in sources:
+                    engine.import_one(path, overrides=import_overrides(spec), dup_mode="skip", quiet=True)
+
+            # 导入会改变书库，只能跑一次
+            runs = _timed(do_import, 1)
+            results["import"] = _result(runs, items=len(sources), bytes=_dir_size(src_dir))
+            _log_result("import", results["import"])
+
+        stats = cli.db.get_stats()
+        report["library"] = {
+            "books": stats["total"],
+            "authors": len({s["author"] for s in specs}),
+            "types": dict(stats["types"]),
+            "bytes": _dir_size(library_dir),
+        }
+
+        top_author = stats["authors"][0][0] if stats["authors"] else ""
+        some_series = next((s["series"] for s in specs if s["series"]), "")
+
+        if "advanced_search" in only:
+            queries = ["魔法", "少女 tag:校园", "tag:百合", f"author:{top_author}", f"series:{some_series}", "status:1 type:pdf"]
+            sub = {}
+            for q in queries:
+                query, filters = parse_query_args(q.split())
+                count = len(list(cli.db.advanced_search(query, filters)))
+                runs = _timed(lambda: list(cli.db.advanced_search(query, filters)), args.repeat)
+                sub[q] = _result(runs, matches=count)
+            all_runs = [sum(r["runs"][i] for r in sub.values()) for i in range(max(1, args.repeat))]
+            results["advanced_search"] = _result(all_runs, items=len(queries), queries=sub)
+            _log_result("advanced_search", results["advanced_search"])
+
+        commands = {
+            "list": ("list", None),
+            "authors": ("authors", None),
+            "stats": ("stats", None),
+            "clean_quick": ("clean", None),
+            "clean_deep": ("clean --deep", None),
+            # 每轮先撤掉上一轮加的标签，保证每次都是真正的批量写入
+            "update_bulk": (f"update all tags+={BENCH_TAG}", f"update all tags-={BENCH_TAG}"),
+        }
+        for name, (line, reset) in commands.items():
+            if name not in only:
+                continue
+            runs = _timed(lambda: cli.onecmd(line), args.repeat, before=(lambda: cli.onecmd(reset)) if reset else None)
+            results[name] = _result(runs, items=stats["total"], command=line)
+            _log_result(name, results[name])
+
+        if "export" in only:
+            export_dir = os.path.join(workdir, "exports")
+            max_id = cli.db.conn.execute("SELECT COALESCE(MAX(id), 0) FROM books").fetchone()[0]
+            sub = {}
+            for fmt in ("json", "csv"):
+                line = f"export 1-{max_id} --format={fmt} --output={export_dir}"
+                sub[fmt] = _result(_timed(lambda: cli.onecmd(line), args.repeat), items=stats["total"])
+            # zip 会把文件整份打包，只取书最多的作者
+            line = f"export author:{top_author} --format=zip --output={export_dir}"
+            sub["zip"] = _result(_timed(lambda: cli.onecmd(line), args.repeat))
+            all_runs = [sum(r["runs"][i] for r in sub.values()) for i in range(max(1, args.repeat))]
+            results["export"] = _result(all_runs, formats=sub)
+            _log_result("export", results["export"])
+    finally:
+        os.chdir(old_cwd)
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            _log(f"书库保留在 {workdir}")
+    return report
+
+
+def _log(msg: str):
+    print(msg, file=sys.stderr, flush=True)
+
+
+def _log_result(name: str, res: Dict):
+    per = f"  ({res['per_item_ms']}ms/本)" if "per_item_ms" in res else ""
+    _log(f"{name:<16} 中位 {res['median']:.4f}s  最快 {res['min']:.4f}s{per}")
+
+
+def compare(old_path: str, new_path: str, threshold: float) -> int:
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    old_p = old.get("meta", {}).get("params", {})
+    new_p = new.get("meta", {}).get("params", {})
+    if old_p != new_p:
+        print(f"注意: 两次运行的参数不同 ({old_p} vs {new_p})，结果不一定可比")
+
+    regressions = 0
+    # 中文表头每字占两列
+    print(f"{'项目':<14}{'旧(s)':>9}{'新(s)':>9}{'变化':>7}")
+    # 固定项目在前，其余 (如 pull 基准的结果) 按出现顺序排在后面
+    names = dict.fromkeys(list(BENCHMARKS) + list(old.get("results", {})) + list(new.get("results", {})))
+    for name in names:
+        a = old.get("results", {}).get(name)
+        b = new.get("results", {}).get(name)
+        if not a or not b:
+            continue
+        ratio = b["median"] / a["median"] if a["median"] else float("inf")
+        mark = ""
+        if ratio > 1 + threshold:
+            mark = "  变慢"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            mark = "  变快"
+        print(f"{name:<16}{a['median']:>10.4f}{b['median']:>10.4f}{(ratio - 1) * 100:>8.1f}%{mark}")
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if argv and argv[0] == "compare":
+        parser = argparse.ArgumentParser(prog="python -m benchmarks compare", description="对比两份基准结果")
+        parser.add_argument("old")
+        parser.add_argument("new")
+        parser.add_argument("--threshold", type=float, default=0.1, help="中位数变化超过该比例才算变快/变慢 (默认 0.1)")
+        a = parser.parse_args(argv[1:])
+        return compare(a.old, a.new, a.threshold)
+    if argv and argv[0] == "pull":
+        from .pull import main as pull_main
+        return pull_main(argv[1:])
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="用合成书库对关键路径计时")
+    parser.add_argument("--authors", type=int, default=50, help="作者数 (默认 50)")
+    parser.add_argument("--books", type=int, default=2000, help="书库总册数 (默认 2000)")
+    parser.add_argument("--import-books", type=int, default=300, help="其中走完整导入流程并计时的册数 (默认 300)")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子，相同种子生成相同书库")
+    parser.add_argument("--scale", type=float, default=1.0, help="文件大小倍数 (txt 字数 / pdf、cbz 页数)")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数，报告中位数 (默认 3)")
+    parser.add_argument("--only", default="", help=f"只跑指定项，逗号分隔: {','.join(BENCHMARKS)}")
+    parser.add_argument("--workdir", default="", help="在指定的空目录里生成书库 (默认临时目录，结束后删除)")
+    parser.add_argument("--keep", action="store_true", help="保留临时书库，便于事后排查")
+    parser.add_argument("--output", default="", help="结果 JSON 路径，- 表示输出到标准输出 (默认 bench-时间.json)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        out = args.output or f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        _log(f"结果已写入 {os.path.abspath(out)}")
+    return 0
@@ -0,0 +1,205 @@
+"""合成书库生成器
+
+按固定种子生成 N 位作者、M 本书的书库：中文/日文风格标题、标签、系列、连载状态，
+txt / pdf / cbz 混合且大小分布接近真实下载 (txt 按章节、gb18030 占一部分；pdf/cbz 为多页噪点图，内容互不相同)。
+同样的参数和种子每次生成完全相同的书目和文件内容，前后两次基准结果可以直接对比。
+"""
+
+import hashlib
+import io
+import math
+import os
+import random
+import time
+import zipfile
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from PIL import Image
+
+SURNAMES = "赵钱孙李周吴郑王冯陈褚卫蒋沈韩杨朱秦许何吕施张孔曹严华金魏陶姜白夏"
+GIVEN = ["子", "月", "星", "凛", "雪", "樱", "澄", "葵", "晴", "渚", "遥", "真", "琴", "诗", "音", "雨", "光", "夜", "秋", "岚"]
+PEN_NAMES = ["猫屋敷", "无名氏", "夜猫子", "咸鱼君", "白兔糖", "鸽子王", "一只狐狸", "千本樱", "月下独酌", "深海鱼",
+             "Mochi", "Kuro", "Lain", "Nyanko", "Azure"]
+WORDS_A = ["魔法", "异世界", "转生", "学院", "勇者", "魔王", "骑士", "公主", "少女", "少年", "猫耳", "吸血鬼", "精灵", "龙",
+           "侦探", "偶像", "女仆", "巫女", "天使", "恶魔", "机甲", "星际", "末日", "樱花", "夏日", "雪国"]
+WORDS_B = ["日常", "冒险", "物语", "传说", "恋爱", "契约", "战记", "事件簿", "日记", "协奏曲", "狂想曲", "观察记录",
+           "生存指南", "奇谭", "之旅", "革命", "同居生活", "咖啡馆", "社团活动", "秘密"]
+PATTERNS = [
+    "{a}{b}",
+    "{a}与{a2}的{b}",
+    "关于{a}变成{a2}这件事",
+    "我的{a}不可能这么{adj}",
+    "{a}{b} {n}",
+    "在{a}的{b}里{verb}",
+    "【{a}】{b}",
+]
+ADJS = ["可爱", "奇怪", "温柔", "危险", "认真", "笨拙"]
+VERBS = ["迷路", "打工", "恋爱", "旅行", "修行", "失忆"]
+TAGS = ["#变身", "#百合", "#日常", "#奇幻", "#校园", "#恋爱", "#冒险", "#科幻", "#悬疑", "#治愈", "#搞笑", "#战斗",
+        "#后宫", "#异世界", "#转生", "#R18", "#短篇", "#长篇", "#漫画", "#插画", "#同人", "#原创", "#TS", "#催泪"]
+FILLER = "的一是了我不在人有他这中大来上个国到说们为子和你地出道也时年得就那要下以生会自着去之过家学对可她里后小么心多天而能好都然没日于起还发成事只作当想看文无开手十用主行方又如前所本见经头面公同三已老从动两长"
+
+DEFAULT_MIX = {"txt": 0.6, "pdf": 0.25, "cbz": 0.15}
+# 写进 PDF / ZIP 的时间戳固定下来，否则同样的种子每次生成的文件哈希都不同
+FIXED_TIME = time.gmtime(1704067200)
+
+
+def _author_name(rng: random.Random, used: set) -> str:
+    for _ in range(100):
+        if rng.random() < 0.35:
+            name = rng.choice(PEN_NAMES) + (str(rng.randint(2, 99)) if rng.random() < 0.5 else "")
+        else:
+            name = rng.choice(SURNAMES) + "".join(rng.choice(GIVEN) for _ in range(rng.randint(1, 2)))
+        if name not in used:
+            used.add(name)
+            return name
+    name = f"作者{len(used) + 1}"
+    used.add(name)
+    return name
+
+
+def _title(rng: random.Random) -> str:
+    a, a2 = rng.sample(WORDS_A, 2)
+    return rng.choice(PATTERNS).format(
+        a=a, a2=a2, b=rng.choice(WORDS_B), adj=rng.choice(ADJS), verb=rng.choice(VERBS), n=rng.randint(1, 9),
+    )
+
+
+def plan_library(authors: int, books: int, seed: int = 42, mix: Optional[Dict[str, float]] = None) -> List[Dict]:
+    """生成书目清单 (不写文件)：[{author, title, series, tags, status, ext, work_id, seed}]。
+
+    作者的作品数服从长尾分布 (少数作者占大部分作品)，约三成作品属于某个系列。
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    exts = list(mix.keys())
+    weights = [float(mix[e]) for e in exts]
+    used = set()
+    names = [_author_name(rng, used) for _ in range(max(1, authors))]
+    # Zipf 式权重：第 k 位作者的作品数约与 1/k 成正比
+    author_weights = [1.0 / (k + 1) for k in range(len(names))]
+
+    specs = []
+    series_pool: Dict[str, List[str]] = {}
+    titles_seen = set()
+    for i in range(books):
+        # 每位作者至少一本，之后按长尾分布分配
+        author = names[i] if i < len(names) else rng.choices(names, weights=author_weights)[0]
+        series = ""
+        title = _title(rng)
+        if rng.random() < 0.3:
+            pool = series_pool.setdefault(author, [])
+            if not pool or rng.random() < 0.3:
+                pool.append(_title(rng))
+            series = rng.choice(pool)
+            title = f"{series} 第{rng.randint(1, 30)}卷"
+        base = title
+        n = 2
+        while (author, title) in titles_seen:
+            title = f"{base} ({n})"
+            n += 1
+        titles_seen.add((author, title))
+        specs.append({
+            "author": author,
+            "title": title,
+            "series": series,
+            "tags": " ".join(rng.sample(TAGS, rng.randint(1, 5))),
+            "status": 1 if rng.random() < 0.4 else 0,
+            "ext": rng.choices(exts, weights=weights)[0],
+            "work_id": str(10000000 + i),
+            "seed": rng.getrandbits(32),
+        })
+    return specs
+
+
+def _log_uniform(rng: random.Random, low: int, high: int) -> int:
+    return int(math.exp(rng.uniform(math.log(max(1, low)), math.log(max(low + 1, high)))))
+
+
+def _noise_jpeg(rng: random.Random, width: int = 256, height: int = 384) -> bytes:
+    # 低分辨率随机色块放大：压缩率接近真实插画，又保证每页内容不同
+    small = Image.frombytes("RGB", (width // 8, height // 8), rng.randbytes((width // 8) * (height // 8) * 3))
+    img = small.resize((width, height), Image.BILINEAR)
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=80)
+    return out.getvalue()
+
+
+def render_txt(spec: Dict, scale: float = 1.0) -> bytes:
+    rng = random.Random(spec["seed"])
+    target = int(_log_uniform(rng, 8 * 1024, 512 * 1024) * scale)
+    encoding = "gb18030" if rng.random() < 0.15 else "utf-8"
+    parts = [f"{spec['title']}\n作者：{spec['author']}\n标签：{spec['tags']}\n\n"]
+    size = 0
+    chapter = 0
+    while size < target:
+        chapter += 1
+        parts.append(f"第{chapter}章 {rng.choice(WORDS_A)}{rng.choice(WORDS_B)}\n")
+        for _ in range(rng.randint(5, 30)):
+            para = "　　" + "".join(rng.choice(FILLER) for _ in range(rng.randint(40, 200))) + "。\n"
+            parts.append(para)
+            size += len(para) * 3
+    return "".join(parts).encode(encoding, errors="replace")
+
+
+def render_pdf(spec: Dict, scale: float = 1.0) -> bytes:
+    rng = random.Random(spec["seed"])
+    pages = max(1, int(rng.randint(1, 12) * scale))
+    images = [Image.open(io.BytesIO(_noise_jpeg(rng))) for _ in range(pages)]
+    out = io.BytesIO()
+    images[0].save(
+        out, "PDF", save_all=True, append_images=images[1:],
+        title=spec["title"], author=spec["author"], creationDate=FIXED_TIME, modDate=FIXED_TIME,
+    )
+    for img in images:
+        img.close()
+    return out.getvalue()
+
+
+def render_cbz(spec: Dict, scale: float = 1.0) -> bytes:
+    rng = random.Random(spec["seed"])
+    pages = max(1, int(rng.randint(4, 40) * scale))
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_STORED) as zf:
+        stamp = tuple(FIXED_TIME[:6])
+        for n in range(pages):
+            zf.writestr(zipfile.ZipInfo(f"{n + 1:03d}.jpg", stamp), _noise_jpeg(rng))
+        zf.writestr(zipfile.ZipInfo("ComicInfo.xml", stamp), (
+            "<?xml version=\"1.0\" encoding=\"utf-8\"?>\n<ComicInfo>"
+            f"<Title>{spec['title']}</Title><Writer>{spec['author']}</Writer><PageCount>{pages}</PageCount>"
+            "</ComicInfo>"
+        ).encode("utf-8"))
+    return out.getvalue()
+
+
+RENDERERS = {"txt": render_txt, "pdf": render_pdf, "cbz": render_cbz}
+
+
+def _safe_name(s: str) -> str:
+    return "".join("_" if ch in '\\/:*?"<>|' else ch for ch in s)
+
+
+def source_name(spec: Dict) -> str:
+    """Kemono 下载文件的命名方式: 作者 - 标题 (ID).ext，导入时能解析出作者/标题/来源 ID"""
+    return f"{_safe_name(spec['author'])} - {_safe_name(spec['title'])} ({spec['work_id']}).{spec['ext']}"
+
+
+def write_sources(specs: List[Dict], out_dir: str, scale: float = 1.0) -> Iterator[Tuple[Dict, str, str]]:
+    """逐本写出源文件，产出 (spec, 路径, sha256)"""
+    os.makedirs(out_dir, exist_ok=True)
+    for spec in specs:
+        data = RENDERERS[spec["ext"]](spec, scale)
+        path = os.path.join(out_dir, source_name(spec))
+        with open(path, "wb") as f:
+            f.write(data)
+        yield spec, path, hashlib.sha256(data).hexdigest()
+
+
+def import_overrides(spec: Dict) -> Dict:
+    return {
+        "title": spec["title"],
+        "author": spec["author"],
+        "series": spec["series"],
+        "tags": spec["tags"],
+        "status": spec["status"],
+    }
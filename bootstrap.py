@@ -11,8 +11,8 @@ def _venv_python(venv_dir: Path) -> Path:
     return venv_dir / "bin" / "python"
 
 
-def _run(cmd, env=None):
-    subprocess.check_call(cmd, env=env)
+def _run(cmd, env=None, cwd=None):
+    subprocess.check_call(cmd, env=env, cwd=cwd)
 
 
 def main(argv=None):
@@ -38,9 +38,16 @@ def main(argv=None):
     _run([str(py), "-m", "pip", "install", "-e", str(root)], env=env)
 
     if "--test" in argv:
-        _run([str(py), "-m", "unittest", "discover", "-s", "tests", "-p", "test*.py", "-v"], env=env)
+        if (root / "tests").is_dir():
+            _run([str(py), "-m", "unittest", "discover", "-s", "tests", "-p", "test*.py", "-v"], env=env)
+        else:
+            print("没有 tests 目录，跳过单元测试")
 
-    if ("--install-only" in argv) and ("--test" not in argv):
+    if "--bench" in argv:
+        # benchmarks 不随包安装，需要在仓库根目录下运行
+        _run([str(py), "-m", "benchmarks"], env=env, cwd=str(root))
+
+    if ("--install-only" in argv) and ("--test" not in argv) and ("--bench" not in argv):
         return 0
 
     if ("--run" in argv) or ("--install-only" not in argv):
@@ -1,32 +1,822 @@
+"""HTTP 服务
+
+POST /download 只负责登记任务并立即返回 202 和任务 ID，下载与导入在后台任务池中执行；
+GET /jobs、GET /jobs/<任务ID> 查询进度 (完成条目数、已下载字节、速率)。
+任务池线程数固定 (api_workers)，每个线程持有自己的数据库连接和下载服务，请求线程则从连接池借用连接。
+
+只读接口 GET /books、/books/<id>、/authors、/search:
+- 按 id 键集分页 (?after=上一页最后的 id&limit=条数，limit=0 表示全部)，?fields= 只返回指定列；
+- 列表边查边写 (不拼成一个大字符串)，客户端支持时用 gzip 压缩；
+- ETag 取自书库修订号 (library_revision)，轮询时带 If-None-Match 即可在书库未变化时得到 304。
+
+GET /books/<id>/file 直接发送书籍文件：支持 Range / If-Range (206)，用 sendfile 由内核拷贝，不读进进程内存。
+
+CBZ 按页阅读 (页号从 1 开始):
+- GET /books/<id>/pages 返回页数；GET /books/<id>/pages/<n> 只读压缩包里的这一页，?w=宽度 返回缩放后的 JPEG；
+- GET /books/<id>/cover 返回封面缩略图 (thumbnail_width)；缩放结果缓存在磁盘上 (见 core/page_cache.py)。
+
+TXT 按章阅读 (章节号从 1 开始)：GET /books/<id>/sections 返回章节目录，GET /books/<id>/sections/<n> 返回一章的 UTF-8 文本。
+章节索引在导入时建立 (见 core/text_sections.py)，旧书或文件变化后首次访问时补建。
+
+GET /metrics 以 Prometheus 文本格式输出进程内指标 (见 core/utils.py)。
+"""
+
+import email.utils
+import gzip
 import json
+import mimetypes
+import os
+import queue
+import threading
+import time
+import traceback
+import zipfile
+import zlib
+from contextlib import contextmanager
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, quote, urlsplit
 
 from . import config
 from .database import DatabaseManager
 from .file_manager import FileManager
-from .download_service import DownloadImportService
+from .download_service import DownloadImportService, new_job_id, refresh_queue_metrics
+from .page_cache import PageCache, book_file_key
+from .text_sections import index_book_sections, read_section
+from .scheduler import parse_time
+from .utils import gauge, get_logger, render_metrics
+
+API_JOBS = gauge("nekoshelf_api_jobs", "serve 后台任务池中的任务数 (按状态)", ("state",))
+
+
+def _now_str(ts: Optional[float] = None):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts if ts is not None else time.time()))
+
+
+class _DbPool:
+    """请求线程按连接临时创建，线程本地连接无法复用；这里缓存一组可跨线程借用的连接，同一时刻只借给一个请求"""
+
+    def __init__(self, db_path: str, size: int = 4):
+        self.db_path = db_path
+        self.size = max(1, int(size))
+        self._idle = queue.LifoQueue()
+
+    @contextmanager
+    def connection(self):
+        try:
+            db = self._idle.get_nowait()
+        except queue.Empty:
+            db = DatabaseManager(self.db_path, check_same_thread=False)
+        try:
+            yield db
+        finally:
+            if self._idle.qsize() < self.size:
+                self._idle.put(db)
+            else:
+                db.close()
+
+    def close(self):
+        while True:
+            try:
+                db = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                db.close()
+            except Exception:
+                pass
+
+
+class JobRunner:
+    """后台下载任务池：固定数量的工作线程，超出的任务排队等待"""
+
+    MAX_FINISHED = 200
+
+    def __init__(self, db_path: str, library_dir: str, workers: int = 2):
+        self.db_path = db_path
+        self.library_dir = library_dir
+        self._queue = queue.Queue()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._worker_main, name=f"nekoshelf-api-job-{i}", daemon=True)
+            for i in range(max(1, int(workers)))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, params: dict) -> dict:
+        job_id = new_job_id()
+        now = time.time()
+        job = {
+            "job_id": job_id,
+            "url": params["url"],
+            "state": "queued",
+            "submitted_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "listed": None,
+            "queued": None,
+            "current": None,
+            "stats": None,
+            "error": None,
+            "dry_run": bool(params.get("dry_run")),
+            "result": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        self._queue.put((job_id, dict(params)))
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def all(self) -> dict:
+        with self._lock:
+            return {k: dict(v) for k, v in self._jobs.items()}
+
+    def stop(self, timeout: float = 5.0):
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join(timeout)
+
+    def _update(self, job_id: str, **changes):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(changes)
+
+    def _prune(self):
+        with self._lock:
+            finished = [j for j in self._jobs.values() if j["finished_at"] is not None]
+            if len(finished) <= self.MAX_FINISHED:
+                return
+            finished.sort(key=lambda j: j["finished_at"])
+            for j in finished[: len(finished) - self.MAX_FINISHED]:
+                self._jobs.pop(j["job_id"], None)
+
+    def _worker_main(self):
+        # sqlite3 连接不能跨线程使用：每个工作线程各自持有一套 db / service / 插件会话
+        db = DatabaseManager(self.db_path)
+        try:
+            svc = DownloadImportService(db, FileManager(self.library_dir))
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                self._run(svc, *item)
+        finally:
+            db.close()
+
+    def _run(self, svc: DownloadImportService, job_id: str, params: dict):
+        if params.get("dry_run"):
+            return self._run_preview(svc, job_id, params)
+        self._update(job_id, state="listing", started_at=time.time())
+
+        def on_item(row, out):
+            self._update(job_id, current=row["item_key"])
+
+        try:
+            listed = svc.enqueue(
+                url=params["url"],
+                download_dir=params.get("download_dir"),
+                series_name=params.get("series_name"),
+                save_content=bool(params.get("save_content", False)),
+                kemono_dl_mode=str(params.get("kemono_dl_mode") or "attachment"),
+                dup_mode=str(params.get("dup_mode") or "skip"),
+                quiet=True,
+                job_id=job_id,
+            )
+            self._update(job_id, state="running", listed=listed["listed"], queued=listed["queued"])
+            stats = svc.run_worker(job_id=job_id, quiet=True, on_item=on_item)
+            state = "failed" if stats.get("failed") and not stats.get("done") else "done"
+            self._update(job_id, state=state, stats=stats, current=None, finished_at=time.time())
+        except Exception as e:
+            get_logger().error("api_job_error job=%s %s", job_id, traceback.format_exc())
+            self._update(job_id, state="error", error=str(e), current=None, finished_at=time.time())
+        self._prune()
+
+    def _run_preview(self, svc: DownloadImportService, job_id: str, params: dict):
+        """dry_run：预览同样要把作品下载下来才能解析，只是不入库，也不写入下载队列"""
+        self._update(job_id, state="running", started_at=time.time())
+        try:
+            out = svc.download_and_import(
+                url=params["url"],
+                download_dir=params.get("download_dir"),
+                series_name=params.get("series_name"),
+                save_content=bool(params.get("save_content", False)),
+                kemono_dl_mode=str(params.get("kemono_dl_mode") or "attachment"),
+                dry_run=True,
+                dup_mode=str(params.get("dup_mode") or "skip"),
+                quiet=True,
+            )
+            state = "done" if out.get("success") else "failed"
+            self._update(job_id, state=state, result=out, finished_at=time.time())
+        except Exception as e:
+            get_logger().error("api_job_error job=%s %s", job_id, traceback.format_exc())
+            self._update(job_id, state="error", error=str(e), finished_at=time.time())
+        self._prune()
+
+
+def _job_view(row, job: Optional[dict]) -> dict:
+    """合并内存中的任务状态与 download_jobs 中的条目统计"""
+    items = {"total": 0, "done": 0, "failed": 0, "pending": 0, "running": 0}
+    bytes_done = 0
+    if row is not None:
+        items = {
+            "total": int(row["total"] or 0),
+            "done": int(row["done"] or 0),
+            "failed": int(row["failed"] or 0),
+            "pending": int(row["pending"] or 0),
+            "running": int(row["leased"] or 0),
+        }
+        bytes_done = int(row["bytes_done"] or 0)
+
+    if job is not None:
+        state = job["state"]
+        started = job["started_at"]
+        ended = job["finished_at"] or time.time()
+        view = {
+            "job_id": job["job_id"],
+            "url": job["url"],
+            "state": state,
+            "submitted_at": _now_str(job["submitted_at"]),
+            "started_at": _now_str(started) if started else None,
+            "finished_at": _now_str(job["finished_at"]) if job["finished_at"] else None,
+            "listed": job["listed"],
+            "current": job["current"],
+            "error": job["error"],
+        }
+        if job.get("dry_run"):
+            view["dry_run"] = True
+            view["result"] = job.get("result")
+    else:
+        # 其他进程 (CLI download --queue / nekoshelf-worker) 创建的任务，只有数据库里的统计
+        if items["running"]:
+            state = "running"
+        elif items["pending"]:
+            state = "queued"
+        elif items["failed"] and not items["done"]:
+            state = "failed"
+        else:
+            state = "done"
+        created = parse_time(row["created_at"])
+        updated = parse_time(row["updated_at"])
+        started = created.timestamp() if created else None
+        ended = time.time() if state == "running" else (updated.timestamp() if updated else None)
+        view = {
+            "job_id": row["job_id"],
+            "url": row["source_url"],
+            "state": state,
+            "submitted_at": _now_str(started) if started else None,
+        }
+
+    elapsed = (ended - started) if (started and ended) else 0.0
+    view["items"] = items
+    view["bytes"] = bytes_done
+    view["elapsed_seconds"] = round(max(0.0, elapsed), 1)
+    view["rate"] = {
+        "bytes_per_sec": round(bytes_done / elapsed, 1) if elapsed > 0 else 0.0,
+        "items_per_min": round((items["done"] + items["failed"]) * 60.0 / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+    return view
+
+
+LIST_DEFAULT_LIMIT = 100
+LIST_MAX_LIMIT = 1000
+SEARCH_FILTER_KEYS = ("author", "series", "tags", "title", "status", "file_type")
+
+
+def _query_int(query, name, default=None):
+    try:
+        raw = (query.get(name) or [""])[0].strip()
+        return int(raw) if raw else default
+    except Exception:
+        return default
+
+
+def _query_limit(query):
+    limit = _query_int(query, "limit", LIST_DEFAULT_LIMIT)
+    if limit is None or limit < 0:
+        return LIST_DEFAULT_LIMIT
+    return min(limit, LIST_MAX_LIMIT) if limit else 0
+
+
+def _query_fields(query):
+    raw = ",".join(query.get("fields") or [])
+    fields = [f.strip() for f in raw.split(",") if f.strip()]
+    return fields or None
+
+
+def _query_filters(query):
+    filters = {}
+    for key in SEARCH_FILTER_KEYS:
+        val = (query.get(key) or [""])[0].strip()
+        if not val:
+            continue
+        if key == "status":
+            try:
+                filters[key] = int(val)
+            except ValueError:
+                continue
+        else:
+            filters[key] = val
+    return filters
+
+
+def _row_dict(row):
+    return {k: row[k] for k in row.keys()}
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if not header:
+        return False
+    want = etag[2:] if etag.startswith("W/") else etag
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if (tag[2:] if tag.startswith("W/") else tag) == want:
+            return True
+    return False
+
+
+BOOK_CONTENT_TYPES = {
+    ".txt": "text/plain; charset=utf-8",
+    ".pdf": "application/pdf",
+    ".epub": "application/epub+zip",
+    ".cbz": "application/vnd.comicbook+zip",
+    ".zip": "application/zip",
+    ".mobi": "application/x-mobipocket-ebook",
+    ".azw3": "application/vnd.amazon.ebook",
+}
+
+
+def _content_type(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    return BOOK_CONTENT_TYPES.get(ext) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+COMIC_EXTS = (".cbz", ".zip")
+PAGE_MIN_WIDTH = 64
+PAGE_MAX_WIDTH = 2048
+
+
+def _page_width(raw) -> int:
+    """把 ?w= 归到 64 的整数倍，避免任意宽度把缓存撑满"""
+    w = max(PAGE_MIN_WIDTH, min(PAGE_MAX_WIDTH, int(raw)))
+    return (w + PAGE_MIN_WIDTH - 1) // PAGE_MIN_WIDTH * PAGE_MIN_WIDTH
+
+
+def _parse_range(header: str, size: int):
+    """解析单段 Range: bytes=a-b / a- / -n；返回 (start, end) 闭区间，None 表示忽略 Range，"unsatisfiable" 表示越界"""
+    if not header or not header.strip().lower().startswith("bytes="):
+        return None
+    spec = header.strip()[6:].strip()
+    if "," in spec:
+        # 多段 Range 需要 multipart/byteranges，阅读器用不到，按规范可直接忽略返回整个文件
+        return None
+    first, sep, last = spec.partition("-")
+    if not sep:
+        return None
+    try:
+        if first.strip() == "":
+            n = int(last)
+            if n <= 0:
+                return "unsatisfiable"
+            return max(0, size - n), size - 1
+        start = int(first)
+        end = int(last) if last.strip() else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
 
 
 def run_server(host: str = "127.0.0.1", port: int = 8765, db_path: str = "", library_dir: str = ""):
     cfg = config.load(reload=True)
-    db = DatabaseManager(db_path or cfg["db_file"])
-    fm = FileManager(library_dir or cfg["library_dir"])
-    svc = DownloadImportService(db, fm)
+    db_path = db_path or cfg["db_file"]
+    library_dir = library_dir or cfg["library_dir"]
+    dl_cfg = cfg["download_config"]
+
+    # 先建表/切换 WAL，并回收上次异常退出遗留的租约
+    db = DatabaseManager(db_path)
+    try:
+        DownloadImportService(db, FileManager(library_dir)).reclaim_stale_leases()
+    finally:
+        db.close()
+
+    workers = int(dl_cfg.get("api_workers", 2) or 2)
+    pool = _DbPool(db_path, size=max(4, workers))
+    runner = JobRunner(db_path, library_dir, workers=workers)
+    cache_dir = str(dl_cfg.get("page_cache_dir") or "").strip() or os.path.join(os.path.dirname(db_path), "page_cache")
+    page_cache = PageCache(cache_dir, int(float(dl_cfg.get("page_cache_mb", 512) or 0) * 1024 * 1024))
+    thumbnail_width = _page_width(dl_cfg.get("thumbnail_width", 320) or 320)
 
     class Handler(BaseHTTPRequestHandler):
-        def _send_json(self, code: int, payload):
+        def _send_json(self, code: int, payload, headers=None):
             raw = json.dumps(payload, ensure_ascii=False).encode("utf-8")
             self.send_response(code)
             self.send_header("Content-Type", "application/json; charset=utf-8")
             self.send_header("Content-Length", str(len(raw)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def _accepts_gzip(self):
+            return "gzip" in str(self.headers.get("Accept-Encoding") or "").lower()
+
+        def _send_cached(self, etag, chunks):
+            """带 ETag 的 JSON 响应：If-None-Match 命中时回 304；否则逐块写出 chunks (可为生成器)"""
+            if _etag_matches(self.headers.get("If-None-Match") or "", etag):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                return
+
+            gz = self._accepts_gzip()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Vary", "Accept-Encoding")
+            if gz:
+                self.send_header("Content-Encoding", "gzip")
+            # 长度未知：写完即关闭连接 (HTTP/1.0 语义)
+            self.send_header("Connection", "close")
+            self.close_connection = True
+            self.end_headers()
+
+            comp = zlib.compressobj(6, zlib.DEFLATED, 31) if gz else None
+            buf = []
+            size = 0
+            for chunk in chunks:
+                data = chunk.encode("utf-8")
+                if comp is not None:
+                    data = comp.compress(data)
+                if data:
+                    buf.append(data)
+                    size += len(data)
+                if size >= 64 * 1024:
+                    self.wfile.write(b"".join(buf))
+                    buf, size = [], 0
+            if comp is not None:
+                buf.append(comp.flush())
+            if buf:
+                self.wfile.write(b"".join(buf))
+
+        def _stream_list(self, rev, rows, limit):
+            """把行迭代器写成 {"ok", "revision", "items": [...], "next_after"}，逐行序列化"""
+            yield '{"ok": true, "revision": %d, "items": [' % rev
+            count = 0
+            last_id = None
+            for row in rows:
+                item = _row_dict(row)
+                yield ("," if count else "") + json.dumps(item, ensure_ascii=False)
+                count += 1
+                last_id = item.get("id")
+            next_after = last_id if (limit and count >= limit) else None
+            yield '], "next_after": %s}' % json.dumps(next_after)
+
+        def _list_books(self, query, search=False):
+            q = (query.get("q") or [""])[0].strip() or None
+            filters = _query_filters(query)
+            if search and not q and not filters:
+                return self._send_json(400, {"ok": False, "error": "missing_query"})
+            limit = _query_limit(query)
+            descending = str((query.get("order") or [""])[0]).lower() == "desc"
+            with pool.connection() as conn:
+                # 先取修订号再查询：查询期间若有写入，ETag 只会偏旧，下次轮询拿到新数据，不会误回 304
+                rev = conn.get_library_revision()
+                etag = f'W/"{rev}"'
+                rows = conn.iter_books_page(
+                    after_id=_query_int(query, "after"),
+                    limit=limit,
+                    fields=_query_fields(query),
+                    query=q,
+                    filters=filters,
+                    descending=descending,
+                )
+                return self._send_cached(etag, self._stream_list(rev, rows, limit))
+
+        def _get_book(self, book_id, query):
+            fields = _query_fields(query)
+            with pool.connection() as conn:
+                rev = conn.get_library_revision()
+                row = conn.get_book(book_id)
+            if row is None:
+                return self._send_json(404, {"ok": False, "error": "book_not_found"})
+            book = _row_dict(row)
+            if fields:
+                book = {k: v for k, v in book.items() if k in fields or k == "id"}
+            raw = json.dumps({"ok": True, "revision": rev, "book": book}, ensure_ascii=False)
+            return self._send_cached(f'W/"{rev}"', [raw])
+
+        def _list_authors(self, query):
+            limit = _query_limit(query)
+            with pool.connection() as conn:
+                rev = conn.get_library_revision()
+                rows = conn.iter_authors_page(after_id=_query_int(query, "after"), limit=limit)
+                return self._send_cached(f'W/"{rev}"', self._stream_list(rev, rows, limit))
+
+        def _send_file(self, book_id, head=False):
+            with pool.connection() as conn:
+                row = conn.get_book(book_id)
+            if row is None:
+                return self._send_json(404, {"ok": False, "error": "book_not_found"})
+            path = row["file_path"]
+            try:
+                f = open(path, "rb")
+            except OSError:
+                return self._send_json(404, {"ok": False, "error": "file_not_found"})
+            with f:
+                st = os.fstat(f.fileno())
+                size = st.st_size
+                mtime = row["file_mtime"] if row["file_mtime"] else st.st_mtime
+                last_modified = email.utils.formatdate(int(mtime), usegmt=True)
+                etag = f'"{(row["file_hash"] or "")[:16] or int(mtime)}-{size}"'
+
+                status = 200
+                start, end = 0, size - 1
+                rng = _parse_range(self.headers.get("Range") or "", size) if size else None
+                if_range = (self.headers.get("If-Range") or "").strip()
+                if rng is not None and if_range and if_range not in (etag, last_modified):
+                    # 客户端手里的版本已过期：忽略 Range，发送完整新文件
+                    rng = None
+                if rng == "unsatisfiable":
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if rng is not None:
+                    status = 206
+                    start, end = rng
+                length = max(0, end - start + 1)
+
+                self.send_response(status)
+                self.send_header("Content-Type", _content_type(path))
+                self.send_header("Content-Length", str(length))
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Last-Modified", last_modified)
+                self.send_header("ETag", etag)
+                self.send_header(
+                    "Content-Disposition",
+                    "inline; filename*=UTF-8''" + quote(os.path.basename(path)),
+                )
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                self.end_headers()
+                if head or not length:
+                    return
+                try:
+                    # socket.sendfile 在 Linux/macOS 上走 os.sendfile，由内核直接把文件页拷进 socket
+                    self.connection.sendfile(f, offset=start, count=length)
+                except (BrokenPipeError, ConnectionResetError):
+                    # 阅读器翻页/拖动进度条时常会中途断开
+                    self.close_connection = True
+
+        def _comic(self, book_id):
+            """返回 (书籍行, 页表)；出错时已发送错误响应并返回 (None, None)"""
+            with pool.connection() as conn:
+                row = conn.get_book(book_id)
+            if row is None:
+                self._send_json(404, {"ok": False, "error": "book_not_found"})
+                return None, None
+            if os.path.splitext(row["file_path"])[1].lower() not in COMIC_EXTS:
+                self._send_json(415, {"ok": False, "error": "not_cbz"})
+                return None, None
+            try:
+                return row, page_cache.index(row["file_path"])
+            except FileNotFoundError:
+                self._send_json(404, {"ok": False, "error": "file_not_found"})
+            except (OSError, zipfile.BadZipFile):
+                self._send_json(422, {"ok": False, "error": "bad_archive"})
+            return None, None
+
+        def _send_page(self, book_id, n, width=None):
+            row, index = self._comic(book_id)
+            if index is None:
+                return
+            if n < 1 or n > len(index):
+                return self._send_json(404, {"ok": False, "error": "page_not_found", "pages": len(index)})
+            key = book_file_key(row)
+            etag = f'"{key[:16]}-{n}-{width or 0}"'
+            if _etag_matches(self.headers.get("If-None-Match") or "", etag):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            info = index.pages[n - 1]
+            if width:
+                try:
+                    f = page_cache.open(key, index, n - 1, width)
+                except Exception:
+                    get_logger().error("api_page_resize_error book=%s page=%s %s", book_id, n, traceback.format_exc())
+                    return self._send_json(422, {"ok": False, "error": "bad_image"})
+                ctype = "image/jpeg"
+            else:
+                try:
+                    f = open(index.path, "rb")
+                except FileNotFoundError:
+                    return self._send_json(404, {"ok": False, "error": "file_not_found"})
+                ctype = mimetypes.guess_type(info.filename)[0] or "application/octet-stream"
+
+            with f:
+                if width:
+                    span = (0, os.fstat(f.fileno()).st_size)
+                    data = None
+                else:
+                    span = index.data_span(info, f)
+                    # 压缩过的成员只能解压读出；create_cbz / StreamingCbzWriter 打的包都是 STORED
+                    data = index.read(n - 1) if span is None else None
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data) if data is not None else span[1]))
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "private, max-age=86400")
+                self.end_headers()
+                try:
+                    if data is not None:
+                        self.wfile.write(data)
+                    else:
+                        self.connection.sendfile(f, offset=span[0], count=span[1])
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+        def _sections(self, book_id):
+            """返回 (书籍行, 章节列表)；索引缺失或文件已变化时重新扫描。出错时已发送错误响应并返回 (None, None)"""
+            with pool.connection() as conn:
+                row = conn.get_book(book_id)
+                if row is None:
+                    self._send_json(404, {"ok": False, "error": "book_not_found"})
+                    return None, None
+                path = row["file_path"]
+                if os.path.splitext(path)[1].lower() != ".txt":
+                    self._send_json(415, {"ok": False, "error": "not_txt"})
+                    return None, None
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    self._send_json(404, {"ok": False, "error": "file_not_found"})
+                    return None, None
+                sections = conn.get_book_sections(book_id)
+                fresh = bool(sections) and sections[0]["file_size"] == st.st_size and sections[0]["file_mtime"] == st.st_mtime
+                if not fresh:
+                    index_book_sections(conn, book_id, path)
+                    sections = conn.get_book_sections(book_id)
+            if not sections:
+                self._send_json(422, {"ok": False, "error": "unsupported_encoding"})
+                return None, None
+            return row, sections
+
+        def _send_section(self, book_id, n):
+            row, sections = self._sections(book_id)
+            if sections is None:
+                return
+            if n < 1 or n > len(sections):
+                return self._send_json(404, {"ok": False, "error": "section_not_found", "sections": len(sections)})
+            sec = sections[n - 1]
+            etag = f'"{sec["file_size"]}-{int(sec["file_mtime"] or 0)}-{n}"'
+            if _etag_matches(self.headers.get("If-None-Match") or "", etag):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            text = read_section(row["file_path"], sec["byte_offset"], sec["byte_length"], sec["encoding"])
+            raw = text.encode("utf-8")
+            gz = self._accepts_gzip() and len(raw) > 1024
+            if gz:
+                raw = gzip.compress(raw, 6)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(raw)))
+            self.send_header("ETag", etag)
+            self.send_header("Vary", "Accept-Encoding")
+            self.send_header("X-Section-Title", quote(sec["title"] or ""))
+            if gz:
+                self.send_header("Content-Encoding", "gzip")
             self.end_headers()
             self.wfile.write(raw)
 
+        def _route_book_resource(self, head=False):
+            parts = urlsplit(self.path)
+            segs = parts.path.rstrip("/").split("/")
+            if len(segs) < 4 or segs[1] != "books" or not segs[2].isdigit():
+                return False
+            book_id = int(segs[2])
+            if segs[3:] == ["file"]:
+                self._send_file(book_id, head=head)
+                return True
+            if head:
+                return False
+            if segs[3:] == ["cover"]:
+                self._send_page(book_id, 1, thumbnail_width)
+                return True
+            if segs[3:] == ["pages"]:
+                row, index = self._comic(book_id)
+                if index is not None:
+                    self._send_json(200, {"ok": True, "book_id": book_id, "pages": len(index)})
+                return True
+            if segs[3:] == ["sections"]:
+                row, sections = self._sections(book_id)
+                if sections is not None:
+                    self._send_json(200, {
+                        "ok": True,
+                        "book_id": book_id,
+                        "encoding": sections[0]["encoding"],
+                        "sections": [
+                            {"index": r["idx"], "title": r["title"], "offset": r["byte_offset"], "length": r["byte_length"]}
+                            for r in sections
+                        ],
+                    })
+                return True
+            if len(segs) == 5 and segs[3] == "sections" and segs[4].isdigit():
+                self._send_section(book_id, int(segs[4]))
+                return True
+            if len(segs) == 5 and segs[3] == "pages" and segs[4].isdigit():
+                width = _query_int(parse_qs(parts.query), "w")
+                self._send_page(book_id, int(segs[4]), _page_width(width) if width else None)
+                return True
+            return False
+
+        def do_HEAD(self):
+            if not self._route_book_resource(head=True):
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
         def do_GET(self):
-            if self.path.rstrip("/") == "" or self.path.rstrip("/") == "/health":
+            if self._route_book_resource():
+                return
+            parts = urlsplit(self.path)
+            path = parts.path.rstrip("/")
+            query = parse_qs(parts.query)
+            if path == "" or path == "/health":
                 return self._send_json(200, {"ok": True})
+            if path == "/metrics":
+                return self._send_metrics()
+            if path == "/jobs":
+                return self._list_jobs(query)
+            if path.startswith("/jobs/"):
+                return self._get_job(path[len("/jobs/"):])
+            if path == "/books":
+                return self._list_books(query)
+            if path.startswith("/books/") and path[len("/books/"):].isdigit():
+                return self._get_book(int(path[len("/books/"):]), query)
+            if path == "/authors":
+                return self._list_authors(query)
+            if path == "/search":
+                return self._list_books(query, search=True)
             return self._send_json(404, {"ok": False, "error": "not_found"})
 
+        def _send_metrics(self):
+            try:
+                with pool.connection() as conn:
+                    refresh_queue_metrics(conn)
+            except Exception:
+                pass
+            states = {}
+            for job in runner.all().values():
+                states[job["state"]] = states.get(job["state"], 0) + 1
+            for state in ("queued", "listing", "running", "done", "failed", "error"):
+                API_JOBS.set(states.get(state, 0), state)
+            raw = render_metrics().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def _list_jobs(self, query):
+            try:
+                limit = max(1, min(500, int((query.get("limit") or ["50"])[0])))
+            except Exception:
+                limit = 50
+            with pool.connection() as conn:
+                rows = {r["job_id"]: r for r in conn.get_download_job_summaries()}
+            jobs = runner.all()
+            views = [_job_view(rows.get(jid), job) for jid, job in jobs.items()]
+            views.extend(_job_view(r, None) for jid, r in rows.items() if jid not in jobs)
+            views.sort(key=lambda v: v.get("submitted_at") or "", reverse=True)
+            return self._send_json(200, {"ok": True, "jobs": views[:limit]})
+
+        def _get_job(self, job_id):
+            job = runner.get(job_id)
+            with pool.connection() as conn:
+                rows = conn.get_download_job_summaries(job_id=job_id)
+            row = rows[0] if rows else None
+            if job is None and row is None:
+                return self._send_json(404, {"ok": False, "error": "job_not_found"})
+            return self._send_json(200, {"ok": True, "job": _job_view(row, job)})
+
         def do_POST(self):
             if self.path.rstrip("/") != "/download":
                 return self._send_json(404, {"ok": False, "error": "not_found"})
@@ -47,25 +837,31 @@ def run_server(host: str = "127.0.0.1", port: int = 8765, db_path: str = "", lib
             if not url:
                 return self._send_json(400, {"ok": False, "error": "missing_url"})
 
-            out = svc.download_and_import(
-                url=url,
-                download_dir=data.get("download_dir"),
-                series_name=data.get("series_name"),
-                save_content=bool(data.get("save_content", False)),
-                kemono_dl_mode=str(data.get("kemono_dl_mode") or "attachment"),
-                dry_run=bool(data.get("dry_run", False)),
-                dup_mode=str(data.get("dup_mode") or "skip"),
+            job = runner.submit({
+                "url": url,
+                "download_dir": data.get("download_dir"),
+                "series_name": data.get("series_name"),
+                "save_content": data.get("save_content", False),
+                "kemono_dl_mode": data.get("kemono_dl_mode"),
+                "dup_mode": data.get("dup_mode"),
+                # 预览也要下载整个作者，同样放到后台执行；结果在任务详情的 result 里
+                "dry_run": bool(data.get("dry_run", False)),
+            })
+            location = f"/jobs/{job['job_id']}"
+            return self._send_json(
+                202,
+                {"ok": True, "job_id": job["job_id"], "state": job["state"], "status_url": location},
+                headers={"Location": location},
             )
-            return self._send_json(200, {"ok": True, "result": out})
 
         def log_message(self, format, *args):
             return
 
     httpd = ThreadingHTTPServer((host, int(port)), Handler)
+    httpd.daemon_threads = True
     try:
         httpd.serve_forever()
     finally:
-        try:
-            db.close()
-        except Exception:
-            pass
+        httpd.server_close()
+        runner.stop()
+        pool.close()
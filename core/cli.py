@@ -1,6 +1,8 @@
 import cmd
 import os
 import re
+import shlex
+import sys
 
 try:
     import readline  # noqa: F401
@@ -279,8 +281,39 @@ class MoeCLI(
             self._save_history()
 
 
-def main():
+def main(argv=None):
+    """nekoshelf [--profile[=文件]] [--profile-mem] [命令 ...]
+
+    带命令参数时只执行这一条命令后退出；--profile 在 cProfile 下运行 (有命令时分析这条命令，否则分析整个交互会话)。
+    """
+    args = list(sys.argv[1:] if argv is None else argv)
+    profile_out = None
+    profile_mem = False
+    while args and args[0].startswith("--profile"):
+        opt = args.pop(0)
+        if opt == "--profile-mem":
+            profile_mem = True
+        elif opt == "--profile" or opt.startswith("--profile="):
+            profile_out = opt.partition("=")[2]
+        else:
+            print(Colors.red(f"未知选项喵: {opt}"))
+            return 2
+
+    line = shlex.join(args)
     try:
-        MoeCLI().cmdloop()
+        cli = MoeCLI()
+        run = (lambda: cli.onecmd(line)) if line else cli.cmdloop
+        if profile_out is None and not profile_mem:
+            run()
+            return 0
+
+        from .profiling import profile_call
+
+        result = profile_call(run, name=args[0] if args else "session", out=profile_out or None, mem=profile_mem)
+        print(f"{Colors.BOLD}性能分析: 用时 {result['elapsed']:.2f}s{Colors.RESET}")
+        for text in result["lines"]:
+            print(text)
+        print(Colors.green(f"结果已保存喵: {result['output']}"))
     except KeyboardInterrupt:
         print(Colors.pink("\n萌萌去休息了喵~ 拜拜！"))
+    return 0
@@ -1,11 +1,12 @@
 import shlex
 from ..utils import Colors, simple_complete
 from ..download_service import DownloadImportService
+from ..scheduler import is_due, parse_time
 
 
 class DownloadCommandsMixin:
     def do_download(self, arg):
-        """下载书籍: download <URL> [--dir=目录] [--series=系列] [--save-content] [--txt] [--image]
+        """下载书籍: download <URL> [--dir=目录] [--series=系列] [--save-content] [--txt] [--image] [--queue]
 
         功能:
         从指定 URL 下载书籍，或者从支持的网站 (Pixiv, Kemono) 批量爬取作品。
@@ -37,11 +38,13 @@ class DownloadCommandsMixin:
         - --image: (仅限 Kemono) 只下载内嵌图片并打包
         - --dup-mode: 重复处理模式 skip/overwrite/rename/ask/import
         - --skip-dup/--overwrite-dup/--rename-dup/--ask-dup: 重复处理快捷开关
+        - --queue: 先把作品逐条写入持久化下载队列再依次下载；中途退出后用 jobs run 续传
         
         示例:
         1) download https://www.pixiv.net/users/123456
         2) download https://kemono.su/patreon/user/12345 --image
         3) download https://kemono.su/patreon/user/12345 --txt
+        4) download https://kemono.su/patreon/user/12345 --queue
         """
         args = shlex.split(arg or "")
         if not args:
@@ -54,6 +57,7 @@ class DownloadCommandsMixin:
         save_content = False
         dl_mode = "attachment" # default, txt, image
         dup_mode = None
+        use_queue = False
 
         # 简单的参数解析
         for a in args[1:]:
@@ -79,6 +83,8 @@ class DownloadCommandsMixin:
                 dup_mode = a.split("=", 1)[1].strip()
             elif a.startswith("--dup="):
                 dup_mode = a.split("=", 1)[1].strip()
+            elif a == "--queue":
+                use_queue = True
 
         if not dup_mode:
             low = str(url or "").lower()
@@ -96,6 +102,26 @@ class DownloadCommandsMixin:
         if user_specified_dir:
             print(Colors.cyan(f"使用指定目录: {user_specified_dir}"))
 
+        if use_queue:
+            if dup_mode == "ask":
+                # 队列条目逐个下载导入，逐条询问没有意义
+                dup_mode = "skip"
+            try:
+                job = svc.enqueue(
+                    url,
+                    download_dir=user_specified_dir,
+                    series_name=series_name,
+                    save_content=save_content,
+                    kemono_dl_mode=dl_mode,
+                    dup_mode=dup_mode,
+                )
+            except Exception as e:
+                print(Colors.red(f"入队失败喵: {e}"))
+                return
+            print(Colors.cyan(f"任务 {job['job_id']}: 共 {job['listed']} 个条目，新入队 {job['queued']} 个喵~"))
+            self._run_download_jobs(svc, job_id=job["job_id"])
+            return
+
         try:
             out = svc.download_and_import(
                 url=url,
@@ -131,9 +157,93 @@ class DownloadCommandsMixin:
             "--overwrite-dup",
             "--rename-dup",
             "--ask-dup",
+            "--queue",
         ]
         return simple_complete(text, opts)
 
+    def _run_download_jobs(self, svc, job_id=None):
+        def on_item(row, out):
+            key = row["item_key"]
+            if out.get("success") and not out.get("errors"):
+                print(Colors.green(f"✅ {key}: 已归档 {out.get('imported', 0)}，跳过 {out.get('skipped', 0)}"))
+            else:
+                print(Colors.red(f"❌ {key}: {out.get('message') or '下载失败'} (第 {row['attempts']} 次尝试)"))
+
+        try:
+            stats = svc.run_worker(job_id=job_id, on_item=on_item)
+        except KeyboardInterrupt:
+            print(Colors.yellow("\n已中断喵，未完成的条目会保留在队列里，之后用 jobs run 继续~"))
+            return
+
+        if stats.get("reclaimed"):
+            print(Colors.yellow(f"回收了 {stats['reclaimed']} 个失联进程遗留的条目喵"))
+        size_mb = float(stats.get("bytes") or 0) / 1024 / 1024
+        print(Colors.green(
+            f"队列处理完毕: 完成 {stats['done']} 个，失败 {stats['failed']} 个，"
+            f"已归档 {stats['imported']}，跳过重复 {stats['skipped']}，下载 {size_mb:.1f}MB 喵。"
+        ))
+
+    def do_jobs(self, arg):
+        """下载队列: jobs [run|retry|clear] [任务ID]
+
+        功能:
+        查看/续跑持久化下载队列 (download --queue 创建的任务)。
+        进程被中断后，未完成的条目会保留在数据库中，用 jobs run 即可从断点继续；
+        多个进程可同时 jobs run 同一个数据库来分担下载，也可以用 nekoshelf-worker 一次启动多个工作进程。
+
+        选项:
+        - (无参数): 列出所有任务及各状态条目数
+        - run [任务ID]: 领取并下载队列中未完成的条目 (不指定则处理全部任务)
+        - retry [任务ID]: 把失败的条目重新放回队列
+        - clear: 删除已全部完成的任务记录
+
+        示例:
+        1) jobs
+        2) jobs run
+        3) jobs retry 3f2a9c1d7e4b
+        """
+        args = shlex.split(arg or "")
+        sub = args[0] if args else ""
+        job_id = args[1] if len(args) > 1 else None
+
+        if sub == "run":
+            svc = DownloadImportService(self.db, self.fm)
+            self._run_download_jobs(svc, job_id=job_id)
+            return
+        if sub == "retry":
+            n = self.db.retry_failed_download_items(job_id=job_id)
+            print(Colors.green(f"已将 {n} 个失败条目放回队列喵，使用 jobs run 继续~"))
+            return
+        if sub == "clear":
+            n = self.db.clear_finished_download_jobs()
+            print(Colors.green(f"已清理 {n} 条已完成的队列记录喵~"))
+            return
+        if sub:
+            print(Colors.red(f"未知子命令: {sub} 喵... 可用: run / retry / clear"))
+            return
+
+        rows = self.db.get_download_job_summaries()
+        if not rows:
+            print(Colors.yellow("下载队列是空的喵~ 使用 download <URL> --queue 创建任务。"))
+            return
+
+        header = f"{'任务ID':<14} {'创建时间':<18} {'待下载':>6} {'进行中':>6} {'完成':>6} {'失败':>6} {'已下载':>9}  URL"
+        print(f"{Colors.BOLD}{header}{Colors.RESET}")
+        print("-" * 100)
+        for r in rows:
+            created = str(r["created_at"] or "").replace("T", " ")[:16]
+            size_mb = float(r["bytes_done"] or 0) / 1024 / 1024
+            print(
+                f"{r['job_id']:<14} {created:<18} {r['pending']:>6} {r['leased']:>6} "
+                f"{r['done']:>6} {r['failed']:>6} {size_mb:>7.1f}MB  {r['source_url']}"
+            )
+
+    def complete_pull(self, text, line, begidx, endidx):
+        return simple_complete(text, ["--all"])
+
+    def complete_jobs(self, text, line, begidx, endidx):
+        return simple_complete(text, ["run", "retry", "clear"])
+
     def do_follow(self, arg):
         """关注作者: follow <URL> [别名]
         
@@ -211,9 +321,9 @@ class DownloadCommandsMixin:
             
         print(Colors.cyan(f"正在追更 {len(subs)} 位作者:\n"))
         
-        header = f"{'ID':<4} {'上次检查':<18} {'作者/别名':<20} {'URL'}"
+        header = f"{'ID':<4} {'上次检查':<18} {'下次检查':<18} {'作者/别名':<20} {'URL'}"
         print(f"{Colors.BOLD}{header}{Colors.RESET}")
-        print("-" * 80)
+        print("-" * 100)
         
         for sub in subs:
             # Format Last Check
@@ -222,6 +332,13 @@ class DownloadCommandsMixin:
                 last_str = "从未"
             else:
                 last_str = str(last).replace('T', ' ')[:16]
+
+            # Format Next Due
+            due = parse_time(sub['next_due'])
+            if due is None or is_due(sub):
+                due_str = "已到期"
+            else:
+                due_str = due.strftime("%Y-%m-%d %H:%M")
             
             # Format Alias
             alias = sub['alias'] or ""
@@ -230,68 +347,58 @@ class DownloadCommandsMixin:
             elif not alias:
                 alias = "-"
                 
-            print(f"{sub['id']:<4} {last_str:<18} {alias:<20} {sub['url']}")
+            print(f"{sub['id']:<4} {last_str:<18} {due_str:<18} {alias:<20} {sub['url']}")
 
     def do_pull(self, arg):
-        """检查更新: pull
+        """检查更新: pull [--all]
         
         功能:
-        自动检查所有关注作者的新作品并下载。
+        自动检查关注作者的新作品并下载。
         
         特性:
         - 并行处理: 多线程同时检查多位作者，大幅提升速度。
+        - 智能调度: 根据每位作者的更新频率安排下次检查时间，只检查已到期的订阅。
         - 智能去重: 自动比对本地数据库记录，跳过已下载的作品。
         - 静默模式: 自动隐藏重复跳过的日志，仅显示重要更新信息。
         
+        选项:
+        - --all: 忽略调度，强制检查所有订阅
+        
         注意:
         默认使用 'skip' 模式跳过已存在的文件。
         """
-        subs = self.db.get_subscriptions()
-        if not subs:
-            print(Colors.yellow("没有关注的作者喵~"))
-            return
-            
-        print(Colors.cyan(f"开始检查 {len(subs)} 位作者的更新喵 (顺序检查，并行下载)...\n"))
-        
-        from core.database import DatabaseManager
-        
-        count = 0
-        total_downloaded = 0
-        
-        for sub in subs:
-            url = sub['url']
-            name = sub['alias'] or url
-            
-            # print(Colors.dim(f"正在检查: {name}..."))
-            
-            try:
-                # 默认使用 skip 模式，避免重复询问
-                svc = DownloadImportService(self.db, self.fm)
-                out = svc.download_and_import(
-                    url,
-                    kemono_dl_mode="attachment",
-                    dup_mode="skip",
-                    quiet=True
-                )
-                
-                # 更新检查时间
-                self.db.update_subscription_last_check(url)
-                
-                if out:
-                    # 优先使用 'imported' 作为下载数量
-                    dl = out.get('imported', 0)
-                    if dl > 0:
-                        print(Colors.green(f"✅ {name}: 更新了 {dl} 个文件喵！"))
-                        count += 1
-                        total_downloaded += dl
-                    elif out.get('skipped', 0) > 0:
-                         print(Colors.dim(f"💤 {name}: 暂无新内容 (跳过 {out.get('skipped')} 个)"))
-                    else:
-                        print(Colors.dim(f"💤 {name}: 暂无新内容"))
+        args = shlex.split(arg or "")
+        force_all = "--all" in args
+
+        def on_start(due, not_due):
+            if not due:
+                if not_due:
+                    print(Colors.dim(f"{not_due} 位作者都还没到检查时间喵~ 使用 pull --all 强制检查。"))
                 else:
-                    print(Colors.dim(f"💤 {name}: 暂无新内容"))
-            
-            except Exception as e:
-                print(Colors.red(f"❌ {name}: 更新失败 ({e})"))
+                    print(Colors.yellow("没有关注的作者喵~"))
+                return
+            if not_due:
+                print(Colors.dim(f"跳过 {not_due} 位未到检查时间的作者 (pull --all 可强制检查)"))
+            print(Colors.cyan(f"开始检查 {len(due)} 位作者的更新喵 (并行检查，并行下载)...\n"))
 
-        print(Colors.green(f"\n检查完毕！有更新的作者: {count} 位，共下载 {total_downloaded} 个文件喵。"))
+        def on_result(sub, out):
+            name = sub['alias'] or sub['url']
+            if not out.get("success"):
+                print(Colors.red(f"❌ {name}: 更新失败 ({out.get('message') or '未知错误'})"))
+                return
+            # 优先使用 'imported' 作为下载数量
+            dl = out.get('imported', 0)
+            if dl > 0:
+                print(Colors.green(f"✅ {name}: 更新了 {dl} 个文件喵！"))
+            elif out.get('skipped', 0) > 0:
+                print(Colors.dim(f"💤 {name}: 暂无新内容 (跳过 {out.get('skipped')} 个)"))
+            else:
+                print(Colors.dim(f"💤 {name}: 暂无新内容"))
+
+        # 所有订阅共享同一个服务 (同一套插件会话和连接池)，下载并行、导入在当前线程依次完成
+        svc = DownloadImportService(self.db, self.fm)
+        summary = svc.pull_subscriptions(force_all=force_all, on_result=on_result, on_start=on_start)
+        if summary["checked"]:
+            print(Colors.green(
+                f"\n检查完毕！有更新的作者: {summary['updated']} 位，共下载 {summary['downloaded']} 个文件喵。"
+            ))
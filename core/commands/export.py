@@ -47,7 +47,7 @@ class ExportCommandsMixin:
             return
 
         query_str, filters = parse_query_args(clean_args, strict_id_mode=True)
-        books = self.db.search_books(filters=filters, query=query_str)
+        books = list(self.db.advanced_search(query_str, filters))
         
         if not books:
             print(Colors.yellow("找不到要导出的书籍喵..."))
@@ -11,8 +11,10 @@ except ImportError:
     tqdm = None
 
 from ..import_engine import ImportEngine
+from ..file_manager import STAGING_DIRNAME
 from ..config import VERSION
-from ..utils import Colors, simple_complete, path_complete, get_logger
+from ..download_service import refresh_queue_metrics
+from ..utils import Colors, simple_complete, path_complete, get_logger, iter_metrics, render_metrics
 
 
 class SystemCommandsMixin:
@@ -186,6 +188,7 @@ class SystemCommandsMixin:
         print(f"  {cmd('unfollow')} {Colors.yellow('取消关注')}  {dim('(移除订阅)')}")
         print(f"  {cmd('subs')}     {Colors.yellow('查看订阅列表')}  {dim('(列出所有关注者)')}")
         print(f"  {cmd('pull')}     {Colors.yellow('一键更新')}  {dim('(检查所有订阅更新)')}")
+        print(f"  {cmd('jobs')}     {Colors.yellow('下载队列')}  {dim('(查看/续跑 download --queue 任务)')}")
 
         print(f"\n{section('🔧 系统维护')}")
         print(f"  {cmd('stats')}    {Colors.yellow('查看统计信息')}")
@@ -450,7 +453,9 @@ class SystemCommandsMixin:
             if os.path.isfile(root_path):
                 yield root_path
                 return
-            for r, _, files2 in os.walk(root_path):
+            for r, dirs2, files2 in os.walk(root_path):
+                # 跳过下载暂存目录，避免把进行中的下载当成孤儿文件
+                dirs2[:] = [d for d in dirs2 if d != STAGING_DIRNAME]
                 for name in files2:
                     yield os.path.join(r, name)
 
@@ -1297,7 +1302,8 @@ class SystemCommandsMixin:
             adds = []
             illegal_files = []
 
-            for root, _, files in os.walk(lib_root):
+            for root, dirs, files in os.walk(lib_root):
+                dirs[:] = [d for d in dirs if d != STAGING_DIRNAME]
                 for name in files:
                     fp = os.path.join(root, name)
                     try:
@@ -1421,7 +1427,7 @@ class SystemCommandsMixin:
         try:
             for name in sorted(os.listdir(lib_root)):
                 p = os.path.join(lib_root, name)
-                if not os.path.isdir(p):
+                if name == STAGING_DIRNAME or not os.path.isdir(p):
                     continue
                 try:
                     if os.path.islink(p):
@@ -1745,6 +1751,8 @@ class SystemCommandsMixin:
                     )
 
                 cursor.execute("DELETE FROM books")
+                # 章节索引按旧 ID 记录，重排后由阅读接口按需重建
+                cursor.execute("DELETE FROM book_sections")
                 cursor.execute("DELETE FROM sqlite_sequence WHERE name='books'")
 
                 insert_sql = '''
@@ -1770,6 +1778,323 @@ class SystemCommandsMixin:
         except Exception as e:
             print(Colors.red(f"发生错误: {e}"))
 
+    def do_serve(self, arg):
+        """启动 HTTP 服务: serve [--host=地址] [--port=端口]
+
+        功能:
+        启动本地 HTTP 接口，Ctrl+C 停止。
+        - POST /download 提交下载任务，立即返回 202 和任务 ID，下载在后台任务池中进行
+        - GET /jobs、GET /jobs/<任务ID> 查看任务进度 (完成条目数、已下载大小、速率)
+
+        选项:
+        - --host=地址: 监听地址 (默认: 127.0.0.1)
+        - --port=端口: 监听端口 (默认: 8765)
+
+        示例:
+        1) serve
+        2) serve --port 8000
+        """
+        from ..api import run_server
+
+        args = self._safe_split(arg or "")
+        host, port = "127.0.0.1", 8765
+        i = 0
+        while i < len(args):
+            a = args[i]
+            key, _, val = a.partition("=")
+            if key in ("--host", "--port") and not val and i + 1 < len(args):
+                i += 1
+                val = args[i]
+            if key == "--host" and val:
+                host = val
+            elif key == "--port" and val:
+                try:
+                    port = int(val)
+                except ValueError:
+                    print(Colors.red(f"端口必须是数字喵: {val}"))
+                    return
+            i += 1
+
+        print(Colors.pink(f"HTTP 服务已启动喵: http://{host}:{port}/ (Ctrl+C 停止)"))
+        try:
+            run_server(host=host, port=port, db_path=self.db.db_path, library_dir=self.fm.library_dir)
+        except KeyboardInterrupt:
+            print(Colors.pink("\nHTTP 服务已停止喵~ 未完成的下载条目可用 jobs run 继续。"))
+        except OSError as e:
+            print(Colors.red(f"启动失败喵: {e}"))
+
+    def complete_serve(self, text, line, begidx, endidx):
+        return simple_complete(text, ["--host=", "--port="])
+
+    def do_metrics(self, arg):
+        """查看运行指标: metrics [--prom]
+
+        功能:
+        显示本次启动以来的进程内指标：各站点下载字节、HTTP 耗时与 429 次数、下载队列条目数、
+        打包耗时、导入各阶段耗时、SQLite 语句耗时。serve 运行时同样的数据在 GET /metrics。
+
+        选项:
+        - --prom: 按 Prometheus 文本格式原样输出
+
+        示例:
+        1) metrics
+        2) metrics --prom
+        """
+        args = self._safe_split(arg or "")
+        try:
+            refresh_queue_metrics(self.db)
+        except Exception:
+            pass
+
+        if "--prom" in args:
+            print(render_metrics(), end="")
+            return
+
+        def fmt_labels(m, key):
+            return ",".join(f"{k}={v}" for k, v in zip(m.labelnames, key)) or "-"
+
+        def fmt_seconds(v):
+            if v == float("inf"):
+                return "慢于上限"
+            return f"{v * 1000:.1f}ms" if v < 1 else f"{v:.2f}s"
+
+        shown = 0
+        for m in iter_metrics():
+            children = m.children()
+            if m.kind == "histogram":
+                children = [(k, c) for k, c in children if c.count]
+            elif m.kind == "counter":
+                children = [(k, c) for k, c in children if c.value]
+            if not children:
+                continue
+            shown += 1
+            print(f"{Colors.BOLD}{m.name}{Colors.RESET} {Colors.CYAN}{m.help}{Colors.RESET}")
+            for key, child in children:
+                label = fmt_labels(m, key)
+                if m.kind == "histogram":
+                    avg = child.sum / child.count
+                    print(
+                        f"  {label:<28} 次数 {child.count:>8}  平均 {fmt_seconds(avg):>9}  "
+                        f"p50≤{fmt_seconds(child.quantile(0.5)):>9}  p95≤{fmt_seconds(child.quantile(0.95)):>9}  "
+                        f"合计 {child.sum:.2f}s"
+                    )
+                elif m.name.endswith("_bytes_total"):
+                    print(f"  {label:<28} {child.value / 1024 / 1024:.1f}MB")
+                else:
+                    print(f"  {label:<28} {int(child.value) if float(child.value).is_integer() else child.value}")
+        if not shown:
+            print(Colors.yellow("还没有记录到任何指标喵~"))
+
+    def do_trace(self, arg):
+        """流水线分段计时: trace <on|off|list|summary|clear> [参数]
+
+        功能:
+        记录每个链接从下载到导入各阶段 (列表、逐文件下载、解压、打包、整理、哈希、归档、写库) 的耗时，
+        写入 JSON Lines 文件 (配置项 trace_file 或环境变量 NEKOSHELF_TRACE_FILE)，并按运行汇总墙钟时间花在哪里。
+
+        用法:
+        - trace on [文件]: 本次会话开始记录 (默认 logs/trace.jsonl)
+        - trace off: 本次会话停止记录
+        - trace list [N]: 最近 N 次运行 (默认 20)
+        - trace summary [运行ID|last|all]: 按阶段汇总一次运行 (默认最近一次)
+        - trace clear: 清空 trace 文件
+
+        选项:
+        - --file=路径: 读取指定的 trace 文件
+        - --url=关键字: summary all 时只统计链接包含关键字的运行 (如某位作者)
+        - --top=N: summary 只显示耗时最多的 N 个阶段
+
+        示例:
+        1) trace on
+        2) trace list
+        3) trace summary
+        4) trace summary all --url=kemono.cr/fanbox/user/123
+        """
+        from .. import tracing
+
+        args = self._safe_split(arg or "")
+        opts = {}
+        rest = []
+        for a in args:
+            if a.startswith("--") and "=" in a:
+                k, v = a[2:].split("=", 1)
+                opts[k] = v
+            else:
+                rest.append(a)
+        sub = rest[0].lower() if rest else "summary"
+        rest = rest[1:]
+
+        if sub == "on":
+            path = rest[0] if rest else (tracing.trace_path() or os.path.join(os.getcwd(), "logs", "trace.jsonl"))
+            tracing.configure(path)
+            print(Colors.green(f"开始记录分段计时喵: {tracing.trace_path()}"))
+            return
+        if sub == "off":
+            tracing.configure("")
+            print(Colors.green("已停止记录分段计时喵~"))
+            return
+
+        path = opts.get("file") or tracing.trace_path() or os.path.join(os.getcwd(), "logs", "trace.jsonl")
+        if sub == "clear":
+            try:
+                open(path, "w").close()
+                print(Colors.green(f"已清空 {path} 喵~"))
+            except OSError as e:
+                print(Colors.red(f"清空失败喵: {e}"))
+            return
+        if not os.path.exists(path):
+            print(Colors.yellow(f"没有找到 trace 文件喵: {path}  (先用 trace on 或配置 trace_file 开启记录)"))
+            return
+
+        def fmt_seconds(v):
+            return f"{v * 1000:.0f}ms" if v < 1 else f"{v:.2f}s"
+
+        def fmt_time(ts):
+            return datetime.datetime.fromtimestamp(ts).strftime("%m-%d %H:%M:%S")
+
+        runs = tracing.list_runs(path)
+        if not runs:
+            print(Colors.yellow("trace 文件里还没有记录喵~"))
+            return
+
+        if sub == "list":
+            try:
+                n = int(rest[0]) if rest else 20
+            except ValueError:
+                n = 20
+            print(f"{Colors.BOLD}{'运行ID':<16}{'开始':<14}{'墙钟':>7}{'span':>7}  入口 / 链接{Colors.RESET}")
+            for run in runs[-max(1, n):]:
+                err = Colors.red(f" 出错 {run['errors']}") if run["errors"] else ""
+                print(
+                    f"{run['trace']:<18}{fmt_time(run['start']):<16}{fmt_seconds(run['wall']):>9}{run['spans']:>7}  "
+                    f"{run['name']} {Colors.CYAN}{run['url']}{Colors.RESET}{err}"
+                )
+            return
+
+        if sub != "summary":
+            print(Colors.red(f"未知的子命令喵: {sub}  (可用 on / off / list / summary / clear)"))
+            return
+
+        target = rest[0] if rest else "last"
+        if target == "all":
+            keyword = opts.get("url", "")
+            picked = [r for r in runs if keyword in r["url"]]
+        elif target == "last":
+            picked = runs[-1:]
+        else:
+            picked = [r for r in runs if r["trace"].startswith(target)]
+        if not picked:
+            print(Colors.yellow(f"没有找到匹配的运行喵: {target}"))
+            return
+
+        summary = tracing.summarize(path, traces={r["trace"] for r in picked})
+        wall = summary["wall"] if len(picked) == 1 else sum(r["wall"] for r in picked)
+        if len(picked) == 1:
+            run = picked[0]
+            print(f"{Colors.BOLD}运行 {run['trace']}{Colors.RESET}  {fmt_time(run['start'])}  {run['name']} {Colors.CYAN}{run['url']}{Colors.RESET}")
+        else:
+            print(f"{Colors.BOLD}共 {len(picked)} 次运行{Colors.RESET}")
+        print(f"墙钟 {fmt_seconds(wall)}，共 {summary['spans']} 个 span")
+        # 表头是中文，每个字占两列，宽度相应减掉
+        print(
+            f"{Colors.BOLD}{'阶段':<20}{'次数':>5}{'墙钟':>8}{'占比':>5}{'累计':>8}{'自身':>8}{'最长':>8}{Colors.RESET}"
+        )
+        try:
+            top = int(opts.get("top") or 0)
+        except ValueError:
+            top = 0
+        rows = summary["rows"][:top] if top > 0 else summary["rows"]
+        for row in rows:
+            share = (row["wall"] / wall * 100) if wall > 0 and len(picked) == 1 else 0
+            err = Colors.red(f"  出错 {row['errors']}") if row["errors"] else ""
+            print(
+                f"{row['name']:<22}{row['count']:>7}{fmt_seconds(row['wall']):>10}"
+                f"{(f'{share:.0f}%' if share else '-'):>7}{fmt_seconds(row['total']):>10}"
+                f"{fmt_seconds(row['self']):>10}{fmt_seconds(row['max']):>10}{err}"
+            )
+        print(Colors.CYAN + "墙钟: 这一阶段有任务在跑的时间 (并发的同名阶段只算一次)；自身: 扣除子阶段后的耗时" + Colors.RESET)
+
+    def do_profile(self, arg):
+        """性能分析: profile [选项] <命令 ...>
+
+        功能:
+        在 cProfile 下执行一条命令，保存 .pstats 文件并打印最耗时的函数；
+        加 --sample 改为定时采样所有线程的调用栈 (能看到下载线程池里的热点)，加 --mem 同时报告内存峰值。
+        结果默认保存在 logs/profile/ 下，旁边附带同名 .txt 摘要。
+
+        选项 (写在命令前面):
+        - --out=文件: 结果文件路径 (.pstats；采样模式为 collapsed stacks 文本)
+        - --top=N: 摘要显示的函数个数 (默认 25)
+        - --sort=cumulative|tottime|calls: cProfile 摘要的排序方式 (默认 cumulative)
+        - --sample[=毫秒]: 采样模式，默认每 5 毫秒采样一次
+        - --mem: 用 tracemalloc 记录内存峰值和占用最多的代码行 (会明显变慢)
+
+        示例:
+        1) profile clean --dry-run
+        2) profile --sort=tottime --top=40 list --limit 500
+        3) profile --sample --mem pull
+        """
+        from ..profiling import DEFAULT_TOP, SORT_KEYS, profile_call
+
+        rest = str(arg or "").strip()
+        opts = {}
+        while rest.startswith("--"):
+            token, _, tail = rest.partition(" ")
+            key, _, value = token[2:].partition("=")
+            if key not in ("out", "top", "sort", "sample", "mem"):
+                break
+            opts[key] = value
+            rest = tail.strip()
+        if not rest:
+            print(Colors.red("请在 profile 后面写上要分析的命令喵~ 例如: profile list --limit 100"))
+            return
+        name = rest.split()[0]
+        if name == "profile" or not hasattr(self, f"do_{name}"):
+            print(Colors.red(f"没有这个命令喵: {name}"))
+            return
+
+        try:
+            top = int(opts.get("top") or DEFAULT_TOP)
+        except ValueError:
+            top = DEFAULT_TOP
+        sort = opts.get("sort") or "cumulative"
+        if sort not in SORT_KEYS:
+            print(Colors.yellow(f"不支持的排序方式 {sort}，改用 cumulative 喵"))
+            sort = "cumulative"
+        interval = None
+        if "sample" in opts:
+            try:
+                interval = float(opts["sample"] or 5) / 1000
+            except ValueError:
+                interval = 0.005
+
+        result = profile_call(
+            lambda: self.onecmd(rest),
+            name=name,
+            out=opts.get("out") or None,
+            top=top,
+            sort=sort,
+            mem="mem" in opts,
+            sample_interval=interval,
+        )
+        print()
+        title = f"性能分析: {rest}  用时 {result['elapsed']:.2f}s"
+        if result["interrupted"]:
+            title += " (已中断)"
+        print(f"{Colors.BOLD}{title}{Colors.RESET}")
+        for line in result["lines"]:
+            print(line)
+        print(Colors.green(f"结果已保存喵: {result['output']}"))
+        if result["summary_path"]:
+            print(Colors.cyan(f"摘要: {result['summary_path']}"))
+
+    def complete_profile(self, text, line, begidx, endidx):
+        opts = ["--out=", "--top=", "--sort=", "--sample", "--mem"]
+        return simple_complete(text, opts + [n for n in self._cmd_names() if n != "profile"])
+
+    def complete_trace(self, text, line, begidx, endidx):
+        return simple_complete(text, ["on", "off", "list", "summary", "clear", "--file=", "--url=", "--top="])
+
     def complete_clean(self, text, line, begidx, endidx):
         opts = [
             "--dry-run",
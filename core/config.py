@@ -40,6 +40,11 @@ PIXIV_COOKIE = os.environ.get("NEKOSHELF_PIXIV_COOKIE", "")
 KEMONO_COOKIE = os.environ.get("NEKOSHELF_KEMONO_COOKIE", "")
 
 
+# 站点地址覆盖：指向本地的替身服务器 (benchmarks/fake_sites.py) 即可离线压测下载插件
+PIXIV_BASE_URL = os.environ.get("NEKOSHELF_PIXIV_BASE_URL", "").rstrip("/") or "https://www.pixiv.net"
+KEMONO_BASE_URL = os.environ.get("NEKOSHELF_KEMONO_BASE_URL", "").rstrip("/") or "https://kemono.cr"
+
+
 def _resolve_path(p: str) -> str:
     s = "" if p is None else str(p).strip()
     if not s:
@@ -105,10 +110,22 @@ def decrypt_secret(value: str) -> str:
         raise RuntimeError("Cookie 解密失败：请检查 NEKOSHELF_SECRET_KEY 与 enc: 内容") from e
 
 
+# load() 的结果 (含解密后的 Cookie)；reload 时模块重新执行，缓存随之清空
+_loaded = None
+
+
+def _copy(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: dict(v) if isinstance(v, dict) else v for k, v in cfg.items()}
+
+
 def load(reload: bool = False) -> Dict[str, Any]:
+    """读取配置；reload=False 时复用上次的结果，不会重新导入模块或解密 Cookie"""
+    global _loaded
     mod = sys.modules.get(__name__)
     if reload and mod is not None:
         mod = importlib.reload(mod)
+    elif _loaded is not None:
+        return _copy(_loaded)
 
     library_dir = _resolve_path(getattr(mod, "LIBRARY_PATH", "library"))
     db_file = _resolve_path(getattr(mod, "DB_PATH", "library.db"))
@@ -125,7 +142,7 @@ def load(reload: bool = False) -> Dict[str, Any]:
     download_cfg["pixiv_cookie"] = decrypt_secret(pixiv_cookie_raw)
     download_cfg["kemono_cookie"] = decrypt_secret(kemono_cookie_raw)
 
-    return {
+    cfg = {
         "version": getattr(mod, "VERSION", ""),
         "library_dir": library_dir,
         "db_file": db_file,
@@ -133,6 +150,8 @@ def load(reload: bool = False) -> Dict[str, Any]:
         "download_config": download_cfg,
         "update_config": dict(getattr(mod, "UPDATE_CONFIG", {}) or {}),
     }
+    _loaded = cfg
+    return _copy(cfg)
 
 
 def get_paths(reload: bool = False) -> tuple[str, str]:
@@ -180,14 +199,36 @@ DOWNLOAD_CONFIG = {
     "timeout": 10,
     "max_workers": 5,
     "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
-    
+    "segmented_threshold_mb": 64, # 超过该大小 (MB) 且服务器支持 Range 的文件启用多连接分段下载，0 表示关闭
+    "segmented_parts": 4, # 分段下载的并发连接数
+    "job_lease_seconds": 900, # 下载队列条目的租约时长 (秒)，持有进程失联超过该时间后条目会被其他进程回收
+    "job_max_attempts": 3, # 下载队列条目的最大尝试次数，超过后标记为 failed
+    "worker_threads": 2, # nekoshelf-worker 每个进程内同时处理的队列条目数
+    "pull_workers": 8, # pull 同时检查的订阅数
+    "pull_per_host": 2, # pull 时同一站点同时检查的订阅数上限 (避免触发限流)
+    "pull_min_interval_hours": 6, # 追更调度: 同一订阅两次检查的最短间隔 (小时)
+    "pull_max_interval_hours": 168, # 追更调度: 同一订阅两次检查的最长间隔 (小时)，长期不更新的作者也至少每周看一次
+    "daemon_interval_minutes": 30, # nekoshelf-daemon 两轮 pull 之间的间隔 (分钟)
+    "daemon_jitter_seconds": 300, # nekoshelf-daemon 每轮额外随机等待的最大秒数
+    "daemon_status_file": "", # nekoshelf-daemon 状态文件路径，留空则写到数据库同目录的 nekoshelf_daemon.json
+    "pack_workers": 0, # 打包 PDF 时转码图片 (PNG/WebP/CMYK 等) 的进程数，0 表示按 CPU 核数 (nekoshelf-worker 下由各工作进程均分)，1 表示在下载线程内直接转码
+    "pack_buffer_mb": 64, # 流式打包 CBZ 时乱序到达的页在内存中最多缓冲的大小 (MB)，超出部分临时写盘
+    "download_direct_to_library": True, # 未指定 --dir 时直接暂存在书库目录下的 .neko_staging，导入时重命名而非复制
+    "api_workers": 2, # HTTP 服务 (serve) 后台同时执行的下载任务数
+    "page_cache_dir": "", # HTTP 阅读接口缩放页/缩略图缓存目录，留空则为数据库同目录下的 page_cache
+    "page_cache_mb": 512, # 缩放页/缩略图缓存的最大总大小 (MB)，超出后淘汰最久未访问的
+    "thumbnail_width": 320, # 封面缩略图宽度 (像素)
+    "trace_file": "", # 下载→导入各阶段计时 (span) 写入的 JSON Lines 文件，留空不记录；也可用环境变量 NEKOSHELF_TRACE_FILE 指定
+
     # Pixiv 专属配置
     "pixiv_format": "pdf", # 漫画/插画下载格式: pdf (默认) 或 cbz
+    "pixiv_base_url": PIXIV_BASE_URL, # Pixiv 接口地址 (也可用环境变量 NEKOSHELF_PIXIV_BASE_URL 指定)；作品链接始终记为 www.pixiv.net
     "pixiv_cookie": "", # Pixiv Cookie (由环境变量 NEKOSHELF_PIXIV_COOKIE 解密后注入)
+    "pixiv_save_caption": False, # 下载作者主页时是否保存作品说明和系列名：开启 (或 download --save-content) 时逐作品请求详情；关闭时用主页批量接口预取标题/标签，请求更少，但入库的简介和 ComicInfo 说明为空
 
     # Kemono 专属配置
-    "kemono_base_url": "https://kemono.cr", # Kemono 镜像站地址
-    "kemono_api_base": "https://kemono.cr/api/v1", # Kemono API 地址
+    "kemono_base_url": KEMONO_BASE_URL, # Kemono 镜像站地址 (也可用环境变量 NEKOSHELF_KEMONO_BASE_URL 指定)
+    "kemono_api_base": f"{KEMONO_BASE_URL}/api/v1", # Kemono API 地址
     "kemono_cookie": "", # Kemono Cookie (由环境变量 NEKOSHELF_KEMONO_COOKIE 解密后注入)
     "kemono_format": "pdf", # 漫画/插画下载格式: pdf (默认) 或 cbz
     "kemono_save_content": False, # 是否在下载附件的同时保存帖子正文内容 (默认 False)
@@ -0,0 +1,197 @@
+"""追更守护进程
+
+用法:
+  nekoshelf-daemon [--interval=分钟] [--jitter=秒] [--status-file=路径] [--once]
+  python -m core.daemon ...
+
+常驻运行 pull 调度：数据库连接、插件与 HTTP 会话在整个进程生命周期内复用，
+每轮只检查已到期的订阅；两轮之间等待 interval 再加上随机抖动，避免整点扎堆请求。
+每次状态变化都会写入状态文件 (JSON)，便于外部监控读取健康状况。
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import signal
+import threading
+import time
+import traceback
+
+from . import config
+from .database import DatabaseManager
+from .download_service import DownloadImportService
+from .file_manager import FileManager
+from .utils import Colors, get_logger
+
+
+def _now_str():
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class PullDaemon:
+    def __init__(self, interval: float, jitter: float, status_file: str):
+        cfg = config.load(reload=True)
+        self.interval = max(60.0, float(interval))
+        self.jitter = max(0.0, float(jitter))
+        self.status_file = status_file
+        self.db = DatabaseManager(cfg["db_file"])
+        self.fm = FileManager(cfg["library_dir"])
+        # 整个守护进程共用一个服务：插件实例、HTTP 会话和连接池在多轮之间保持热状态
+        self.svc = DownloadImportService(self.db, self.fm)
+        self._stop = threading.Event()
+        self.status = {
+            "pid": os.getpid(),
+            "started_at": _now_str(),
+            "state": "starting",
+            "healthy": True,
+            "runs": 0,
+            "consecutive_failures": 0,
+            "interval_seconds": self.interval,
+            "jitter_seconds": self.jitter,
+            "last_run": None,
+            "last_error": None,
+            "next_run_at": None,
+            "updated_at": None,
+        }
+
+    def stop(self, *_):
+        self._stop.set()
+
+    def _write_status(self, **changes):
+        self.status.update(changes)
+        self.status["updated_at"] = _now_str()
+        # 最近一次成功完成的时间超过 3 个周期就视为不健康
+        last = self.status.get("last_run") or {}
+        healthy = self.status["consecutive_failures"] == 0
+        finished = last.get("finished_at")
+        if finished:
+            try:
+                age = (datetime.datetime.now() - datetime.datetime.strptime(finished, "%Y-%m-%d %H:%M:%S")).total_seconds()
+                healthy = healthy and age <= 3 * (self.interval + self.jitter)
+            except Exception:
+                pass
+        self.status["healthy"] = healthy
+
+        if not self.status_file:
+            return
+        try:
+            parent = os.path.dirname(self.status_file)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            tmp = self.status_file + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.status, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.status_file)
+        except Exception:
+            pass
+
+    def run_once(self):
+        started = _now_str()
+        t0 = time.time()
+        self._write_status(state="pulling")
+        errors = []
+
+        def on_result(sub, out):
+            name = sub["alias"] or sub["url"]
+            if not out.get("success"):
+                errors.append({"url": sub["url"], "message": str(out.get("message") or "")[:300]})
+                print(Colors.red(f"[{_now_str()}] ❌ {name}: {out.get('message') or '更新失败'}"), flush=True)
+            elif int(out.get("imported") or 0) > 0:
+                print(Colors.green(f"[{_now_str()}] ✅ {name}: 更新了 {out.get('imported')} 个文件"), flush=True)
+
+        try:
+            # 每轮只重新读取一次配置 (含 Cookie 解密)，本轮的所有下载共用这份配置
+            config.load(reload=True)
+            summary = self.svc.pull_subscriptions(on_result=on_result)
+        except Exception as e:
+            get_logger().error("daemon_pull_error %s", traceback.format_exc())
+            self._write_status(
+                state="idle",
+                consecutive_failures=self.status["consecutive_failures"] + 1,
+                last_error={"at": _now_str(), "message": str(e)},
+            )
+            print(Colors.red(f"[{_now_str()}] 本轮检查失败: {e}"), flush=True)
+            return
+
+        last_run = dict(summary)
+        last_run.update({
+            "started_at": started,
+            "finished_at": _now_str(),
+            "duration_seconds": round(time.time() - t0, 2),
+            "errors": errors[:20],
+        })
+        self._write_status(
+            state="idle",
+            runs=self.status["runs"] + 1,
+            consecutive_failures=0,
+            last_run=last_run,
+        )
+        try:
+            get_logger().info(
+                "daemon_pull_done checked=%s updated=%s downloaded=%s failed=%s",
+                summary["checked"], summary["updated"], summary["downloaded"], summary["failed"],
+            )
+        except Exception:
+            pass
+        if summary["checked"]:
+            print(Colors.cyan(
+                f"[{_now_str()}] 本轮检查 {summary['checked']} 位 (未到期 {summary['skipped_not_due']} 位)，"
+                f"有更新 {summary['updated']} 位，下载 {summary['downloaded']} 个文件，失败 {summary['failed']} 位"
+            ), flush=True)
+
+    def run_forever(self):
+        print(Colors.pink(f"追更守护进程已启动喵 (pid {os.getpid()})，状态文件: {self.status_file or '-'}"), flush=True)
+        try:
+            while not self._stop.is_set():
+                self.run_once()
+                wait = self.interval + random.uniform(0, self.jitter)
+                next_at = (datetime.datetime.now() + datetime.timedelta(seconds=wait)).strftime("%Y-%m-%d %H:%M:%S")
+                self._write_status(next_run_at=next_at)
+                self._stop.wait(wait)
+        finally:
+            self._write_status(state="stopped", next_run_at=None)
+            try:
+                self.db.close()
+            except Exception:
+                pass
+            print(Colors.pink("追更守护进程已退出喵~"), flush=True)
+
+
+def main(argv=None):
+    cfg = config.load(reload=True)
+    dl_cfg = cfg["download_config"]
+    default_status = str(dl_cfg.get("daemon_status_file") or "").strip()
+    if not default_status:
+        default_status = os.path.join(os.path.dirname(cfg["db_file"]), "nekoshelf_daemon.json")
+
+    parser = argparse.ArgumentParser(prog="nekoshelf-daemon", description="常驻运行 pull 调度")
+    parser.add_argument("--interval", type=float, default=float(dl_cfg.get("daemon_interval_minutes", 30) or 30),
+                        help="两轮检查之间的间隔 (分钟)")
+    parser.add_argument("--jitter", type=float, default=float(dl_cfg.get("daemon_jitter_seconds", 300) or 0),
+                        help="每轮额外随机等待的最大秒数")
+    parser.add_argument("--status-file", default=default_status, help="状态/健康信息 JSON 文件路径")
+    parser.add_argument("--once", action="store_true", help="只跑一轮后退出 (便于测试或交给外部调度)")
+    args = parser.parse_args(argv)
+
+    daemon = PullDaemon(args.interval * 60, args.jitter, args.status_file)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            signal.signal(sig, daemon.stop)
+        except Exception:
+            pass
+
+    if args.once:
+        try:
+            daemon.run_once()
+        finally:
+            daemon._write_status(state="stopped")
+            daemon.db.close()
+        return
+
+    daemon.run_forever()
+
+
+if __name__ == "__main__":
+    main()
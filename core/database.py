@@ -1,19 +1,73 @@
 import sqlite3
 import datetime
+import json
 import os
+import time
+import uuid
 from .config import DB_FILE
+from .scheduler import next_due, parse_time
+from .utils import DB_STATEMENT_SECONDS
 from typing import Optional
 
+_STATEMENT_OPS = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "PRAGMA", "CREATE", "ALTER", "BEGIN", "VACUUM")
+
+
+def _statement_op(sql):
+    head = str(sql).lstrip()[:7].upper()
+    for op in _STATEMENT_OPS:
+        if head.startswith(op):
+            return op.lower()
+    return "other"
+
+
+class _TimedCursor(sqlite3.Cursor):
+    # 记录 execute 本身的耗时 (SELECT 不含之后逐行 fetch 的时间)，按语句类型进直方图
+    def execute(self, sql, parameters=()):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            DB_STATEMENT_SECONDS.observe(time.perf_counter() - t0, _statement_op(sql))
+
+    def executemany(self, sql, seq_of_parameters):
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            DB_STATEMENT_SECONDS.observe(time.perf_counter() - t0, _statement_op(sql))
+
+
+class _TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
 class DatabaseManager:
-    def __init__(self, db_path):
+    def __init__(self, db_path, check_same_thread=True):
         self.db_path = db_path
         self.conn = None
+        self._check_same_thread = check_same_thread
         self._suspend_commit = False
         self._connect()
 
     def _connect(self):
-        self.conn = sqlite3.connect(self.db_path)
+        # 下载队列允许多个进程同时读写同一个库：等锁而不是立刻报 database is locked
+        self.conn = sqlite3.connect(
+            self.db_path, timeout=30, check_same_thread=self._check_same_thread, factory=_TimedConnection
+        )
         self.conn.row_factory = sqlite3.Row
+        try:
+            # WAL 下读写互不阻塞，多进程 worker 并发写入时只在提交瞬间串行
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        except Exception:
+            pass
         self._create_tables()
 
     def _create_tables(self):
@@ -137,6 +191,19 @@ class DatabaseManager:
             )
         ''')
 
+        # 追更调度统计字段 (针对旧数据库 subscriptions 表)
+        cursor.execute("PRAGMA table_info(subscriptions)")
+        s_columns = [info[1] for info in cursor.fetchall()]
+        if 'last_new_at' not in s_columns:
+            cursor.execute("ALTER TABLE subscriptions ADD COLUMN last_new_at TIMESTAMP")
+        if 'avg_interval' not in s_columns:
+            # 相邻两次发现新作品的平均间隔 (秒)
+            cursor.execute("ALTER TABLE subscriptions ADD COLUMN avg_interval REAL")
+        if 'empty_checks' not in s_columns:
+            cursor.execute("ALTER TABLE subscriptions ADD COLUMN empty_checks INTEGER DEFAULT 0")
+        if 'next_due' not in s_columns:
+            cursor.execute("ALTER TABLE subscriptions ADD COLUMN next_due TIMESTAMP")
+
         # 创建 posts 表 (存储作品元数据)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS posts (
@@ -172,6 +239,66 @@ class DatabaseManager:
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_resources_file_hash ON resources(file_hash)")
         cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_resources_post_file ON resources(post_id, file_path)")
 
+        # 创建 download_jobs 表 (持久化下载队列：一行一个待下载条目，进程崩溃后可续传)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS download_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                source_url TEXT NOT NULL,
+                item_key TEXT NOT NULL,
+                item_url TEXT NOT NULL,
+                payload TEXT,
+                options TEXT,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                bytes_done INTEGER DEFAULT 0,
+                last_error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(job_id, item_key)
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_download_jobs_state ON download_jobs(state, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_download_jobs_job ON download_jobs(job_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_download_jobs_item ON download_jobs(item_key)")
+
+        # 创建 book_sections 表 (TXT 章节索引：按章 seek 读取，file_size/file_mtime 用于判断索引是否过期)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS book_sections (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                book_id INTEGER NOT NULL,
+                idx INTEGER NOT NULL,
+                title TEXT,
+                byte_offset INTEGER NOT NULL,
+                byte_length INTEGER NOT NULL,
+                encoding TEXT,
+                file_size INTEGER,
+                file_mtime REAL,
+                UNIQUE(book_id, idx)
+            )
+        ''')
+
+        # 书库修订号：books / authors 每次增删改都 +1，HTTP 接口据此生成 ETag
+        # (PRAGMA data_version 只对“其他连接”的提交可见，且各连接数值不同，不适合跨连接比较)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS library_revision (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                rev INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO library_revision (id, rev) VALUES (1, 0)")
+        for table in ("books", "authors"):
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_rev AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE library_revision SET rev = rev + 1 WHERE id = 1;
+                    END
+                ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_books_author ON books(author)")
+
         self.conn.commit()
 
     def add_subscription(self, url, alias=None):
@@ -205,6 +332,41 @@ class DatabaseManager:
         cursor.execute("UPDATE subscriptions SET last_check = ? WHERE url = ?", (now, url))
         self.conn.commit()
 
+    def record_subscription_check(self, url, new_items, schedule_cfg=None):
+        """记录一次追更检查结果，更新间隔统计并排期下次检查"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT last_new_at, avg_interval, empty_checks FROM subscriptions WHERE url = ?", (url,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+
+        now = datetime.datetime.now()
+        last_new_at = parse_time(row["last_new_at"])
+        avg_interval = row["avg_interval"]
+        empty_checks = int(row["empty_checks"] or 0)
+
+        if int(new_items or 0) > 0:
+            if last_new_at is not None:
+                gap = max((now - last_new_at).total_seconds(), 0.0)
+                # 指数滑动平均：近期的更新节奏权重更大
+                avg_interval = gap if not avg_interval else 0.7 * float(avg_interval) + 0.3 * gap
+            last_new_at = now
+            empty_checks = 0
+        else:
+            empty_checks += 1
+
+        due = next_due(now, avg_interval, empty_checks, schedule_cfg or {})
+        cursor.execute(
+            """
+            UPDATE subscriptions
+            SET last_check = ?, last_new_at = ?, avg_interval = ?, empty_checks = ?, next_due = ?
+            WHERE url = ?
+            """,
+            (now, last_new_at, avg_interval, empty_checks, due, url),
+        )
+        self.conn.commit()
+        return due
+
     def update_subscription_alias(self, url, alias):
         cursor = self.conn.cursor()
         cursor.execute("UPDATE subscriptions SET alias = ? WHERE url = ?", (alias, url))
@@ -443,6 +605,13 @@ class DatabaseManager:
     def advanced_search(self, query=None, filters=None):
         if not query and not filters:
             return []
+        where, params = self._search_where(query, filters)
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT * FROM books WHERE " + where, params)
+        return cursor.fetchall()
+
+    def _search_where(self, query=None, filters=None):
+        """advanced_search 的过滤条件，返回 (WHERE 子句, 参数)"""
 
         def _to_ascii_punct(s):
             s = "" if s is None else str(s)
@@ -487,8 +656,7 @@ class DatabaseManager:
                 out.append(f"%{v}%")
             return out
             
-        cursor = self.conn.cursor()
-        sql = "SELECT * FROM books WHERE 1=1"
+        sql = "1=1"
         params = []
         
         # 通用关键词搜索 (标题/作者/标签) - 支持模糊搜索
@@ -541,9 +709,67 @@ class DatabaseManager:
                     else:
                         sql += " AND (" + " OR ".join([f"{key} LIKE ?"] * len(pats)) + ")"
                         params.extend(pats)
-                    
+
+        return sql, params
+
+    BOOK_FIELDS = (
+        "id", "title", "author", "tags", "status", "series", "file_path", "file_hash",
+        "file_size", "file_mtime", "file_type", "import_date", "created_at",
+    )
+
+    def get_library_revision(self):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT rev FROM library_revision WHERE id = 1")
+        row = cursor.fetchone()
+        return int(row[0]) if row else 0
+
+    def iter_books_page(self, after_id=None, limit=100, fields=None, query=None, filters=None, descending=False):
+        """
+        按 id 键集分页逐行产出书籍 (游标式，不一次性 fetchall)。
+        after_id 为上一页最后一本的 id；limit <= 0 表示不限条数；fields 为要返回的列 (id 总会包含)。
+        query / filters 与 advanced_search 含义相同。
+        """
+        cols = [c for c in (fields or self.BOOK_FIELDS) if c in self.BOOK_FIELDS]
+        if "id" not in cols:
+            cols.insert(0, "id")
+        where, params = self._search_where(query, filters)
+        if after_id is not None:
+            where += " AND id < ?" if descending else " AND id > ?"
+            params.append(int(after_id))
+        sql = f"SELECT {', '.join(cols)} FROM books WHERE {where} ORDER BY id {'DESC' if descending else 'ASC'}"
+        if limit and int(limit) > 0:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        cursor = self.conn.cursor()
         cursor.execute(sql, params)
-        return cursor.fetchall()
+        while True:
+            rows = cursor.fetchmany(256)
+            if not rows:
+                return
+            yield from rows
+
+    def iter_authors_page(self, after_id=None, limit=100):
+        """按 id 键集分页逐行产出作者及其书籍数"""
+        sql = '''
+            SELECT a.id, a.name, a.is_full, a.last_work_date, a.last_import_date, a.contact,
+                   (SELECT COUNT(*) FROM books b WHERE b.author = a.name) AS book_count
+            FROM authors a
+        '''
+        params = []
+        if after_id is not None:
+            sql += " WHERE a.id > ?"
+            params.append(int(after_id))
+        sql += " ORDER BY a.id ASC"
+        if limit and int(limit) > 0:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        cursor = self.conn.cursor()
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(256)
+            if not rows:
+                return
+            yield from rows
 
     def get_stats(self):
         cursor = self.conn.cursor()
@@ -573,16 +799,39 @@ class DatabaseManager:
 
     def delete_book(self, book_id):
         cursor = self.conn.cursor()
+        cursor.execute('DELETE FROM book_sections WHERE book_id = ?', (book_id,))
         cursor.execute('DELETE FROM books WHERE id = ?', (book_id,))
         self._commit_if_needed()
         return cursor.rowcount > 0
 
+    def replace_book_sections(self, book_id, sections, encoding, file_size, file_mtime):
+        """sections 为 [(标题, 字节偏移, 字节长度)]，整体替换该书的章节索引"""
+        cursor = self.conn.cursor()
+        cursor.execute('DELETE FROM book_sections WHERE book_id = ?', (book_id,))
+        cursor.executemany(
+            '''
+            INSERT INTO book_sections (book_id, idx, title, byte_offset, byte_length, encoding, file_size, file_mtime)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''',
+            [
+                (book_id, i + 1, title, int(offset), int(length), encoding, file_size, file_mtime)
+                for i, (title, offset, length) in enumerate(sections or [])
+            ],
+        )
+        self._commit_if_needed()
+
+    def get_book_sections(self, book_id):
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT * FROM book_sections WHERE book_id = ? ORDER BY idx', (book_id,))
+        return cursor.fetchall()
+
     def clear_all(self):
         """Clear all data from the database."""
         cursor = self.conn.cursor()
         cursor.execute("BEGIN TRANSACTION")
         try:
             cursor.execute("DELETE FROM books")
+            cursor.execute("DELETE FROM book_sections")
             cursor.execute("DELETE FROM authors")
             cursor.execute("DELETE FROM subscriptions")
             cursor.execute("DELETE FROM download_records")
@@ -654,6 +903,223 @@ class DatabaseManager:
         cursor.execute('SELECT * FROM resources WHERE post_id = ?', (post_id,))
         return cursor.fetchall()
 
+    def find_resources_by_file_hash(self, file_hash, limit=20):
+        if not file_hash:
+            return []
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT * FROM resources WHERE file_hash = ? ORDER BY downloaded_at DESC LIMIT ?', (file_hash, int(limit)))
+        return cursor.fetchall()
+
+    def has_file_hash(self, file_hash):
+        """内容寻址去重：resources 或 books 中已有该哈希即视为已拥有"""
+        file_hash = "" if file_hash is None else str(file_hash).strip().lower()
+        if not file_hash:
+            return False
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT 1 FROM resources WHERE file_hash = ? LIMIT 1', (file_hash,))
+        if cursor.fetchone() is not None:
+            return True
+        cursor.execute('SELECT 1 FROM books WHERE file_hash = ? LIMIT 1', (file_hash,))
+        return cursor.fetchone() is not None
+
+    def enqueue_download_items(self, job_id, source_url, items, options=None):
+        """把条目写入下载队列；同一条目已在其他任务中排队/进行中则跳过。返回实际入队数。"""
+        cursor = self.conn.cursor()
+        opts = json.dumps(options or {}, ensure_ascii=False)
+        now = datetime.datetime.now()
+        queued = 0
+        for it in items or []:
+            key = str(it.get("key") or it.get("url") or "").strip()
+            item_url = str(it.get("url") or "").strip()
+            if not key or not item_url:
+                continue
+            payload = it.get("payload")
+            cursor.execute(
+                '''
+                INSERT OR IGNORE INTO download_jobs
+                    (job_id, source_url, item_key, item_url, payload, options, state, created_at, updated_at)
+                SELECT ?, ?, ?, ?, ?, ?, 'pending', ?, ?
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM download_jobs WHERE item_key = ? AND state IN ('pending', 'leased')
+                )
+                ''',
+                (
+                    job_id,
+                    source_url,
+                    key,
+                    item_url,
+                    json.dumps(payload, ensure_ascii=False) if payload is not None else None,
+                    opts,
+                    now,
+                    now,
+                    key,
+                ),
+            )
+            queued += cursor.rowcount if cursor.rowcount > 0 else 0
+        self.conn.commit()
+        return queued
+
+    def lease_download_item(self, owner, lease_seconds=900, job_id=None, max_attempts=3):
+        """原子地领取一个待下载条目 (多进程安全)，返回该行；队列为空返回 None"""
+        cursor = self.conn.cursor()
+        token = f"{owner}:{uuid.uuid4().hex[:8]}"
+        expires = time.time() + float(lease_seconds)
+        now = datetime.datetime.now()
+        where = "state = 'pending' AND attempts < ?"
+        params = [int(max_attempts)]
+        if job_id:
+            where += " AND job_id = ?"
+            params.append(job_id)
+        cursor.execute(
+            f'''
+            UPDATE download_jobs
+            SET state = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ?
+            WHERE id = (SELECT id FROM download_jobs WHERE {where} ORDER BY id LIMIT 1)
+            ''',
+            [token, expires, now] + params,
+        )
+        self.conn.commit()
+        if cursor.rowcount <= 0:
+            return None
+        cursor.execute("SELECT * FROM download_jobs WHERE lease_owner = ? AND state = 'leased'", (token,))
+        return cursor.fetchone()
+
+    def renew_download_lease(self, item_id, lease_owner, lease_seconds=900):
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "UPDATE download_jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ? AND state = 'leased'",
+            (time.time() + float(lease_seconds), item_id, lease_owner),
+        )
+        self.conn.commit()
+        return cursor.rowcount > 0
+
+    def complete_download_item(self, item_id, lease_owner, bytes_done=0):
+        cursor = self.conn.cursor()
+        cursor.execute(
+            '''
+            UPDATE download_jobs
+            SET state = 'done', lease_owner = NULL, lease_expires = NULL, bytes_done = ?, last_error = NULL, updated_at = ?
+            WHERE id = ? AND lease_owner = ?
+            ''',
+            (int(bytes_done or 0), datetime.datetime.now(), item_id, lease_owner),
+        )
+        self.conn.commit()
+        return cursor.rowcount > 0
+
+    def fail_download_item(self, item_id, lease_owner, error="", max_attempts=3):
+        """释放失败条目：次数未用完回到 pending 等待重试，否则标记为 failed"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            '''
+            UPDATE download_jobs
+            SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                lease_owner = NULL, lease_expires = NULL, last_error = ?, updated_at = ?
+            WHERE id = ? AND lease_owner = ?
+            ''',
+            (int(max_attempts), str(error or "")[:500], datetime.datetime.now(), item_id, lease_owner),
+        )
+        self.conn.commit()
+        return cursor.rowcount > 0
+
+    def list_leased_download_items(self):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id, lease_owner, lease_expires FROM download_jobs WHERE state = 'leased'")
+        return cursor.fetchall()
+
+    def reclaim_download_leases(self, item_ids=None, max_attempts=3):
+        """回收租约：默认回收所有已过期的租约，也可指定条目 (例如持有进程已退出)。
+        最后一次尝试中途失联的条目标记为 failed，否则既领取不到也无法重试、重新入队"""
+        cursor = self.conn.cursor()
+        now = datetime.datetime.now()
+        count = 0
+        cursor.execute(
+            '''
+            UPDATE download_jobs
+            SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                lease_owner = NULL, lease_expires = NULL, updated_at = ?
+            WHERE state = 'leased' AND (lease_expires IS NULL OR lease_expires < ?)
+            ''',
+            (int(max_attempts), now, time.time()),
+        )
+        count += max(cursor.rowcount, 0)
+        for item_id in item_ids or []:
+            cursor.execute(
+                '''
+                UPDATE download_jobs
+                SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                WHERE id = ? AND state = 'leased'
+                ''',
+                (int(max_attempts), now, item_id),
+            )
+            count += max(cursor.rowcount, 0)
+        self.conn.commit()
+        return count
+
+    def release_download_item(self, item_id, lease_owner):
+        """放回被中断 (如 Ctrl+C) 的条目：回到 pending 并退还这次尝试次数"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            '''
+            UPDATE download_jobs
+            SET state = 'pending', attempts = MAX(attempts - 1, 0), lease_owner = NULL, lease_expires = NULL, updated_at = ?
+            WHERE id = ? AND lease_owner = ? AND state = 'leased'
+            ''',
+            (datetime.datetime.now(), item_id, lease_owner),
+        )
+        self.conn.commit()
+        return cursor.rowcount > 0
+
+    def retry_failed_download_items(self, job_id=None):
+        cursor = self.conn.cursor()
+        sql = "UPDATE download_jobs SET state = 'pending', attempts = 0, updated_at = ? WHERE state = 'failed'"
+        params = [datetime.datetime.now()]
+        if job_id:
+            sql += " AND job_id = ?"
+            params.append(job_id)
+        cursor.execute(sql, params)
+        self.conn.commit()
+        return cursor.rowcount
+
+    def clear_finished_download_jobs(self):
+        """删除所有条目都已完成的任务"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            '''
+            DELETE FROM download_jobs WHERE job_id IN (
+                SELECT job_id FROM download_jobs GROUP BY job_id
+                HAVING SUM(CASE WHEN state = 'done' THEN 0 ELSE 1 END) = 0
+            )
+            '''
+        )
+        self.conn.commit()
+        return cursor.rowcount
+
+    def get_download_job_summaries(self, job_id=None):
+        cursor = self.conn.cursor()
+        sql = '''
+            SELECT job_id, MIN(source_url) AS source_url, MIN(created_at) AS created_at, MAX(updated_at) AS updated_at,
+                   COUNT(*) AS total,
+                   SUM(CASE WHEN state = 'pending' THEN 1 ELSE 0 END) AS pending,
+                   SUM(CASE WHEN state = 'leased' THEN 1 ELSE 0 END) AS leased,
+                   SUM(CASE WHEN state = 'done' THEN 1 ELSE 0 END) AS done,
+                   SUM(CASE WHEN state = 'failed' THEN 1 ELSE 0 END) AS failed,
+                   SUM(COALESCE(bytes_done, 0)) AS bytes_done
+            FROM download_jobs
+        '''
+        params = []
+        if job_id:
+            sql += " WHERE job_id = ?"
+            params.append(job_id)
+        sql += " GROUP BY job_id ORDER BY MIN(id) DESC"
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+    def count_download_items_by_state(self):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT state, COUNT(*) FROM download_jobs GROUP BY state")
+        return {row[0]: int(row[1]) for row in cursor.fetchall()}
+
     def update_book(self, book_id, **kwargs):
         if not kwargs:
             return False
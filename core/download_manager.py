@@ -1,5 +1,6 @@
 from typing import Optional
 from .plugins.download import DownloadPlugin, CommonPlugin, PixivPlugin, KemonoPlugin
+from .tracing import span
 
 class DownloadManager:
     def __init__(self):
@@ -8,6 +9,15 @@ class DownloadManager:
             KemonoPlugin(),
             CommonPlugin() # CommonPlugin should be the last one as a fallback
         ]
+        self._cfg = None
+
+    def configure(self, cfg: dict):
+        """把下载配置应用到各插件；配置没变时什么都不做 (插件实例和会话在线程间共享)"""
+        if cfg == self._cfg:
+            return
+        for plugin in self.plugins:
+            plugin.configure(cfg)
+        self._cfg = dict(cfg)
 
     def get_plugin(self, url: str) -> Optional[DownloadPlugin]:
         for plugin in self.plugins:
@@ -27,7 +37,8 @@ class DownloadManager:
                 # 这里假设调用方 (DownloadImportService) 会将 db 放入 kwargs 或者插件不需要 db
                 # 但为了安全起见，我们在 DownloadImportService 中调用时注入 db
                 
-                ok, msg, out = plugin.download(url, download_dir, **kwargs)
+                with span("download_with_meta", url=url, plugin=getattr(plugin, "name", None)):
+                    ok, msg, out = plugin.download(url, download_dir, **kwargs)
                 return {
                     "success": bool(ok),
                     "message": msg,
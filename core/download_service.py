@@ -1,11 +1,80 @@
 import datetime
+import json
 import os
+import shutil
+import socket
 import tempfile
-from typing import Optional
+import threading
+import urllib.parse
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Optional
 
+from . import config
+from .database import DatabaseManager
 from .download_manager import DownloadManager
 from .import_engine import ImportEngine
-from .utils import get_logger
+from .scheduler import is_due
+from .tracing import span
+from .utils import QUEUE_ITEMS, get_logger
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # Windows 上 os.kill(pid, 0) 会直接结束进程，无法用来探活
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except Exception:
+        return True
+    return True
+
+
+def refresh_queue_metrics(db):
+    """把 download_jobs 各状态条目数写进 nekoshelf_queue_items；读取指标前调用"""
+    counts = db.count_download_items_by_state()
+    for state in ("pending", "leased", "done", "failed"):
+        QUEUE_ITEMS.set(counts.get(state, 0), state)
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+class _LeaseKeeper(threading.Thread):
+    """下载单个条目期间定期续租，防止长下载被其他进程当作失联回收"""
+
+    def __init__(self, db_path, item_id, lease_owner, lease_seconds):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.item_id = item_id
+        self.lease_owner = lease_owner
+        self.lease_seconds = lease_seconds
+        self._stop_event = threading.Event()
+
+    def run(self):
+        interval = max(5.0, float(self.lease_seconds) / 3.0)
+        db = None
+        try:
+            while not self._stop_event.wait(interval):
+                try:
+                    if db is None:
+                        db = DatabaseManager(self.db_path)
+                    db.renew_download_lease(self.item_id, self.lease_owner, self.lease_seconds)
+                except Exception:
+                    pass
+        finally:
+            if db is not None:
+                try:
+                    db.close()
+                except Exception:
+                    pass
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=5)
 
 
 class DownloadImportService:
@@ -23,6 +92,12 @@ class DownloadImportService:
     def manager(self):
         return self._downloader
 
+    def refresh_config(self):
+        """把当前下载配置应用到插件；在分发到线程池之前调用，下载线程里不再读取配置"""
+        cfg = config.get_download_config(reload=False)
+        self._downloader.configure(cfg)
+        return cfg
+
     def download_and_import(
         self,
         url: str,
@@ -33,11 +108,43 @@ class DownloadImportService:
         dry_run: bool = False,
         dup_mode: str = "skip",
         quiet: bool = False,
+        job_payload: Optional[dict] = None,
     ):
+        self.refresh_config()
+        ctx = self._download_phase(
+            url,
+            download_dir=download_dir,
+            series_name=series_name,
+            save_content=save_content,
+            kemono_dl_mode=kemono_dl_mode,
+            quiet=quiet,
+            job_payload=job_payload,
+        )
+        return self._import_phase(ctx, dry_run=dry_run, dup_mode=dup_mode, quiet=quiet)
+
+    def _download_phase(
+        self,
+        url: str,
+        download_dir: Optional[str] = None,
+        series_name: Optional[str] = None,
+        save_content: bool = False,
+        kemono_dl_mode: str = "attachment",
+        quiet: bool = False,
+        job_payload: Optional[dict] = None,
+        db=None,
+    ):
+        """只做网络下载，不碰导入；db 为空时使用 self.db (跨线程调用时需传入本线程的连接)"""
         download_dir = (download_dir or "").strip()
         created_temp = False
+        staging_dir = None
         if not download_dir:
-            download_dir = tempfile.mkdtemp(prefix="neko_dl_")
+            # 默认直接暂存在书库所在的文件系统上，导入时原子重命名即可，每个文件只落盘一次
+            if config.get_download_config(reload=False).get("download_direct_to_library", True):
+                try:
+                    staging_dir = str(self.fm.staging_dir())
+                except Exception:
+                    staging_dir = None
+            download_dir = tempfile.mkdtemp(prefix="neko_dl_", dir=staging_dir)
             created_temp = True
 
         logger = get_logger()
@@ -46,15 +153,51 @@ class DownloadImportService:
             logger.info("download_start url=%s download_dir=%s", url, download_dir)
         except Exception:
             pass
-        dl = self._downloader.download_with_meta(
-            url,
-            download_dir,
-            series_name=series_name,
-            save_content=save_content,
-            kemono_dl_mode=kemono_dl_mode,
-            db=self.db, # 注入数据库实例
-            quiet=quiet,
-        )
+        # 插件在下载时边写边算哈希，按绝对路径登记到这里，导入时直接复用
+        file_hashes = {}
+        # 下载和导入可能在不同线程里进行，trace ID 放进 ctx 让导入阶段接到同一次运行上
+        with span("download", url=url) as sp:
+            try:
+                dl = self._downloader.download_with_meta(
+                    url,
+                    download_dir,
+                    series_name=series_name,
+                    save_content=save_content,
+                    kemono_dl_mode=kemono_dl_mode,
+                    db=db if db is not None else self.db, # 注入数据库实例
+                    quiet=quiet,
+                    file_hashes=file_hashes,
+                    job_payload=job_payload,
+                    staging_dir=staging_dir,
+                )
+            except Exception as e:
+                dl = {"success": False, "message": str(e), "output_path": None}
+            sp.set(success=bool(dl.get("success")), files=len(file_hashes))
+        return {
+            "url": url,
+            "dl": dl,
+            "download_dir": download_dir,
+            "created_temp": created_temp,
+            "file_hashes": file_hashes,
+            "started_at": started_at,
+            "trace": sp.trace_id,
+        }
+
+    def _import_phase(self, ctx, dry_run: bool = False, dup_mode: str = "skip", quiet: bool = False):
+        """把 _download_phase 的产物导入书库并清理临时目录；必须在 self.db 所属线程调用"""
+        with span("import", trace=ctx.get("trace"), url=ctx["url"]) as sp:
+            out = self._import_phase_inner(ctx, dry_run=dry_run, dup_mode=dup_mode, quiet=quiet)
+            sp.set(imported=out.get("imported", 0), skipped=out.get("skipped", 0))
+        return out
+
+    def _import_phase_inner(self, ctx, dry_run: bool = False, dup_mode: str = "skip", quiet: bool = False):
+        logger = get_logger()
+        url = ctx["url"]
+        dl = ctx["dl"]
+        download_dir = ctx["download_dir"]
+        created_temp = ctx["created_temp"]
+        file_hashes = ctx["file_hashes"]
+        started_at = ctx["started_at"]
         ok = bool(dl.get("success"))
         msg = str(dl.get("message") or "")
         output_path = dl.get("output_path")
@@ -64,10 +207,8 @@ class DownloadImportService:
             except Exception:
                 pass
             if created_temp:
-                try:
-                    os.rmdir(download_dir)
-                except Exception:
-                    pass
+                # 失败时暂存目录里只剩半成品，整个删掉
+                shutil.rmtree(download_dir, ignore_errors=True)
             return {
                 "success": False,
                 "message": msg,
@@ -78,6 +219,16 @@ class DownloadImportService:
                 "started_at": started_at,
             }
 
+        # 直通书库模式下文件会被移走，先统计下载量
+        downloaded_bytes = 0
+        for fp in file_hashes:
+            try:
+                downloaded_bytes += os.path.getsize(fp)
+            except Exception:
+                pass
+
+        # 暂存文件用完即弃，归档时直接重命名进书库，不再复制第二份
+        move = created_temp and not dry_run
         imported = 0
         skipped = 0
         errors = []
@@ -100,6 +251,8 @@ class DownloadImportService:
                                 dup_choice=dup_choice,
                                 hash_cache=hash_cache,
                                 quiet=quiet,
+                                known_hash=file_hashes.get(os.path.abspath(one)),
+                                move=move,
                             )
                             if ok2:
                                 if is_dup:
@@ -122,6 +275,8 @@ class DownloadImportService:
                             dup_choice=dup_choice,
                             hash_cache=hash_cache,
                             quiet=quiet,
+                            known_hash=file_hashes.get(os.path.abspath(one)),
+                            move=move,
                         )
                         if ok2:
                             if is_dup:
@@ -145,6 +300,7 @@ class DownloadImportService:
             if m:
                 skipped += int(m.group(1))
 
+
         if created_temp:
             try:
                 for root, dirs, files in os.walk(download_dir, topdown=False):
@@ -170,5 +326,226 @@ class DownloadImportService:
             "imported": imported,
             "skipped": skipped,
             "errors": errors,
+            "bytes": downloaded_bytes,
             "started_at": started_at,
         }
+
+    def download_and_import_many(
+        self,
+        urls: Iterable[str],
+        max_workers: int = 4,
+        per_host: int = 2,
+        dry_run: bool = False,
+        dup_mode: str = "skip",
+        quiet: bool = False,
+        **download_opts,
+    ):
+        """
+        并发下载多个链接，共享本服务的插件与 HTTP 会话；同一站点同时最多 per_host 个。
+        下载在线程池里进行 (每个线程用自己的数据库连接)，导入在调用线程串行完成，
+        按完成顺序 yield (url, result)，result 与 download_and_import 的返回值相同。
+        """
+        def host_of(u):
+            try:
+                return urllib.parse.urlparse(u).netloc.lower()
+            except Exception:
+                return ""
+
+        # 按站点轮流排队，避免线程池一开始就被同一站点占满、全部卡在站点限流上
+        by_host = {}
+        for u in urls:
+            by_host.setdefault(host_of(u), []).append(u)
+        ordered = []
+        queues = list(by_host.values())
+        while any(queues):
+            for q in queues:
+                if q:
+                    ordered.append(q.pop(0))
+
+        host_limits = {h: threading.Semaphore(max(1, int(per_host))) for h in by_host}
+        local = threading.local()
+        self.refresh_config()
+
+        def task(u):
+            # 线程结束时 threading.local 被释放，连接随之关闭
+            if getattr(local, "db", None) is None:
+                local.db = DatabaseManager(self.db.db_path)
+            with host_limits[host_of(u)]:
+                return self._download_phase(u, quiet=quiet, db=local.db, **download_opts)
+
+        with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as executor:
+            futures = {executor.submit(task, u): u for u in ordered}
+            for future in as_completed(futures):
+                u = futures[future]
+                try:
+                    out = self._import_phase(future.result(), dry_run=dry_run, dup_mode=dup_mode, quiet=quiet)
+                except Exception as e:
+                    out = {"success": False, "message": str(e), "imported": 0, "skipped": 0}
+                yield u, out
+
+    def pull_subscriptions(self, force_all: bool = False, on_result=None, on_start=None):
+        """
+        检查订阅更新：只处理已到期的订阅 (force_all 时全部)，检查后记录调度统计。
+        on_start(due, skipped) 在开始前回调；on_result(sub, out) 每完成一个订阅回调一次。返回汇总 dict。
+        """
+        cfg = config.get_download_config(reload=False)
+        subs = list(self.db.get_subscriptions() or [])
+        due = subs if force_all else [sub for sub in subs if is_due(sub)]
+        summary = {
+            "total": len(subs),
+            "checked": 0,
+            "skipped_not_due": len(subs) - len(due),
+            "updated": 0,
+            "downloaded": 0,
+            "failed": 0,
+        }
+        if on_start is not None:
+            on_start(due, summary["skipped_not_due"])
+        if not due:
+            return summary
+
+        by_url = {sub["url"]: sub for sub in due}
+        results = self.download_and_import_many(
+            list(by_url.keys()),
+            max_workers=int(cfg.get("pull_workers", 8) or 8),
+            per_host=int(cfg.get("pull_per_host", 2) or 2),
+            kemono_dl_mode="attachment",
+            dup_mode="skip",  # 默认使用 skip 模式，避免重复询问
+            quiet=True,
+        )
+        for url, out in results:
+            summary["checked"] += 1
+            if out.get("success"):
+                dl = int(out.get("imported") or 0)
+                # 更新检查时间与调度统计
+                self.db.record_subscription_check(url, dl, schedule_cfg=cfg)
+                if dl > 0:
+                    summary["updated"] += 1
+                    summary["downloaded"] += dl
+            else:
+                summary["failed"] += 1
+            if on_result is not None:
+                on_result(by_url[url], out)
+        return summary
+
+    def enqueue(
+        self,
+        url: str,
+        download_dir: Optional[str] = None,
+        series_name: Optional[str] = None,
+        save_content: bool = False,
+        kemono_dl_mode: str = "attachment",
+        dup_mode: str = "skip",
+        quiet: bool = False,
+        job_id: Optional[str] = None,
+    ):
+        """把下载任务展开为条目写入 download_jobs 队列，返回任务 ID；真正的下载由 run_worker 完成"""
+        self.refresh_config()
+        plugin = self._downloader.get_plugin(url)
+        items = None
+        if plugin is not None:
+            with span("list_items", url=url, plugin=getattr(plugin, "name", None)):
+                items = plugin.list_items(url, db=self.db, quiet=quiet, kemono_dl_mode=kemono_dl_mode, save_content=save_content)
+        if items is None:
+            items = [{"key": url, "url": url}]
+
+        job_id = job_id or new_job_id()
+        options = {
+            "download_dir": download_dir or "",
+            "series_name": series_name,
+            "save_content": bool(save_content),
+            "kemono_dl_mode": kemono_dl_mode,
+            "dup_mode": dup_mode,
+        }
+        queued = self.db.enqueue_download_items(job_id, url, items, options)
+        try:
+            get_logger().info("download_enqueue url=%s job=%s listed=%s queued=%s", url, job_id, len(items), queued)
+        except Exception:
+            pass
+        return {"job_id": job_id, "listed": len(items), "queued": queued}
+
+    def reclaim_stale_leases(self):
+        """回收过期租约，以及本机上已退出进程遗留的租约"""
+        host = socket.gethostname()
+        dead = []
+        try:
+            for row in self.db.list_leased_download_items():
+                parts = str(row["lease_owner"] or "").split(":")
+                if len(parts) >= 2 and parts[0] == host and parts[1].isdigit():
+                    if int(parts[1]) != os.getpid() and not _pid_alive(int(parts[1])):
+                        dead.append(row["id"])
+        except Exception:
+            pass
+        max_attempts = int(config.get_download_config(reload=False).get("job_max_attempts", 3) or 3)
+        return self.db.reclaim_download_leases(item_ids=dead, max_attempts=max_attempts)
+
+    def run_worker(self, job_id: Optional[str] = None, quiet: bool = False, on_item=None):
+        """
+        从 download_jobs 队列逐条领取并下载导入，直到没有可领取的条目。
+        多个进程可同时对同一个数据库运行本方法。on_item(row, out) 在每个条目结束后回调。
+        """
+        cfg = self.refresh_config()
+        lease_seconds = int(cfg.get("job_lease_seconds", 900) or 900)
+        max_attempts = int(cfg.get("job_max_attempts", 3) or 3)
+        owner = f"{socket.gethostname()}:{os.getpid()}"
+
+        stats = {"done": 0, "failed": 0, "imported": 0, "skipped": 0, "bytes": 0, "reclaimed": 0}
+        stats["reclaimed"] = self.reclaim_stale_leases()
+
+        while True:
+            row = self.db.lease_download_item(owner, lease_seconds, job_id=job_id, max_attempts=max_attempts)
+            if row is None:
+                break
+
+            try:
+                options = json.loads(row["options"] or "{}")
+            except Exception:
+                options = {}
+            try:
+                payload = json.loads(row["payload"]) if row["payload"] else None
+            except Exception:
+                payload = None
+
+            keeper = _LeaseKeeper(self.db.db_path, row["id"], row["lease_owner"], lease_seconds)
+            keeper.start()
+            try:
+                out = self.download_and_import(
+                    row["item_url"],
+                    download_dir=options.get("download_dir") or None,
+                    series_name=options.get("series_name"),
+                    save_content=bool(options.get("save_content")),
+                    kemono_dl_mode=options.get("kemono_dl_mode") or "attachment",
+                    dup_mode=options.get("dup_mode") or "skip",
+                    quiet=quiet,
+                    job_payload=payload,
+                )
+            except Exception as e:
+                out = {"success": False, "message": str(e)}
+            except BaseException:
+                # Ctrl+C 等中断：立即放回队列，否则本进程仍存活，jobs run 要等租约过期才能接着下
+                keeper.stop()
+                self.db.release_download_item(row["id"], row["lease_owner"])
+                raise
+            finally:
+                keeper.stop()
+
+            if out.get("success") and not out.get("errors"):
+                self.db.complete_download_item(row["id"], row["lease_owner"], bytes_done=out.get("bytes", 0))
+                stats["done"] += 1
+            else:
+                err = out.get("message") or ""
+                if out.get("errors"):
+                    err = f"导入失败 {len(out['errors'])} 个文件"
+                self.db.fail_download_item(row["id"], row["lease_owner"], error=err, max_attempts=max_attempts)
+                stats["failed"] += 1
+            stats["imported"] += int(out.get("imported") or 0)
+            stats["skipped"] += int(out.get("skipped") or 0)
+            stats["bytes"] += int(out.get("bytes") or 0)
+
+            if on_item is not None:
+                try:
+                    on_item(row, out)
+                except Exception:
+                    pass
+
+        return stats
@@ -5,6 +5,9 @@ import datetime
 from pathlib import Path
 from .config import LIBRARY_DIR
 
+# 书库内的下载暂存目录：与书库同一文件系统，归档时直接重命名而不是再复制一遍
+STAGING_DIRNAME = ".neko_staging"
+
 class FileManager:
     def __init__(self, library_dir):
         self.library_dir = Path(library_dir)
@@ -92,7 +95,20 @@ class FileManager:
         except Exception:
             pass
 
-    def import_file(self, source_path, title, author, series="", filename_pattern: str = ""):
+    def staging_dir(self):
+        path = self.library_dir / STAGING_DIRNAME
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def _move_into_place(self, source, dest_path):
+        # 同一文件系统上 rename 是原子的：目标路径要么不存在，要么就是完整文件
+        try:
+            os.rename(source, dest_path)
+        except OSError:
+            # 跨设备等情况退回 copy + delete
+            shutil.move(str(source), str(dest_path))
+
+    def import_file(self, source_path, title, author, series="", filename_pattern: str = "", move: bool = False):
         source = Path(source_path)
         if not source.exists():
             raise FileNotFoundError(f"找不到文件喵: {source_path}")
@@ -144,8 +160,11 @@ class FileManager:
             # 内容不一致，获取唯一文件名
             dest_path = self._get_unique_path(dest_dir, dest_filename)
 
-        # 复制文件
-        shutil.copy2(source, dest_path)
+        # 复制文件 (move=True 时源文件是可丢弃的暂存文件，直接移入书库)
+        if move:
+            self._move_into_place(source, dest_path)
+        else:
+            shutil.copy2(source, dest_path)
         return str(dest_path), extension.lstrip('.')
 
     def delete_file(self, file_path):
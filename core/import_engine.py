@@ -3,10 +3,14 @@ import os
 import re
 import shlex
 import shutil
+import time
 import datetime
 
+from .file_manager import STAGING_DIRNAME
+from .text_sections import index_book_sections
+from .tracing import annotate, record, traced
 from .utils import Colors
-from .utils import get_logger, normalize_title, fullwidth_to_halfwidth
+from .utils import get_logger, normalize_title, fullwidth_to_halfwidth, IMPORT_STAGE_SECONDS
 
 
 class ImportEngine:
@@ -575,8 +579,18 @@ class ImportEngine:
                 return s[len(p) :].lstrip()
         return s
 
-    def import_one(self, file_path, overrides=None, dry_run=False, dup_mode="ask", dup_choice=None, hash_cache=None, quiet=False):
+    @traced("import_one")
+    def import_one(self, file_path, overrides=None, dry_run=False, dup_mode="ask", dup_choice=None, hash_cache=None, quiet=False, known_hash=None, move=False):
         overrides = overrides or {}
+        stage_start = [time.perf_counter()]
+        annotate(file=os.path.basename(str(file_path)))
+
+        def stage_done(stage):
+            now = time.perf_counter()
+            IMPORT_STAGE_SECONDS.observe(now - stage_start[0], stage)
+            # 各阶段同时记为 import_one 的子 span (import.hash / import.file / import.db ...)
+            record(f"import.{stage}", stage_start[0], now)
+            stage_start[0] = now
         meta = self.parse_metadata_from_filename(file_path) or {}
 
         title = (overrides.get("title") or meta.get("title") or "").strip()
@@ -663,7 +677,8 @@ class ImportEngine:
                 if os.path.commonpath([src_abs, lib_root]) == lib_root:
                     rel = os.path.relpath(src_abs, lib_root)
                     pparts = rel.split(os.sep)
-                    if len(pparts) >= 2:
+                    # 暂存目录里的下载还没有归档，不能按书库目录结构推断作者/系列
+                    if len(pparts) >= 2 and pparts[0] != STAGING_DIRNAME:
                         if (not author or author == "佚名") and ("author" not in overrides) and not meta.get("author"):
                             author = self._strip_author_prefix(pparts[0])
                         if (not series) and ("series" not in overrides) and not meta.get("series") and len(pparts) >= 3:
@@ -682,17 +697,24 @@ class ImportEngine:
             print(Colors.yellow("请使用 --title 手动补全，或按规范命名文件喵~"))
             return False, False, dup_choice
 
+        stage_done("metadata")
         fp_raw = "" if file_path is None else str(file_path)
         fp_norm = os.path.normpath(fp_raw)
         fp_abs = self.abs_norm(fp_raw)
         file_hash = ""
-        if hash_cache is not None and fp_abs in hash_cache:
+        if known_hash:
+            # 下载阶段边写边算出的哈希，直接作为指纹，省去再读一遍文件
+            file_hash = str(known_hash).strip().lower()
+            if hash_cache is not None:
+                hash_cache[fp_abs] = file_hash
+        elif hash_cache is not None and fp_abs in hash_cache:
             file_hash = hash_cache.get(fp_abs) or ""
         else:
             file_hash = self.file_hash(fp_abs)
             if hash_cache is not None:
                 hash_cache[fp_abs] = file_hash
 
+        stage_done("hash")
         dup_book = None
         try:
             platform = (
@@ -797,6 +819,7 @@ class ImportEngine:
                             pass
                         break
 
+        stage_done("dedup")
         action = None
         if dup_book is not None:
             logger = get_logger()
@@ -926,8 +949,9 @@ class ImportEngine:
             filename_pattern = str(self._naming_rules().get("filename_pattern") or "").strip()
         except Exception:
             filename_pattern = ""
+        stage_start[0] = time.perf_counter()
         try:
-            saved_path, file_type = self.fm.import_file(file_path, title, author, series, filename_pattern=filename_pattern)
+            saved_path, file_type = self.fm.import_file(file_path, title, author, series, filename_pattern=filename_pattern, move=move)
         except Exception as e:
             print(Colors.red(f"归档失败喵: {e}"))
             try:
@@ -936,6 +960,7 @@ class ImportEngine:
                 pass
             return False, False, dup_choice
 
+        stage_done("file")
         book_id = None
         try:
             book_id = self.db.add_book(title, author, tags, status, series, saved_path, file_type, file_hash=file_hash)
@@ -950,6 +975,16 @@ class ImportEngine:
             except Exception:
                 pass
             return False, False, dup_choice
+        stage_done("db")
+        if str(file_type).lower() == "txt" and book_id is not None:
+            try:
+                index_book_sections(self.db, int(book_id), saved_path)
+                stage_done("sections")
+            except Exception as e:
+                try:
+                    logger.info("import_sections_failed book_id=%s error=%s", book_id, str(e))
+                except Exception:
+                    pass
         try:
             platform = (overrides.get("source_platform") if overrides and "source_platform" in overrides else meta.get("source_platform"))
             work_id = (overrides.get("source_work_id") if overrides and "source_work_id" in overrides else meta.get("source_work_id"))
@@ -992,7 +1027,9 @@ class ImportEngine:
             return
 
         if recursive:
-            for root, _, files in os.walk(path):
+            for root, dirs, files in os.walk(path):
+                # 书库暂存目录里是下载中的半成品，不参与导入
+                dirs[:] = [d for d in dirs if d != STAGING_DIRNAME]
                 for name in files:
                     ext = os.path.splitext(name)[1].lower()
                     if ext in self.import_exts:
@@ -0,0 +1,196 @@
+"""CBZ 按页读取与缩放页磁盘缓存
+
+- 页序与 create_cbz 一致 (cbz_page_names)；每本书的页表 (ZIP 中央目录) 解析一次后按 (路径, 大小, mtime) 缓存，
+  取单页时只读该成员，不解压整个压缩包。
+- ?w= 缩放页和封面缩略图在打包用的共享进程池里生成，结果写入磁盘缓存，
+  键为 (文件哈希, 页号, 宽度)；缓存总大小超过上限时按最近使用时间淘汰。
+"""
+
+import hashlib
+import os
+import struct
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+from .plugins.download.pack_pool import get_pool, resize_page
+from .plugins.download.utils import cbz_page_names
+
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+
+class CbzIndex:
+    """一本 CBZ 的页表：按阅读顺序排列的 ZipInfo"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with zipfile.ZipFile(path) as zf:
+            infos = {i.filename: i for i in zf.infolist()}
+        self.pages: List[zipfile.ZipInfo] = [infos[n] for n in cbz_page_names(infos.keys())]
+        self._offsets = {}
+
+    def __len__(self):
+        return len(self.pages)
+
+    def data_span(self, info: zipfile.ZipInfo, f) -> Optional[Tuple[int, int]]:
+        """未压缩 (ZIP_STORED) 且未加密的成员返回其数据在文件中的 (偏移, 长度)，可直接 sendfile；否则返回 None"""
+        if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+            return None
+        offset = self._offsets.get(info.filename)
+        if offset is None:
+            # 中央目录只记录本地文件头的位置，本地头里的文件名/扩展字段长度可能与中央目录不同，需要读一次
+            f.seek(info.header_offset)
+            header = f.read(_LOCAL_HEADER.size)
+            if len(header) != _LOCAL_HEADER.size or header[:4] != b"PK\x03\x04":
+                return None
+            fields = _LOCAL_HEADER.unpack(header)
+            offset = info.header_offset + _LOCAL_HEADER.size + fields[-2] + fields[-1]
+            self._offsets[info.filename] = offset
+        return offset, info.file_size
+
+    def read(self, n: int) -> bytes:
+        with zipfile.ZipFile(self.path) as zf:
+            return zf.read(self.pages[n])
+
+
+class PageCache:
+    """缩放页的磁盘 LRU 缓存；get 在未命中时生成并写入，同一键的并发请求只生成一次"""
+
+    def __init__(self, cache_dir: str, max_bytes: int, index_entries: int = 64):
+        self.cache_dir = cache_dir
+        self.max_bytes = max(0, int(max_bytes))
+        self.index_entries = index_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total = 0
+        self._pending = {}
+        self._indexes = OrderedDict()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        found = []
+        for root, _dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith(".tmp"):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found.append((st.st_mtime, path, st.st_size))
+        # 命中时会更新文件 mtime，重启后按 mtime 恢复 LRU 顺序
+        for _mtime, path, size in sorted(found):
+            self._entries[path] = size
+            self._total += size
+        self._evict()
+
+    def index(self, path: str) -> CbzIndex:
+        st = os.stat(path)
+        key = (path, st.st_size, st.st_mtime)
+        with self._lock:
+            idx = self._indexes.get(key)
+            if idx is not None:
+                self._indexes.move_to_end(key)
+                return idx
+        idx = CbzIndex(path)
+        with self._lock:
+            self._indexes[key] = idx
+            while len(self._indexes) > self.index_entries:
+                self._indexes.popitem(last=False)
+        return idx
+
+    def _path_for(self, file_hash: str, page: int, width: int) -> str:
+        name = f"{file_hash}_{page}_{width}.jpg"
+        return os.path.join(self.cache_dir, file_hash[:2], name)
+
+    def get(self, file_hash: str, index: CbzIndex, page: int, width: int) -> str:
+        """返回 (file_hash, page, width) 对应缩放页的缓存文件路径"""
+        path = self._path_for(file_hash, page, width)
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+                fut = None
+            else:
+                fut = self._pending.get(path)
+                owner = fut is None
+                if owner:
+                    fut = self._pending[path] = Future()
+        if fut is None:
+            try:
+                os.utime(path)
+                return path
+            except OSError:
+                # 文件被外部删掉了：当作未命中重新生成
+                with self._lock:
+                    self._total -= self._entries.pop(path, 0)
+                return self.get(file_hash, index, page, width)
+
+        if not owner:
+            return fut.result()
+        try:
+            data = self._render(index.read(page), width)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            with self._lock:
+                self._entries[path] = len(data)
+                self._total += len(data)
+                self._evict()
+            fut.set_result(path)
+            return path
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(path, None)
+
+    def open(self, file_hash: str, index: CbzIndex, page: int, width: int):
+        """同 get，但返回已打开的缓存文件；在锁内打开，拿到路径后文件不会再被其他线程的淘汰删掉"""
+        for _ in range(3):
+            path = self.get(file_hash, index, page, width)
+            with self._lock:
+                try:
+                    return open(path, "rb")
+                except FileNotFoundError:
+                    # 在 get 返回和加锁之间被淘汰了：重新生成
+                    self._total -= self._entries.pop(path, 0)
+        raise FileNotFoundError(path)
+
+    def _render(self, data: bytes, width: int) -> bytes:
+        pool = get_pool()
+        if pool is not None:
+            try:
+                return pool.submit(resize_page, data, width).result()
+            except Exception:
+                pass
+        return resize_page(data, width)
+
+    def _evict(self):
+        # 调用方持有 self._lock
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            path, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def book_file_key(row) -> str:
+    """缓存键里的文件哈希；旧记录没有 file_hash 时用路径、大小和 mtime 代替"""
+    if row["file_hash"]:
+        return str(row["file_hash"])
+    st = os.stat(row["file_path"])
+    raw = f"{row['file_path']}:{st.st_size}:{st.st_mtime}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
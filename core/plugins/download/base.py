@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 
 class DownloadPlugin(ABC):
     @abstractmethod
@@ -28,9 +28,27 @@ class DownloadPlugin(ABC):
         """Return the name of the plugin."""
         pass
 
+    def configure(self, cfg: Dict) -> None:
+        """
+        应用下载配置 (config.get_download_config 的结果)。
+        服务层在一批下载开始前、分发到线程池之前调用一次；同一个插件实例会被多个线程共用，
+        download / list_items 里只读取这里保存的配置，不要再自己重新加载。
+        """
+        self._cfg = dict(cfg)
+
     def get_artist_name(self, url: str) -> str:
         """
         Get artist name from URL.
         Optional implementation.
         """
         return ""
+
+    def list_items(self, url: str, **kwargs) -> Optional[List[Dict]]:
+        """
+        把合集类链接 (作者主页/系列) 展开为可单独下载的条目，供持久化下载队列使用。
+
+        每个条目形如 {"key": 去重键, "url": 单条目链接, "payload": 可选的预取数据}，
+        payload 会在下载该条目时通过 kwargs["job_payload"] 原样传回，避免重复请求。
+        返回 None 表示该链接本身就是单个条目 (或插件不支持展开)。
+        """
+        return None
@@ -1,12 +1,18 @@
 import os
+import hashlib
 import requests
 import re
 import urllib.parse
 from .base import DownloadPlugin
-from ...utils import Colors
+from .utils import sha256_file
+from .segmented import SegmentedDownloader, RangeNotSupported
+from ...utils import Colors, DOWNLOAD_BYTES, instrument_session, url_host
 from ... import config
 
 class CommonPlugin(DownloadPlugin):
+    def __init__(self):
+        self.configure(config.get_download_config(reload=False))
+
     @property
     def name(self) -> str:
         return "Common Downloader"
@@ -16,7 +22,7 @@ class CommonPlugin(DownloadPlugin):
 
     def download(self, url: str, output_dir: str, **kwargs) -> tuple[bool, str, str]:
         try:
-            cfg = config.get_download_config(reload=True)
+            cfg = self._cfg
             # Setup headers
             headers = {
                 'User-Agent': cfg.get("user_agent", 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36')
@@ -26,6 +32,23 @@ class CommonPlugin(DownloadPlugin):
             
             filename = self._get_filename(url, {})
             dest_path = os.path.join(output_dir, filename)
+            file_hashes = kwargs.get("file_hashes")
+
+            session = instrument_session(requests.Session())
+            session.headers.update(headers)
+            session.verify = False
+            segmenter = SegmentedDownloader(session, cfg)
+
+            # 上次分段下载没完成：先按分段状态续传
+            if segmenter.has_state(dest_path):
+                total_size = segmenter.probe(url)
+                if total_size:
+                    digest = segmenter.download(url, dest_path, total_size, progress=self._print_progress)
+                    print()
+                    if file_hashes is not None:
+                        file_hashes[os.path.abspath(dest_path)] = digest
+                    return True, f"下载成功喵！已保存到: {dest_path}", dest_path
+                segmenter.discard(dest_path)
 
             existing = 0
             try:
@@ -37,9 +60,11 @@ class CommonPlugin(DownloadPlugin):
             if existing > 0:
                 headers["Range"] = f"bytes={existing}-"
 
-            r = requests.get(url, stream=True, headers=headers, verify=False, timeout=cfg.get("timeout", 10))
+            r = session.get(url, stream=True, headers=headers, timeout=cfg.get("timeout", 10))
             try:
                 if existing > 0 and r.status_code in (416,):
+                    if file_hashes is not None:
+                        file_hashes[os.path.abspath(dest_path)] = sha256_file(dest_path)
                     return True, f"已存在(断点续传已完成)喵！已保存到: {dest_path}", dest_path
 
                 if existing > 0 and r.status_code != 206:
@@ -54,24 +79,52 @@ class CommonPlugin(DownloadPlugin):
                         r.close()
                     except Exception:
                         pass
-                    r = requests.get(url, stream=True, headers=headers, verify=False, timeout=cfg.get("timeout", 10))
+                    r = session.get(url, stream=True, headers=headers, timeout=cfg.get("timeout", 10))
 
                 r.raise_for_status()
 
+                # 大文件且支持 Range：改走多连接分段下载
+                seg_total = segmenter.eligible(r) if existing == 0 else 0
+                if seg_total:
+                    r.close()
+                    try:
+                        digest = segmenter.download(url, dest_path, seg_total, progress=self._print_progress)
+                        print()
+                        if file_hashes is not None:
+                            file_hashes[os.path.abspath(dest_path)] = digest
+                        return True, f"下载成功喵！已保存到: {dest_path}", dest_path
+                    except RangeNotSupported:
+                        segmenter.discard(dest_path)
+                        r = session.get(url, stream=True, headers=headers, timeout=cfg.get("timeout", 10))
+                        r.raise_for_status()
+
                 total_size = int(r.headers.get('content-length', 0))
 
                 mode = 'ab' if existing > 0 and r.status_code == 206 else 'wb'
+                # 边写边算哈希；断点续传时先把已有部分算进去
+                h = hashlib.sha256()
+                if mode == 'ab':
+                    with open(dest_path, 'rb') as f:
+                        for buf in iter(lambda: f.read(1024 * 1024), b""):
+                            h.update(buf)
                 with open(dest_path, mode) as f:
+                    bytes_ctr = DOWNLOAD_BYTES.labels(url_host(url))
                     if total_size == 0:
                         f.write(r.content)
+                        h.update(r.content)
+                        bytes_ctr.inc(len(r.content))
                     else:
                         downloaded = 0
                         for chunk in r.iter_content(chunk_size=8192):
                             if chunk:
                                 f.write(chunk)
+                                h.update(chunk)
                                 downloaded += len(chunk)
+                                bytes_ctr.inc(len(chunk))
                                 self._print_progress(downloaded, total_size)
                 print()
+                if file_hashes is not None:
+                    file_hashes[os.path.abspath(dest_path)] = h.hexdigest()
             finally:
                 try:
                     r.close()
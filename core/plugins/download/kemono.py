@@ -14,10 +14,12 @@ from typing import List, Dict, Tuple, Optional, Any
 from tqdm import tqdm
 from bs4 import BeautifulSoup
 
-from core.utils import Colors
+from core.utils import Colors, DOWNLOAD_BYTES, instrument_session, url_host
 from core.database import DatabaseManager
+from core.tracing import annotate, bind, span, traced
 from .base import DownloadPlugin
-from .utils import sanitize_filename, set_file_time, create_cbz, create_pdf
+from .utils import sanitize_filename, set_file_time, create_pdf, sha256_file, StreamingCbzWriter, PostContent, parse_post_content
+from .segmented import SegmentedDownloader, RangeNotSupported
 from ... import config
 
 class KemonoPlugin(DownloadPlugin):
@@ -28,34 +30,38 @@ class KemonoPlugin(DownloadPlugin):
     
     BASE_URL = "https://kemono.cr"
     API_BASE = "https://kemono.cr/api/v1"
+    IMAGE_EXTS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
     
     def __init__(self):
-        self.session = requests.Session()
+        self.session = instrument_session(requests.Session())
         retries = requests.adapters.Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
         # 优化: 增大连接池大小，避免并发下载时连接被回收
         adapter = requests.adapters.HTTPAdapter(max_retries=retries, pool_connections=50, pool_maxsize=50)
         self.session.mount('https://', adapter)
         self.session.mount('http://', adapter)
         
-        self._refresh_config(reload=True)
+        self.configure(config.get_download_config(reload=False))
 
-    def _refresh_config(self, reload: bool = False):
-        cfg = config.get_download_config(reload=reload)
+    def configure(self, cfg: Dict):
+        super().configure(cfg)
         self.BASE_URL = str(cfg.get("kemono_base_url", "https://kemono.cr") or "https://kemono.cr")
-        self.API_BASE = str(cfg.get("kemono_api_base", "https://kemono.cr/api/v1") or "https://kemono.cr/api/v1")
+        self.API_BASE = str(cfg.get("kemono_api_base", "") or f"{self.BASE_URL.rstrip('/')}/api/v1")
         self.MAX_WORKERS = int(cfg.get("max_workers", 5) or 5)
         self.TIMEOUT = int(cfg.get("timeout", 10) or 10)
         self.MAX_RETRIES = int(cfg.get("max_retries", 3) or 3)
+        self.segmenter = SegmentedDownloader(self.session, cfg)
 
-        # 更新 Session 的重试策略
-        retries = requests.adapters.Retry(
-            total=self.MAX_RETRIES, 
-            backoff_factor=1, 
-            status_forcelist=[500, 502, 503, 504]
-        )
-        adapter = requests.adapters.HTTPAdapter(max_retries=retries, pool_connections=50, pool_maxsize=50)
-        self.session.mount('https://', adapter)
-        self.session.mount('http://', adapter)
+        # 更新 Session 的重试策略；配置没变时保留原有连接池 (pull 并发时多个下载共享这个会话)
+        if getattr(self, "_mounted_retries", None) != self.MAX_RETRIES:
+            retries = requests.adapters.Retry(
+                total=self.MAX_RETRIES, 
+                backoff_factor=1, 
+                status_forcelist=[500, 502, 503, 504]
+            )
+            adapter = requests.adapters.HTTPAdapter(max_retries=retries, pool_connections=50, pool_maxsize=50)
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+            self._mounted_retries = self.MAX_RETRIES
 
         headers = {
             "User-Agent": cfg.get("user_agent", "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"),
@@ -73,7 +79,6 @@ class KemonoPlugin(DownloadPlugin):
                     pass
 
         self.session.headers.update(headers)
-        return cfg
 
     @property
     def name(self) -> str:
@@ -106,13 +111,51 @@ class KemonoPlugin(DownloadPlugin):
         else:
             return False, "链接格式不对喵... 需要类似 https://kemono.cr/patreon/user/12345 或 具体帖子链接", None
 
+    def list_items(self, url: str, **kwargs) -> Optional[List[Dict]]:
+        """作者主页展开为逐帖条目 (已有下载记录的帖子不入队)；帖子链接本身返回 None"""
+        if re.search(r"kemono\.(cr|su|party)/\w+/user/\d+/post/\d+", url):
+            return None
+        user_match = re.search(r"kemono\.(cr|su|party)/(?P<service>\w+)/user/(?P<user_id>\d+)", url)
+        if not user_match:
+            return None
+
+        db = kwargs.get("db")
+        self.db_path = db.db_path if db else None
+        service = user_match.group("service")
+        user_id = user_match.group("user_id")
+        # 条目链接沿用原链接的站点：BASE_URL 可能指向本地替身服务器，那样的链接 can_handle 认不出
+        site = url[:user_match.end(1)]
+
+        author_name = self._get_author_name(service, user_id)
+        if not kwargs.get("quiet"):
+            print(Colors.cyan(f"找到作者: {author_name} (ID: {user_id})"))
+            print(Colors.pink("正在获取帖子列表，可能需要一点时间喵..."))
+        posts = self._get_all_posts(service, user_id)
+
+        items = []
+        for post in posts:
+            if not post.get("service"): post["service"] = service
+            if not post.get("user"): post["user"] = user_id
+            p_id = post.get("id") or "0"
+            work_sig = f"kemono:{post['service']}:{post['user']}:{p_id}".strip(":")
+            if db and db.get_download_record("kemono", work_sig):
+                continue
+            items.append({
+                "key": work_sig,
+                "url": f"{site}/{post['service']}/user/{post['user']}/post/{p_id}",
+                "payload": {"author": author_name, "post": post},
+            })
+        return items
+
     def _download_single_post_mode(self, match, output_dir, **kwargs) -> tuple[bool, str, str]:
-        cfg = self._refresh_config(reload=True)
+        cfg = self._cfg
         service = match.group("service")
         user_id = match.group("user_id")
         post_id = match.group("post_id")
+        # 来自下载队列的条目已带上作者名和帖子数据，不必再请求一遍
+        payload = kwargs.get("job_payload") or {}
         
-        author_name = self._get_author_name(service, user_id)
+        author_name = payload.get("author") or self._get_author_name(service, user_id)
         print(Colors.cyan(f"找到作者: {author_name} (ID: {user_id})"))
         
         base_dir = output_dir if output_dir else config.get_paths(reload=False)[0]
@@ -120,7 +163,7 @@ class KemonoPlugin(DownloadPlugin):
         os.makedirs(author_dir, exist_ok=True)
         
         print(Colors.pink(f"正在获取帖子 {post_id} 数据..."))
-        post = self._get_single_post(service, user_id, post_id)
+        post = payload.get("post") or self._get_single_post(service, user_id, post_id)
         if not post:
              return False, f"无法获取帖子数据 ({post_id})", None
              
@@ -132,7 +175,7 @@ class KemonoPlugin(DownloadPlugin):
         should_save_content = kwargs.get("save_content", False) or config_save_content
         dl_mode = kwargs.get("kemono_dl_mode", "attachment")
         
-        success = self._download_post_safe(post, author_dir, author_name, should_save_content, dl_mode)
+        success = self._download_post_safe(post, author_dir, author_name, should_save_content, dl_mode, file_hashes=kwargs.get("file_hashes"), staging_dir=kwargs.get("staging_dir"))
         
         project_temp = os.path.join(os.getcwd(), "temp_downloads")
         if os.path.exists(project_temp):
@@ -146,7 +189,7 @@ class KemonoPlugin(DownloadPlugin):
             return False, "下载失败喵...", author_dir
 
     def _download_user_mode(self, match, output_dir, **kwargs) -> tuple[bool, str, str]:
-        cfg = self._refresh_config(reload=True)
+        cfg = self._cfg
         service = match.group("service")
         user_id = match.group("user_id")
         
@@ -219,9 +262,11 @@ class KemonoPlugin(DownloadPlugin):
         config_save_content = bool(cfg.get("kemono_save_content", False))
         should_save_content = kwargs.get("save_content", False) or config_save_content
         dl_mode = kwargs.get("kemono_dl_mode", "attachment")
+        file_hashes = kwargs.get("file_hashes")
+        staging_dir = kwargs.get("staging_dir")
         
         self._process_batch(posts, author_dir, "Posts", 
-                          lambda p, d: self._download_post_safe(p, d, author_name, should_save_content, dl_mode), results)
+                          lambda p, d: self._download_post_safe(p, d, author_name, should_save_content, dl_mode, file_hashes=file_hashes, staging_dir=staging_dir), results)
         
         project_temp = os.path.join(os.getcwd(), "temp_downloads")
         if os.path.exists(project_temp):
@@ -236,7 +281,7 @@ class KemonoPlugin(DownloadPlugin):
         tqdm.write(Colors.yellow(f"--- 开始处理 {len(items)} 个 {desc} ---"))
         with tqdm(total=len(items), unit="work", desc=f"Processing {desc}", leave=False) as pbar:
             with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
-                futures = {executor.submit(func, item, save_dir): item for item in items}
+                futures = {executor.submit(bind(func), item, save_dir): item for item in items}
                 
                 for future in as_completed(futures):
                     try:
@@ -250,7 +295,7 @@ class KemonoPlugin(DownloadPlugin):
                     finally:
                         pbar.update(1)
 
-    def _download_post_safe(self, post: Dict, save_dir: str, author_name: str, save_content: bool = False, dl_mode: str = "attachment") -> bool:
+    def _download_post_safe(self, post: Dict, save_dir: str, author_name: str, save_content: bool = False, dl_mode: str = "attachment", file_hashes: Optional[Dict[str, str]] = None, staging_dir: Optional[str] = None) -> bool:
         db = None
         try:
             if self.db_path:
@@ -260,7 +305,8 @@ class KemonoPlugin(DownloadPlugin):
                     tqdm.write(Colors.red(f"DB连接失败: {e}"))
                     pass
             
-            return self._download_post(post, save_dir, author_name, save_content, dl_mode, db=db)
+            with span("post", post_id=post.get("id")):
+                return self._download_post(post, save_dir, author_name, save_content, dl_mode, db=db, file_hashes=file_hashes, staging_dir=staging_dir)
         except Exception as e:
             tqdm.write(Colors.red(f"帖子处理失败 ({post.get('id')}): {e}"))
             return False
@@ -271,7 +317,7 @@ class KemonoPlugin(DownloadPlugin):
                 except Exception:
                     pass
 
-    def _download_post(self, post: Dict, save_dir: str, author_name: str, save_content: bool = False, dl_mode: str = "attachment", db=None) -> bool:
+    def _download_post(self, post: Dict, save_dir: str, author_name: str, save_content: bool = False, dl_mode: str = "attachment", db=None, file_hashes: Optional[Dict[str, str]] = None, staging_dir: Optional[str] = None) -> bool:
         post_id = post.get("id") or "0"
         title = post.get("title", "Untitled") or "Untitled"
 
@@ -300,16 +346,15 @@ class KemonoPlugin(DownloadPlugin):
         
         # tqdm.write(Colors.blue(f"初始附件数: {len(targets)}"))
         
+        # 正文只解析一次：图片地址和纯文本后面打包、存正文、写数据库都复用
+        parsed = None
         if content:
             # tqdm.write(Colors.blue(f"正在解析正文内容 (长度: {len(content)})..."))
             try:
-                soup = BeautifulSoup(content, 'html.parser')
-                imgs = soup.find_all('img')
-                # tqdm.write(Colors.blue(f"正文中发现 {len(imgs)} 个 img 标签"))
+                parsed = parse_post_content(content)
+                # tqdm.write(Colors.blue(f"正文中发现 {len(parsed.images)} 个 img 标签"))
                 
-                for img in imgs:
-                    src = img.get('src')
-                    if not src: continue
+                for src in parsed.images:
                     if src.startswith('/'):
                         src = f"{self.BASE_URL}{src}"
                         
@@ -328,25 +373,28 @@ class KemonoPlugin(DownloadPlugin):
         
         if dl_mode == "txt":
             if content:
-                 self._save_novel(post, save_dir, safe_title, author_name)
+                 self._save_novel(post, save_dir, safe_title, author_name, file_hashes=file_hashes, parsed=parsed)
             return True
 
         if dl_mode == "image":
             if has_attachments:
-                return self._process_attachments(post, targets, save_dir, safe_title, author_name, dl_mode="image", db=db)
+                return self._process_attachments(post, targets, save_dir, safe_title, author_name, dl_mode="image", db=db, file_hashes=file_hashes, parsed=parsed, staging_dir=staging_dir)
             return True
 
         if content and save_content:
             novel_title = f"{safe_title}_content" if has_attachments else safe_title
-            self._save_novel(post, save_dir, novel_title, author_name)
+            self._save_novel(post, save_dir, novel_title, author_name, file_hashes=file_hashes, parsed=parsed)
         
         if has_attachments:
-            return self._process_attachments(post, targets, save_dir, safe_title, author_name, dl_mode="attachment", db=db)
+            return self._process_attachments(post, targets, save_dir, safe_title, author_name, dl_mode="attachment", db=db, file_hashes=file_hashes, parsed=parsed, staging_dir=staging_dir)
             
         return True
 
-    def _process_attachments(self, post: Dict, targets: List[Dict], save_dir: str, safe_title: str, author_name: str, dl_mode: str = "attachment", db=None) -> bool:
-        cfg = config.get_download_config(reload=False)
+    def _process_attachments(self, post: Dict, targets: List[Dict], save_dir: str, safe_title: str, author_name: str, dl_mode: str = "attachment", db=None, file_hashes: Optional[Dict[str, str]] = None, parsed: Optional[PostContent] = None, staging_dir: Optional[str] = None) -> bool:
+        cfg = self._cfg
+        if parsed is None:
+            parsed = parse_post_content(post.get('content') or '')
+        content_text = parsed.get_text()
         fmt = str(cfg.get("kemono_format", "pdf") or "pdf").lower()
         if fmt not in ["cbz", "pdf"]: fmt = "pdf"
         output_ext = f".{fmt}"
@@ -375,17 +423,25 @@ class KemonoPlugin(DownloadPlugin):
                             work_id=work_id,
                             author=author_name,
                             title=post.get('title', 'Untitled'),
-                            content=BeautifulSoup(post.get('content') or '', 'html.parser').get_text(),
+                            content=content_text,
                             tags=",".join(post.get("tags", []) or []),
                             published_at=post.get("published")
                         )
 
+                        # 书库中的文件优先取 books 表里的哈希，没有时再读一遍文件
+                        lib_hash = ""
+                        for b in db.find_books_by_file_path(lib_output_path, limit=1):
+                            lib_hash = (b["file_hash"] or "") if "file_hash" in b.keys() else ""
+                        if not lib_hash:
+                            lib_hash = sha256_file(lib_output_path)
+
                         # 2. 补录资源 (如果文件存在)
                         if post_pk and os.path.exists(lib_output_path):
                             db.add_resource(
                                 post_id=post_pk,
                                 file_path=lib_output_path,
                                 file_url=f"{self.BASE_URL}/{p_service}/user/{p_user}/post/{p_id}",
+                                file_hash=lib_hash or None,
                                 file_size=os.path.getsize(lib_output_path)
                             )
 
@@ -397,7 +453,7 @@ class KemonoPlugin(DownloadPlugin):
                             title=post.get('title', 'Untitled'),
                             download_date=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                             file_path=lib_output_path,
-                            file_hash="EXISTING_FILE_SKIPPED",
+                            file_hash=lib_hash,
                             source_url=f"{self.BASE_URL}/{p_service}/user/{p_user}/post/{p_id}"
                         )
                         db.conn.commit()
@@ -406,6 +462,7 @@ class KemonoPlugin(DownloadPlugin):
                         pass
 
         files_to_download = []
+        hash_skipped = 0
         
         for t in targets:
             url = t.get("path", "")
@@ -435,44 +492,73 @@ class KemonoPlugin(DownloadPlugin):
                 dest_path = os.path.join(save_dir, safe_name)
                 if os.path.exists(dest_path) and os.path.getsize(dest_path) > 0:
                     continue
+
+                # 内容寻址: 路径里的 SHA-256 已在 resources/books 中出现过，直接跳过 (零流量)
+                # 图片会被打包成整本，逐页跳过会导致缺页，所以只对附件生效
+                expected_hash = self._hash_from_path(url)
+                if expected_hash and db:
+                    try:
+                        if db.has_file_hash(expected_hash):
+                            hash_skipped += 1
+                            continue
+                    except Exception:
+                        pass
                     
             files_to_download.append(t)
         
         if not files_to_download:
             if dl_mode == "image":
                  tqdm.write(Colors.yellow(f"警告: 在 Image 模式下未找到任何图片文件喵 (共扫描 {len(targets)} 个目标)~"))
+            if hash_skipped:
+                 tqdm.write(Colors.dim(f"附件内容已存在 (哈希命中 {hash_skipped} 个)，跳过下载喵~"))
             return True
 
         # tqdm.write(Colors.blue(f"准备下载 {len(files_to_download)} 个文件喵..."))
         
         results = []
 
-        project_temp = os.path.join(os.getcwd(), "temp_downloads")
+        # 服务层给出的书库暂存目录：逐帖临时目录放在这里，整理文件时只是同盘重命名。
+        # 插件实例在 pull 的线程间共享，所以按调用参数传下来而不是存在 self 上
+        project_temp = staging_dir or os.path.join(os.getcwd(), "temp_downloads")
         os.makedirs(project_temp, exist_ok=True)
         
         with tempfile.TemporaryDirectory(prefix=f"kemono_{post.get('id')}_", dir=project_temp) as temp_dir:
-            downloaded_files = self._download_images(files_to_download, temp_dir)
+            writer = None
+            if fmt == "cbz" and not packed_exists:
+                # CBZ 边下边打包：图片 (含压缩包里的图片) 按页序直接写进归档，不再落地到临时目录
+                buffer_mb = int(cfg.get("pack_buffer_mb", 64) or 64)
+                writer = StreamingCbzWriter(output_path, spill_dir=temp_dir, max_buffer_bytes=buffer_mb * 1024 * 1024)
+            try:
+                downloaded_hashes = self._download_images(files_to_download, temp_dir, writer=writer)
+            except Exception:
+                if writer is not None:
+                    writer.abort()
+                raise
             # tqdm.write(Colors.blue(f"实际下载成功 {len(downloaded_files)} / {len(files_to_download)} 个文件喵"))
             
-            self._extract_zips(temp_dir)
-            
-            final_images = self._scan_images(temp_dir)
-            # tqdm.write(Colors.blue(f"扫描到有效图片 {len(final_images)} 张喵"))
-            
-            if final_images and not packed_exists:
-                if fmt == "cbz":
-                    create_cbz(
-                        images=final_images,
-                        output_path=output_path,
-                        title=post.get('title', ''),
-                        author=author_name,
-                        description=BeautifulSoup(post.get('content', ''), 'html.parser').get_text(),
-                        source_url=f"{self.BASE_URL}/{post.get('service')}/user/{post.get('user')}/post/{post.get('id')}",
-                        tags=post.get("tags", []),
-                        published_time=post.get("published")
-                    )
-                else:
-                    create_pdf(
+            output_hash = ""
+            if writer is not None:
+                final_images = []
+                packed = writer.finish(
+                    title=post.get('title', ''),
+                    author=author_name,
+                    description=content_text,
+                    source_url=f"{self.BASE_URL}/{post.get('service')}/user/{post.get('user')}/post/{post.get('id')}",
+                    tags=post.get("tags", []),
+                    published_time=post.get("published")
+                )
+                has_pages = writer.pages > 0
+                if packed:
+                    output_hash = sha256_file(output_path)
+            else:
+                self._extract_zips(temp_dir)
+                
+                final_images = self._scan_images(temp_dir)
+                # tqdm.write(Colors.blue(f"扫描到有效图片 {len(final_images)} 张喵"))
+                has_pages = bool(final_images)
+                
+                if final_images and not packed_exists:
+                    packed = create_pdf(
                         images=final_images,
                         output_path=output_path,
                         title=post.get('title', ''),
@@ -480,8 +566,18 @@ class KemonoPlugin(DownloadPlugin):
                         tags=post.get("tags", []),
                         published_time=post.get("published")
                     )
+                    if packed:
+                        output_hash = sha256_file(output_path)
             
-            moved_files = self._move_other_files(temp_dir, final_images, save_dir, safe_title)
+            moved_pairs = self._move_other_files(temp_dir, final_images, save_dir, safe_title)
+
+            # 把已知哈希交给导入阶段，避免再读一遍文件
+            if file_hashes is not None:
+                if output_hash:
+                    file_hashes[os.path.abspath(output_path)] = output_hash
+                for src, mf in moved_pairs:
+                    if downloaded_hashes.get(src):
+                        file_hashes[os.path.abspath(mf)] = downloaded_hashes[src]
             
             # 记录下载成功
             if db:
@@ -498,7 +594,7 @@ class KemonoPlugin(DownloadPlugin):
                         work_id=work_id,
                         author=author_name,
                         title=post.get('title', 'Untitled'),
-                        content=BeautifulSoup(post.get('content') or '', 'html.parser').get_text(),
+                        content=content_text,
                         tags=",".join(post.get("tags", []) or []),
                         published_at=post.get("published")
                     )
@@ -506,34 +602,60 @@ class KemonoPlugin(DownloadPlugin):
                     # 2. 插入资源到 resources 表
                     if post_pk:
                         # 记录主文件 (CBZ/PDF)
-                        if final_images and (not packed_exists or os.path.exists(output_path)):
+                        if has_pages and (not packed_exists or os.path.exists(output_path)):
                              db.add_resource(
                                 post_id=post_pk,
                                 file_path=output_path,
                                 file_url=f"{self.BASE_URL}/{p_service}/user/{p_user}/post/{p_id}",
+                                file_hash=output_hash or None,
                                 file_size=os.path.getsize(output_path) if os.path.exists(output_path) else 0
                              )
                         
-                        # 记录其他移动的文件
-                        for mf in moved_files:
+                        # 记录其他移动的文件 (原样保存的附件带上路径里的 SHA-256)
+                        moved_srcs = set()
+                        for src, mf in moved_pairs:
+                            moved_srcs.add(src)
                             if os.path.exists(mf):
                                 db.add_resource(
                                     post_id=post_pk,
                                     file_path=mf,
+                                    file_hash=downloaded_hashes.get(src) or None,
                                     file_size=os.path.getsize(mf)
                                 )
 
+                        # 被解压/打包消耗掉的附件 (如 zip) 也登记哈希，后续遇到同内容可直接跳过
+                        for src, h in downloaded_hashes.items():
+                            if src in moved_srcs or not h:
+                                continue
+                            if os.path.splitext(src)[1].lower() in self.IMAGE_EXTS:
+                                continue
+                            db.add_resource(
+                                post_id=post_pk,
+                                file_path=os.path.join(save_dir, os.path.basename(src)),
+                                file_hash=h,
+                            )
+
                     # 3. 保持旧的 download_records 以兼容去重逻辑
-                    db.upsert_download_record(
-                        platform="kemono",
-                        work_id=work_id,
-                        author=author_name,
-                        title=post.get('title', 'Untitled'),
-                        download_date=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        file_path=output_path if final_images else save_dir,
-                        file_hash="DOWNLOADED_NEW",
-                        source_url=f"{self.BASE_URL}/{p_service}/user/{p_user}/post/{p_id}"
-                    )
+                    # 记录主文件的真实哈希；没有打包输出时取第一个原样保存的附件
+                    record_path, record_hash = output_path, output_hash
+                    if not record_hash and has_pages and os.path.exists(output_path):
+                        record_hash = sha256_file(output_path)
+                    if not record_hash:
+                        for src, mf in sorted(moved_pairs, key=lambda x: x[1]):
+                            record_path, record_hash = mf, downloaded_hashes.get(src) or sha256_file(mf)
+                            if record_hash:
+                                break
+                    if record_hash:
+                        db.upsert_download_record(
+                            platform="kemono",
+                            work_id=work_id,
+                            author=author_name,
+                            title=post.get('title', 'Untitled'),
+                            download_date=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                            file_path=record_path,
+                            file_hash=record_hash,
+                            source_url=f"{self.BASE_URL}/{p_service}/user/{p_user}/post/{p_id}"
+                        )
                     db.conn.commit()
                 except Exception as e:
                     tqdm.write(Colors.red(f"保存下载记录失败: {e}"))
@@ -559,7 +681,8 @@ class KemonoPlugin(DownloadPlugin):
                     return True
         return True
 
-    def _move_other_files(self, src_dir: str, images: List[str], save_dir: str, base_name: str) -> List[str]:
+    @traced("move_other_files")
+    def _move_other_files(self, src_dir: str, images: List[str], save_dir: str, base_name: str) -> List[Tuple[str, str]]:
         moved_files = []
         image_set = set(images)
         
@@ -607,35 +730,42 @@ class KemonoPlugin(DownloadPlugin):
                     
                 try:
                     shutil.move(src_path, dst_path)
-                    moved_files.append(dst_path)
+                    moved_files.append((src_path, dst_path))
                 except Exception as e:
                     tqdm.write(Colors.red(f"移动文件失败 {dst_name}: {e}"))
         
         return moved_files
 
-    def _save_novel(self, post: Dict, save_dir: str, title_safe: str, author_name: str) -> bool:
+    def _save_novel(self, post: Dict, save_dir: str, title_safe: str, author_name: str, file_hashes: Optional[Dict[str, str]] = None, parsed: Optional[PostContent] = None) -> bool:
         filename = f"{title_safe}.txt"
         file_path = os.path.join(save_dir, filename)
         
         if os.path.exists(file_path): return True
         
-        content = post.get("content", "")
-        soup = BeautifulSoup(content, 'html.parser')
-        text_content = soup.get_text("\n")
+        if parsed is None:
+            parsed = parse_post_content(post.get("content") or "")
+        text_content = parsed.get_text("\n")
         
         header = f"标题: {post.get('title')}\n作者: {author_name}\n发布时间: {post.get('published')}\nURL: {self.BASE_URL}/{post.get('service')}/user/{post.get('user')}/post/{post.get('id')}\n"
         full_text = f"{header}\n{text_content}"
+        raw = full_text.encode("utf-8")
         
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(full_text)
+        with open(file_path, "wb") as f:
+            f.write(raw)
+        if file_hashes is not None:
+            file_hashes[os.path.abspath(file_path)] = hashlib.sha256(raw).hexdigest()
             
         set_file_time(file_path, post.get("published"))
         return True
 
-    def _download_images(self, files: List[Dict], temp_dir: str) -> List[str]:
-        downloaded = []
+    def _download_images(self, files: List[Dict], temp_dir: str, writer: Optional[StreamingCbzWriter] = None) -> Dict[str, str]:
+        """并发下载目标文件，返回 {保存路径: sha256}（仅包含下载成功且落地到 temp_dir 的文件）
+
+        给出 writer 时图片不落地：按目标顺序作为页写进 CBZ，压缩包里的图片在压缩包所在位置展开。
+        """
+        downloaded = {}
         with ThreadPoolExecutor(max_workers=32) as executor:
-            futures = []
+            futures = {}
             for i, f in enumerate(files):
                 url = f.get("path")
                 if not url: continue
@@ -664,16 +794,104 @@ class KemonoPlugin(DownloadPlugin):
                 
                 save_path = os.path.join(temp_dir, save_name)
                 
-                futures.append(executor.submit(self._download_file, url, save_path))
-                downloaded.append(save_path)
+                if writer is not None:
+                    futures[executor.submit(bind(self._download_to_writer), url, save_path, ext, is_image, i, writer, temp_dir)] = save_path
+                else:
+                    futures[executor.submit(bind(self._download_file), url, save_path, self._hash_from_path(url))] = save_path
                 
-            for f in futures:
+            for f, save_path in futures.items():
                 try:
-                    f.result()
+                    digest = f.result()
+                    if digest is not None:
+                        downloaded[save_path] = digest or ""
                 except Exception as e:
                     tqdm.write(Colors.red(f"图片下载失败: {e}"))
         return downloaded
 
+    def _download_to_writer(self, url: str, save_path: str, ext: str, is_image: bool, slot: int, writer: StreamingCbzWriter, temp_dir: str) -> Optional[str]:
+        """流式打包模式下处理一个目标；返回落地文件的哈希，图片直接进 CBZ 时返回 None"""
+        fed = False
+        try:
+            if is_image:
+                spool = self._fetch_page(url, self._hash_from_path(url), temp_dir)
+                try:
+                    fed = True
+                    writer.put(slot, [(ext, spool)])
+                finally:
+                    spool.close()
+                return None
+
+            digest = self._download_file(url, save_path, self._hash_from_path(url))
+            if ext == ".zip":
+                fed = True
+                if not self._feed_zip(save_path, slot, writer, temp_dir):
+                    writer.put(slot, ())
+            return digest
+        finally:
+            # 失败或不含图片的目标也要占住这个位置，后面的页才能继续写入
+            if not fed:
+                writer.put(slot, ())
+
+    @traced("fetch")
+    def _fetch_page(self, url: str, expected_hash: str, spill_dir: str):
+        """把一张图片读进 SpooledTemporaryFile (小图只在内存里)，边读边校验 SHA-256"""
+        annotate(url=url)
+        for attempt in range(self.MAX_RETRIES):
+            spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024, dir=spill_dir)
+            try:
+                res = self.session.get(url, stream=True, timeout=self.TIMEOUT)
+                res.raise_for_status()
+                h = hashlib.sha256()
+                bytes_ctr = DOWNLOAD_BYTES.labels(url_host(url))
+                for chunk in res.iter_content(chunk_size=1024 * 1024):
+                    if chunk:
+                        spool.write(chunk)
+                        h.update(chunk)
+                        bytes_ctr.inc(len(chunk))
+                digest = h.hexdigest()
+                if expected_hash and digest != expected_hash:
+                    raise Exception(f"哈希校验失败 (期望 {expected_hash[:12]}…，实际 {digest[:12]}…)")
+                spool.seek(0)
+                return spool
+            except Exception as e:
+                spool.close()
+                if attempt == self.MAX_RETRIES - 1:
+                    raise Exception(f"Failed after {self.MAX_RETRIES} attempts: {e}")
+                time.sleep(1)
+
+    def _feed_zip(self, zip_path: str, slot: int, writer: StreamingCbzWriter, temp_dir: str) -> bool:
+        """压缩包里的图片按文件名顺序直接写进 CBZ，其余成员解压到 temp_dir 供后续原样保存。
+        压缩包打不开时原样保留并返回 False (slot 由调用方补空)；有图片成员读取失败时
+        这一 slot 的页全部跳过，压缩包同样原样保留。"""
+        try:
+            zf = zipfile.ZipFile(zip_path, 'r')
+        except zipfile.BadZipFile:
+            return False
+
+        def pages(members):
+            for m in members:
+                with zf.open(m) as stream:
+                    yield os.path.splitext(m.filename)[1].lower(), stream
+
+        with zf:
+            members = [m for m in zf.infolist() if not m.is_dir()]
+            images = sorted(
+                (m for m in members if os.path.splitext(m.filename)[1].lower() in self.IMAGE_EXTS),
+                key=lambda m: m.filename,
+            )
+            intact = writer.put(slot, pages(images))
+            if intact:
+                for m in members:
+                    if m not in images:
+                        zf.extract(m, path=temp_dir)
+        if intact:
+            try:
+                os.remove(zip_path)
+            except Exception:
+                pass
+        return True
+
+    @traced("extract_zips")
     def _extract_zips(self, temp_dir: str):
         for fname in os.listdir(temp_dir):
             if fname.lower().endswith('.zip'):
@@ -694,15 +912,52 @@ class KemonoPlugin(DownloadPlugin):
                     files.append(os.path.join(root, f))
         return sorted(files)
 
-    def _download_file(self, url: str, path: str):
-        existing = 0
-        try:
-            if os.path.exists(path):
-                existing = os.path.getsize(path)
-        except Exception:
-            existing = 0
+    @staticmethod
+    def _hash_from_path(path: str) -> str:
+        """从 Kemono 文件路径 /data/ab/cd/<sha256>.ext 中解析内容哈希，解析不到返回空串"""
+        m = re.search(r"/([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})(?:\.[^/?#]*)?(?:[?#]|$)", str(path or "").lower())
+        if not m:
+            return ""
+        digest = m.group(3)
+        if digest[:2] != m.group(1) or digest[2:4] != m.group(2):
+            return ""
+        return digest
+
+    def _hash_existing(self, path: str):
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for buf in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(buf)
+        return h
 
+    @traced("fetch")
+    def _download_file(self, url: str, path: str, expected_hash: str = "") -> str:
+        """下载单个文件，边写边算 SHA-256；给出 expected_hash 时校验不符会删除重下。返回哈希。"""
+        annotate(url=url)
         for attempt in range(self.MAX_RETRIES):
+            try:
+                # 上一轮分段下载中断：文件已预分配，只能按分段状态续传
+                if self.segmenter.has_state(path):
+                    total = self.segmenter.probe(url)
+                    if total:
+                        return self.segmenter.download(url, path, total, expected_hash=expected_hash)
+                    self.segmenter.discard(path)
+            except RangeNotSupported:
+                self.segmenter.discard(path)
+            except Exception as e:
+                if attempt == self.MAX_RETRIES - 1:
+                    self.segmenter.discard(path)
+                    raise Exception(f"Failed after {self.MAX_RETRIES} attempts: {e}")
+                time.sleep(1)
+                continue
+
+            existing = 0
+            try:
+                if os.path.exists(path):
+                    existing = os.path.getsize(path)
+            except Exception:
+                existing = 0
+
             try:
                 headers = {}
                 if existing > 0:
@@ -710,7 +965,12 @@ class KemonoPlugin(DownloadPlugin):
 
                 res = self.session.get(url, stream=True, timeout=self.TIMEOUT, headers=headers or None)
                 if existing > 0 and res.status_code in (416,):
-                    return
+                    res.close()
+                    digest = self._hash_existing(path).hexdigest()
+                    if expected_hash and digest != expected_hash:
+                        os.remove(path)
+                        raise Exception(f"哈希校验失败 (期望 {expected_hash[:12]}…，实际 {digest[:12]}…)")
+                    return digest
 
                 res.raise_for_status()
 
@@ -723,18 +983,36 @@ class KemonoPlugin(DownloadPlugin):
                     headers = {}
                     res = self.session.get(url, stream=True, timeout=self.TIMEOUT)
                     res.raise_for_status()
-                
+
+                # 大附件且支持 Range：改走多连接分段下载
+                seg_total = self.segmenter.eligible(res) if existing == 0 else 0
+                if seg_total:
+                    res.close()
+                    try:
+                        return self.segmenter.download(url, path, seg_total, expected_hash=expected_hash)
+                    except RangeNotSupported:
+                        self.segmenter.discard(path)
+                        res = self.session.get(url, stream=True, timeout=self.TIMEOUT)
+                        res.raise_for_status()
+
                 chunk_size = 1024 * 1024
                 mode = 'ab' if existing > 0 and res.status_code == 206 else 'wb'
+                h = self._hash_existing(path) if mode == 'ab' else hashlib.sha256()
+                bytes_ctr = DOWNLOAD_BYTES.labels(url_host(url))
                 with open(path, mode) as f:
                     for chunk in res.iter_content(chunk_size=chunk_size):
                         if chunk:
                             f.write(chunk)
-                return
+                            h.update(chunk)
+                            bytes_ctr.inc(len(chunk))
+                digest = h.hexdigest()
+                if expected_hash and digest != expected_hash:
+                    os.remove(path)
+                    raise Exception(f"哈希校验失败 (期望 {expected_hash[:12]}…，实际 {digest[:12]}…)")
+                return digest
             except Exception as e:
                 if attempt == self.MAX_RETRIES - 1:
-                    if os.path.exists(path):
-                        os.remove(path)
+                    self.segmenter.discard(path)
                     raise Exception(f"Failed after {self.MAX_RETRIES} attempts: {e}")
                 time.sleep(1)
 
@@ -783,6 +1061,7 @@ class KemonoPlugin(DownloadPlugin):
             print(Colors.red(f"API请求失败: {e}"))
         return None
 
+    @traced("list_posts")
     def _get_all_posts(self, service: str, user_id: str) -> List[Dict]:
         all_posts = []
         offset = 0
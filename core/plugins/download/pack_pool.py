@@ -0,0 +1,178 @@
+"""打包阶段的图片转码进程池
+
+PNG (带透明通道) / CMYK / WebP 等页面写进 PDF 前需要解码再转成 JPEG，这一步是纯 CPU 活。
+放在下载线程里做会卡住下载，也只能用到一个核；这里用一个进程级共享的进程池来做，
+Kemono 和 Pixiv 的打包都走这里，同一时间在池子里的页数有上限，内存不会随页数增长。
+HTTP 阅读接口生成缩放页/封面缩略图时也复用同一个池子。
+"""
+
+import atexit
+import io
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from PIL import Image
+
+from ... import config
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+# 同一台机器上并行运行的工作进程数 (nekoshelf-worker 设置)，pack_workers 为 0 时各进程均分 CPU 核数
+_sibling_processes = 1
+
+
+def transcode_page(src) -> Tuple[int, int, bytes]:
+    """解码一页 (路径、字节或文件对象)，转成 RGB JPEG；返回 (宽, 高, JPEG 字节)。通常在子进程里运行。"""
+    fp = io.BytesIO(src) if isinstance(src, (bytes, bytearray)) else src
+    with Image.open(fp) as img:
+        rgb = img if img.mode == "RGB" else img.convert("RGB")
+        try:
+            out = io.BytesIO()
+            rgb.save(out, "JPEG")
+            return rgb.size[0], rgb.size[1], out.getvalue()
+        finally:
+            if rgb is not img:
+                rgb.close()
+
+
+def resize_page(data: bytes, width: int, quality: int = 85) -> bytes:
+    """把一页图片缩放到指定宽度 (等比，不放大) 并编码为 JPEG；阅读接口的缩略图/缩放页在子进程里调用"""
+    with Image.open(io.BytesIO(data)) as img:
+        if img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            # JPEG 可以在解码时直接按 1/2、1/4、1/8 缩小，比解码全尺寸再缩放快得多
+            img.draft("RGB", (width, height))
+        else:
+            width, height = img.size
+        rgb = img if img.mode == "RGB" else img.convert("RGB")
+        try:
+            if rgb.size != (width, height):
+                out_img = rgb.resize((width, height), Image.LANCZOS)
+            else:
+                out_img = rgb
+            out = io.BytesIO()
+            out_img.save(out, "JPEG", quality=quality)
+            if out_img is not rgb:
+                out_img.close()
+            return out.getvalue()
+        finally:
+            if rgb is not img:
+                rgb.close()
+
+
+def set_sibling_processes(n: int):
+    """声明本机共有 n 个工作进程各自打包，避免每个进程都按全部核数开池 (总共 核数² 个转码进程)"""
+    global _sibling_processes
+    _sibling_processes = max(1, int(n or 1))
+
+
+def pack_workers() -> int:
+    try:
+        n = int(config.get_download_config(reload=False).get("pack_workers", 0) or 0)
+    except Exception:
+        n = 0
+    return n if n > 0 else max(1, (os.cpu_count() or 1) // _sibling_processes)
+
+
+def get_pool() -> Optional[ProcessPoolExecutor]:
+    """按需创建共享进程池；pack_workers 为 1 或进程池不可用时返回 None (调用方在本线程内转码)"""
+    global _pool, _pool_workers
+    workers = pack_workers()
+    if workers <= 1:
+        return None
+    with _pool_lock:
+        if _pool is not None and _pool_workers == workers:
+            return _pool
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        try:
+            # 下载线程还在跑时 fork 容易把锁的状态带进子进程，统一用 spawn
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        except Exception:
+            _pool = None
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    try:
+        pool.shutdown(wait=False, cancel_futures=True)
+    except Exception:
+        pass
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown)
+
+
+def normalize_pages(
+    sources: Iterable,
+    needs_transcode: Callable[[object], bool],
+    max_in_flight: Optional[int] = None,
+) -> Iterator[Tuple[object, object]]:
+    """按输入顺序产出 (source, result)。
+
+    result 为 None 表示该页无需转码 (由调用方原样写入)；需要转码的页返回 (宽, 高, JPEG 字节)，
+    转码失败时返回异常对象。同一时间最多 max_in_flight 页在进程池中排队或处理。
+    """
+    pool = get_pool()
+    limit = max(1, int(max_in_flight or 2 * pack_workers()))
+    window = deque()
+    in_flight = 0
+
+    def pop():
+        nonlocal in_flight, pool
+        src, needs, fut = window.popleft()
+        if not needs:
+            return src, None
+        if fut is not None:
+            in_flight -= 1
+            try:
+                return src, fut.result()
+            except BrokenProcessPool:
+                # 子进程被杀 (如 OOM)：丢掉坏掉的池子，这一页在本线程重做
+                if pool is not None:
+                    _discard_pool(pool)
+                    pool = None
+            except Exception as e:
+                return src, e
+        try:
+            return src, transcode_page(src)
+        except Exception as e:
+            return src, e
+
+    for src in sources:
+        needs = bool(needs_transcode(src))
+        fut = None
+        if needs and pool is not None:
+            try:
+                fut = pool.submit(transcode_page, src)
+                in_flight += 1
+            except (BrokenProcessPool, RuntimeError):
+                _discard_pool(pool)
+                pool = None
+        window.append((src, needs, fut))
+        # 窗口里排队的转码页达到上限时先把队首写出去
+        while window and (pool is None or in_flight >= limit or not window[0][1]):
+            yield pop()
+
+    while window:
+        yield pop()
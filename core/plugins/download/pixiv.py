@@ -4,6 +4,9 @@ import time
 import json
 import shutil
 import html
+import hashlib
+import threading
+import urllib.parse
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional, Dict, List, Tuple, Any
 from datetime import datetime
@@ -14,37 +17,56 @@ from urllib3.util.retry import Retry
 from tqdm import tqdm
 
 from .base import DownloadPlugin
-from .utils import sanitize_filename, set_file_time, create_cbz, create_pdf
-from ...utils import Colors
+from .utils import sanitize_filename, set_file_time, create_cbz, create_pdf, sha256_file
+from ...utils import Colors, DOWNLOAD_BYTES, instrument_session, url_host
 from ... import config
 from ...database import DatabaseManager
+from ...tracing import annotate, bind, span, traced
 
 class PixivPlugin(DownloadPlugin):
-    BASE_URL = "https://www.pixiv.net"
+    # SITE_URL 用于作品链接 (入队、入库)，BASE_URL 是实际请求的接口地址，可由 pixiv_base_url 覆盖
+    SITE_URL = "https://www.pixiv.net"
+    BASE_URL = SITE_URL
+    # 作品都属于同一作者的模式，可以用作者主页的批量接口预取元数据
+    USER_WORK_MODES = ('USER_ALL', 'USER_ILLUSTS', 'USER_MANGA')
+    META_BATCH_SIZE = 48
+    # 列表类请求 (分页、系列遍历) 共用的最小发起间隔 (秒)
+    LIST_INTERVAL = 0.5
 
     def __init__(self):
         super().__init__()
-        self.session = requests.Session()
-        self._configure_session(config.get_download_config(reload=True))
-        self._load_cookies(config.get_download_config(reload=False))
+        self.session = instrument_session(requests.Session())
+        self._pace_lock = threading.Lock()
+        self._next_slot = 0.0
+        self.configure(config.get_download_config(reload=False))
+
+    def configure(self, cfg: Dict[str, Any]):
+        super().configure(cfg)
+        self._configure_session(cfg)
+        self._load_cookies(cfg)
 
     def _configure_session(self, cfg: Dict[str, Any]):
         self.MAX_RETRIES = int(cfg.get("max_retries", 3) or 3)
         self.TIMEOUT = int(cfg.get("timeout", 10) or 10)
         self.MAX_WORKERS = int(cfg.get("max_workers", 5) or 5)
+        self.BASE_URL = str(cfg.get("pixiv_base_url", self.SITE_URL) or self.SITE_URL).rstrip("/")
         
-        retries = Retry(
-            total=self.MAX_RETRIES,
-            backoff_factor=1, 
-            status_forcelist=[500, 502, 503, 504] # 移除 429，由应用层控制
-        )
-        import urllib3
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        
-        self.session.mount('https://', HTTPAdapter(max_retries=retries))
+        # 配置没变时保留原有连接池 (pull 并发时多个下载共享这个会话)
+        if getattr(self, "_mounted_retries", None) != self.MAX_RETRIES:
+            retries = Retry(
+                total=self.MAX_RETRIES,
+                backoff_factor=1, 
+                status_forcelist=[500, 502, 503, 504] # 移除 429，由应用层控制
+            )
+            import urllib3
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+            
+            self.session.mount('https://', HTTPAdapter(max_retries=retries))
+            self.session.mount('http://', HTTPAdapter(max_retries=retries))
+            self._mounted_retries = self.MAX_RETRIES
         headers = {
             "User-Agent": cfg.get("user_agent", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"),
-            "Referer": "https://www.pixiv.net/",
+            "Referer": f"{self.SITE_URL}/",
             "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
         }
         self.session.headers.update(headers)
@@ -53,9 +75,14 @@ class PixivPlugin(DownloadPlugin):
         self.cookie = cfg.get("pixiv_cookie", "")
         if self.cookie:
             self.session.headers["Cookie"] = self.cookie
+        else:
+            self.session.headers.pop("Cookie", None)
 
     def _check_cookie_validity(self):
         if not self.cookie: return
+        # 同一个 Cookie 只检查一次，pull 批量检查时不必每位作者都请求一遍
+        if getattr(self, "_checked_cookie", None) == self.cookie: return
+        self._checked_cookie = self.cookie
         try:
             res = self.session.get(f"{self.BASE_URL}/ajax/user/extra", timeout=5)
             if res.status_code == 200:
@@ -91,9 +118,6 @@ class PixivPlugin(DownloadPlugin):
 
     def download(self, url: str, output_dir: str, **kwargs) -> Tuple[bool, str, Optional[str]]:
         quiet = kwargs.get('quiet', False)
-        cfg = config.get_download_config(reload=True)
-        self._configure_session(cfg)
-        self._load_cookies(cfg)
         
         # 获取数据库实例
         db = kwargs.get('db')
@@ -109,18 +133,26 @@ class PixivPlugin(DownloadPlugin):
         if not quiet:
             tqdm.write(Colors.pink(f"识别模式: {mode} (ID: {pid})，正在获取列表喵..."))
         
+        payload = kwargs.get('job_payload') or {}
         try:
-            author_name, works = self._get_download_targets(mode, pid, quiet=quiet)
+            if payload.get('author') and mode in ('NOVEL_SINGLE', 'ILLUST_SINGLE'):
+                # 来自下载队列的条目：作者名已知，且入队时已比对过下载记录
+                author_name = payload['author']
+                works = {'illusts': [], 'manga': [], 'novels': []}
+                works['novels' if mode == 'NOVEL_SINGLE' else 'illusts'] = [pid]
+            else:
+                author_name, works = self._get_download_targets(mode, pid, quiet=quiet, pipeline_traversal=True)
             if not quiet:
                 tqdm.write(Colors.cyan(f"目标集合: {author_name}"))
         except Exception as e:
             return False, f"获取信息失败: {e}", None
 
+        traversal_start = works.pop('traversal_start', None)
         total_works = len(works['illusts']) + len(works['manga']) + len(works['novels'])
         if not quiet:
             tqdm.write(Colors.cyan(f"共找到 {total_works} 个作品 (插画: {len(works['illusts'])}, 漫画: {len(works['manga'])}, 小说: {len(works['novels'])})"))
 
-        if total_works == 0:
+        if total_works == 0 and not traversal_start:
             return True, "没有找到可以下载的作品喵...", None
 
         # 如果静默模式下发现了新作品，提示一下
@@ -132,20 +164,63 @@ class PixivPlugin(DownloadPlugin):
         os.makedirs(author_dir, exist_ok=True)
         
         results = {'success': 0, 'fail': 0}
+        file_hashes = kwargs.get('file_hashes')
         
         if works['novels']:
             self._process_batch(works['novels'], author_dir, "Novel", 
-                              lambda nid, d: self._download_novel_safe(nid, d), 
+                              lambda nid, d: self._download_novel_safe(nid, d, file_hashes=file_hashes), 
                               results, quiet=quiet)
 
+        if traversal_start:
+            self._download_series_by_traversal(traversal_start, author_dir, results, file_hashes=file_hashes, quiet=quiet)
+
         illust_manga_ids = works['illusts'] + works['manga']
         if illust_manga_ids:
+            # 作者主页模式：标题/标签/日期按批预取，逐作品只需再请求 /pages
+            metas = {}
+            if mode in self.USER_WORK_MODES and not self._wants_caption(kwargs.get('save_content')):
+                metas = self._prefetch_illust_meta(pid, illust_manga_ids)
+            elif payload.get('meta') and mode == 'ILLUST_SINGLE':
+                metas = {pid: payload['meta']}
             self._process_batch(illust_manga_ids, author_dir, "Illust/Manga", 
-                              lambda iid, d: self._download_illust_safe(iid, d), 
+                              lambda iid, d: self._download_illust_safe(iid, d, file_hashes=file_hashes, meta=metas.get(iid)), 
                               results, quiet=quiet)
 
+        if results['fail'] and not results['success']:
+            return False, f"爬取失败喵... 失败: {results['fail']}", author_dir
         return True, f"爬取完成喵！成功: {results['success']}, 失败: {results['fail']}", author_dir
 
+    def list_items(self, url: str, **kwargs) -> Optional[List[Dict]]:
+        """作者/系列/收藏链接展开为逐作品条目 (已下载的作品不入队)；单作品链接返回 None"""
+        mode, pid = self._parse_url(url)
+        if not pid or mode in ('NOVEL_SINGLE', 'ILLUST_SINGLE'):
+            return None
+
+        quiet = kwargs.get('quiet', False)
+
+        author_name, works = self._get_download_targets(mode, pid, quiet=quiet)
+        items = []
+        for nid in works['novels']:
+            items.append({
+                "key": f"pixiv:novel:{nid}",
+                "url": f"{self.SITE_URL}/novel/show.php?id={nid}",
+                "payload": {"author": author_name},
+            })
+        illust_ids = works['illusts'] + works['manga']
+        metas = {}
+        if mode in self.USER_WORK_MODES and not self._wants_caption(kwargs.get('save_content')):
+            metas = self._prefetch_illust_meta(pid, illust_ids)
+        for iid in illust_ids:
+            payload = {"author": author_name}
+            if iid in metas:
+                payload["meta"] = metas[iid]
+            items.append({
+                "key": f"pixiv:illust:{iid}",
+                "url": f"{self.SITE_URL}/artworks/{iid}",
+                "payload": payload,
+            })
+        return items
+
     def _process_batch(self, items: List[str], save_dir: str, desc: str, func, stats: Dict, quiet: bool = False):
         if not quiet:
             tqdm.write(Colors.yellow(f"--- 开始下载 {len(items)} 部 {desc} ---"))
@@ -159,7 +234,7 @@ class PixivPlugin(DownloadPlugin):
             with ThreadPoolExecutor(max_workers=workers) as executor:
                 futures = {}
                 for item in items:
-                    futures[executor.submit(func, item, save_dir)] = item
+                    futures[executor.submit(bind(func), item, save_dir)] = item
                     # 提交任务时稍微错开一点时间，避免瞬间并发峰值
                     time.sleep(0.1)
                     
@@ -170,7 +245,17 @@ class PixivPlugin(DownloadPlugin):
                         stats['fail'] += 1
                     pbar.update(1)
 
-    def _request(self, url: str, stream: bool = False, json_response: bool = True) -> Any:
+    def _pace(self, interval: Optional[float] = None):
+        """所有线程共用的发起节奏：每次调用占一个时间槽，两个槽之间至少隔 interval 秒"""
+        interval = self.LIST_INTERVAL if interval is None else interval
+        with self._pace_lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def _request(self, url: str, stream: bool = False, json_response: bool = True, headers: Optional[Dict] = None) -> Any:
         import random
         
         # 指数退避策略: 基础等待时间 * (2 ^ 重试次数) + 随机抖动
@@ -178,7 +263,7 @@ class PixivPlugin(DownloadPlugin):
         
         for attempt in range(self.MAX_RETRIES):
             try:
-                res = self.session.get(url, timeout=self.TIMEOUT, stream=stream)
+                res = self.session.get(url, timeout=self.TIMEOUT, stream=stream, headers=headers)
                 
                 if res.status_code == 200:
                     if json_response:
@@ -213,22 +298,24 @@ class PixivPlugin(DownloadPlugin):
         tqdm.write(Colors.red(f"请求彻底失败: {url}"))
         return None
 
-    def _download_novel_safe(self, nid: str, save_dir: str) -> bool:
+    def _download_novel_safe(self, nid: str, save_dir: str, file_hashes: Optional[Dict[str, str]] = None, body: Optional[Dict] = None) -> bool:
         db = None
         try:
             db = DatabaseManager(config.DB_FILE)
-            return self._download_novel(nid, save_dir, db=db)
+            with span("novel", work_id=nid):
+                return self._download_novel(nid, save_dir, db=db, file_hashes=file_hashes, body=body)
         except Exception as e:
             tqdm.write(Colors.red(f"小说 {nid} 下载失败: {e}"))
             return False
         finally:
             if db: db.close()
 
-    def _download_illust_safe(self, iid: str, save_dir: str, temp_root: Optional[str] = None) -> bool:
+    def _download_illust_safe(self, iid: str, save_dir: str, temp_root: Optional[str] = None, file_hashes: Optional[Dict[str, str]] = None, meta: Optional[Dict] = None) -> bool:
         db = None
         try:
             db = DatabaseManager(config.DB_FILE)
-            return self._download_illust(iid, save_dir, temp_root, db=db)
+            with span("illust", work_id=iid):
+                return self._download_illust(iid, save_dir, temp_root, db=db, file_hashes=file_hashes, meta=meta)
         except Exception as e:
             tqdm.write(Colors.red(f"插画/漫画 {iid} 下载失败: {e}"))
             return False
@@ -249,7 +336,10 @@ class PixivPlugin(DownloadPlugin):
             return 'USER_ALL', uid
         return None, None
 
-    def _get_download_targets(self, mode: str, pid: str, quiet: bool = False) -> Tuple[str, Dict[str, List[str]]]:
+    @traced("list_works")
+    def _get_download_targets(self, mode: str, pid: str, quiet: bool = False, pipeline_traversal: bool = False) -> Tuple[str, Dict[str, List[str]]]:
+        """pipeline_traversal=True 时系列需要链式遍历的情况不在这里走完整条链，
+        而是把首章 ID 放在 works['traversal_start']，由调用方边遍历边下载"""
         works = {'illusts': [], 'manga': [], 'novels': []}
         author_name = "Unknown"
         
@@ -263,12 +353,16 @@ class PixivPlugin(DownloadPlugin):
             if not works['novels']:
                 works['novels'] = self._fetch_paginated_ids(
                     f"{self.BASE_URL}/ajax/novel/series/{pid}/content",
-                    lambda x: x.get('page', {}).get('seriesContents', []) if isinstance(x, dict) and 'page' in x else x
+                    lambda x: x.get('page', {}).get('seriesContents', []) if isinstance(x, dict) and 'page' in x else x,
+                    total=raw_body.get('total')
                 )
             
             if not works['novels'] and (first_id := raw_body.get('firstNovelId')):
                 tqdm.write(Colors.yellow("列表获取失败，尝试通过链式遍历获取作品列表喵..."))
-                works['novels'] = self._crawl_series_by_traversal(first_id)
+                if pipeline_traversal:
+                    works['traversal_start'] = str(first_id)
+                else:
+                    works['novels'] = self._crawl_series_by_traversal(first_id)
 
         elif mode == 'NOVEL_SINGLE':
             works['novels'] = [pid]
@@ -335,41 +429,90 @@ class PixivPlugin(DownloadPlugin):
 
         return author_name, works
 
-    def _crawl_series_by_traversal(self, first_id: str) -> List[str]:
-        ids = []
+    def _iter_series_by_traversal(self, first_id: str):
+        """沿 seriesNavData.next 逐章遍历，边走边产出 (novel_id, 小说详情 body)"""
         current_id = str(first_id)
         visited = set()
         
+        while current_id and current_id not in visited:
+            visited.add(current_id)
+            
+            self._pace()
+            data = self._request(f"{self.BASE_URL}/ajax/novel/{current_id}")
+            if not data: 
+                yield current_id, None
+                break
+            
+            body = data.get('body') or {}
+            yield current_id, body
+            
+            nav_data = body.get('seriesNavData') or {}
+            next_node = nav_data.get('next')
+            
+            if next_node and isinstance(next_node, dict):
+                next_id = str(next_node.get('id'))
+                if next_id == current_id: break
+                current_id = next_id
+            else:
+                break
+
+    def _crawl_series_by_traversal(self, first_id: str) -> List[str]:
+        ids = []
         with tqdm(desc="遍历系列作品", unit="章", leave=False) as pbar:
-            while current_id and current_id not in visited:
-                ids.append(current_id)
-                visited.add(current_id)
+            for nid, _ in self._iter_series_by_traversal(first_id):
+                ids.append(nid)
                 pbar.update(1)
-                
-                data = self._request(f"{self.BASE_URL}/ajax/novel/{current_id}")
-                if not data: break
-                
-                nav_data = data.get('body', {}).get('seriesNavData') or {}
-                next_node = nav_data.get('next')
-                
-                if next_node and isinstance(next_node, dict):
-                    next_id = str(next_node.get('id'))
-                    if next_id == current_id: break
-                    current_id = next_id
-                else:
-                    break
-                time.sleep(0.3)
         return ids
 
+    def _download_series_by_traversal(self, first_id: str, save_dir: str, stats: Dict, file_hashes: Optional[Dict[str, str]] = None, quiet: bool = False):
+        """链式遍历和下载流水线进行：每发现一章就提交下载，不用等整条链走完"""
+        if not quiet:
+            tqdm.write(Colors.yellow("--- 开始边遍历边下载系列小说 ---"))
+        db = None
+        try:
+            db = DatabaseManager(config.DB_FILE)
+        except Exception:
+            db = None
+
+        skipped = 0
+        try:
+            with tqdm(unit="work", desc="Downloading Novel") as pbar:
+                with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+                    futures = []
+                    for nid, body in self._iter_series_by_traversal(first_id):
+                        if db is not None:
+                            try:
+                                if db.get_download_record("pixiv", f"novel:{nid}"):
+                                    skipped += 1
+                                    continue
+                            except Exception:
+                                pass
+                        futures.append(executor.submit(bind(self._download_novel_safe), nid, save_dir, file_hashes, body))
+                        pbar.total = len(futures)
+                        pbar.refresh()
+
+                    for future in as_completed(futures):
+                        if future.result():
+                            stats['success'] += 1
+                        else:
+                            stats['fail'] += 1
+                        pbar.update(1)
+        finally:
+            if db:
+                db.close()
+        if skipped and not quiet:
+            tqdm.write(Colors.pink(f"已跳过 {skipped} 个已下载的 novels 喵~"))
+
     def _get_series_metadata(self, series_id: str) -> Dict:
-        self.session.headers.update({"Referer": f"{self.BASE_URL}/novel/series/{series_id}"})
-        data = self._request(f"{self.BASE_URL}/ajax/novel/series/{series_id}")
+        # Referer 只跟着这两个请求走，不改共享会话 (会话在多个线程间复用)
+        referer = {"Referer": f"{self.SITE_URL}/novel/series/{series_id}"}
+        data = self._request(f"{self.BASE_URL}/ajax/novel/series/{series_id}", headers=referer)
         
         if data and (body := data.get('body')):
             return {'title': body.get('title'), 'author': body.get('userName'), 'raw_body': body}
         
         tqdm.write(Colors.yellow("Pixiv API 获取失败 (404/Error)，尝试网页解析模式喵..."))
-        res = self._request(f"{self.BASE_URL}/novel/series/{series_id}", json_response=False)
+        res = self._request(f"{self.BASE_URL}/novel/series/{series_id}", json_response=False, headers=referer)
         if res:
             return self._scrape_metadata_from_html(res.text, series_id)
             
@@ -414,25 +557,54 @@ class PixivPlugin(DownloadPlugin):
         tqdm.write(Colors.yellow("网页解析警告: 未找到任何作品ID，可能是R-18权限问题喵！"))
         return {}
 
-    def _fetch_paginated_ids(self, base_url: str, extractor) -> List[str]:
-        ids = []
-        offset, limit = 0, 30
-        while True:
-            url = f"{base_url}?limit={limit}&last_order={offset}&order_by=asc" if "?" not in base_url else f"{base_url}&offset={offset}&limit={limit}&rest=show"
-            data = self._request(url)
-            if not data: break
-            
+    def _fetch_paginated_ids(self, base_url: str, extractor, total: Optional[int] = None) -> List[str]:
+        """分页列出作品 ID。第一页拿到总数 (total 参数或响应里的 body.total) 后，其余页并发请求，
+        发起节奏仍受 _pace 共享限速约束；总数未知时逐页顺序翻。"""
+        limit = 30
+
+        def page_url(offset: int) -> str:
+            return f"{base_url}?limit={limit}&last_order={offset}&order_by=asc" if "?" not in base_url else f"{base_url}&offset={offset}&limit={limit}&rest=show"
+
+        def fetch(offset: int):
+            self._pace()
+            data = self._request(page_url(offset))
+            if not data: return None, []
             body = data.get('body', {})
-            items = extractor(body)
+            return body, extractor(body) or []
+
+        def to_ids(items) -> List[str]:
+            return [str(x['id']) for x in items if isinstance(x, dict) and 'id' in x]
+
+        body, items = fetch(0)
+        ids = to_ids(items)
+        offset = len(items)
+        full = len(items) >= limit
+
+        if full:
+            if total is None and isinstance(body, dict):
+                total = body.get('total')
+            try:
+                total = int(total or 0)
+            except (TypeError, ValueError):
+                total = 0
+
+            if total > offset:
+                offsets = list(range(offset, total, limit))
+                with ThreadPoolExecutor(max_workers=max(1, min(self.MAX_WORKERS, len(offsets)))) as executor:
+                    pages = list(executor.map(fetch, offsets))
+                for _, page_items in pages:
+                    ids.extend(to_ids(page_items))
+                offset = offsets[-1] + len(pages[-1][1])
+                # 翻页期间列表可能变长：最后一页仍是满页时继续顺序往后翻
+                full = len(pages[-1][1]) >= limit
+
+        while full:
+            _, items = fetch(offset)
             if not items: break
-            
-            batch = [str(x['id']) for x in items if isinstance(x, dict) and 'id' in x]
-            ids.extend(batch)
-            
-            if len(items) < limit: break
+            ids.extend(to_ids(items))
+            full = len(items) >= limit
             offset += len(items)
-            time.sleep(0.5)
-        return ids
+        return list(dict.fromkeys(ids))
 
     def _get_bookmark_works(self, user_id: str) -> List[str]:
         return self._fetch_paginated_ids(
@@ -515,7 +687,7 @@ class PixivPlugin(DownloadPlugin):
         
         return works
 
-    def _download_novel(self, nid: str, save_dir: str, db=None) -> bool:
+    def _download_novel(self, nid: str, save_dir: str, db=None, file_hashes: Optional[Dict[str, str]] = None, body: Optional[Dict] = None) -> bool:
         # 1. 检查数据库记录 (防止搬运后再次下载)
         if db:
             record = db.get_download_record("pixiv", f"novel:{nid}")
@@ -542,14 +714,15 @@ class PixivPlugin(DownloadPlugin):
                                 work_id=f"novel:{nid}",
                                 title=fname.split(" (")[0], # 简单提取标题
                                 author="Unknown", # 无法获取作者，暂时设为 Unknown
-                                local_path=fpath
+                                local_path=fpath,
+                                file_hash=sha256_file(fpath)
                             )
                         return True
                         
-        data = self._request(f"{self.BASE_URL}/ajax/novel/{nid}")
-        if not data or data.get('error'): return False
-        
-        body = data.get('body', {})
+        if not body:
+            data = self._request(f"{self.BASE_URL}/ajax/novel/{nid}")
+            if not data or data.get('error'): return False
+            body = data.get('body', {})
         if not body: return False
 
         title = body.get('title', f"novel_{nid}")
@@ -568,8 +741,12 @@ class PixivPlugin(DownloadPlugin):
         base_name = sanitize_filename(f"{author_name} - {title} (pixiv:novel:{nid})")
         filename = f"{base_name}.txt"
         file_path = os.path.join(save_dir, filename)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(full_text)
+        raw = full_text.encode('utf-8')
+        file_hash = hashlib.sha256(raw).hexdigest()
+        with open(file_path, 'wb') as f:
+            f.write(raw)
+        if file_hashes is not None:
+            file_hashes[os.path.abspath(file_path)] = file_hash
             
         set_file_time(file_path, body.get('createDate') or body.get('uploadDate'))
         
@@ -592,6 +769,7 @@ class PixivPlugin(DownloadPlugin):
                     db.add_resource(
                         post_id=post_pk,
                         file_path=file_path,
+                        file_hash=file_hash,
                         file_size=os.path.getsize(file_path)
                     )
 
@@ -601,15 +779,64 @@ class PixivPlugin(DownloadPlugin):
                     work_id=f"novel:{nid}",
                     title=title,
                     author=author_name,
-                    local_path=file_path
+                    local_path=file_path,
+                    file_hash=file_hash
                 )
             except Exception:
                 pass
 
         return True
 
-    def _download_illust(self, iid: str, save_dir: str, temp_root: Optional[str] = None, db=None) -> bool:
-        cfg = config.get_download_config(reload=False)
+    @staticmethod
+    def _illust_meta_from_detail(body: Dict) -> Dict:
+        """/ajax/illust/{id} 的 body 整理成打包和入库要用的字段"""
+        return {
+            'title': body.get('title') or '',
+            'userName': body.get('userName') or '',
+            'description': body.get('description') or '',
+            'series': (body.get('seriesNavData') or {}).get('title', '') or '',
+            'tags': [t.get('tag') for t in (body.get('tags') or {}).get('tags', []) if t.get('tag')],
+            'date': body.get('createDate') or body.get('uploadDate') or '',
+        }
+
+    def _wants_caption(self, save_content: bool = False) -> bool:
+        """
+        是否需要作品说明和系列名。主页批量接口不返回这两项 (description 字段实际为空)，
+        需要时不做批量预取，逐作品请求 /ajax/illust/{id}
+        """
+        return bool(save_content or self._cfg.get("pixiv_save_caption", False))
+
+    @staticmethod
+    def _illust_meta_from_profile(work: Dict) -> Dict:
+        """作者主页批量接口里的单个作品 (标签是字符串列表，没有作品说明和系列信息)"""
+        return {
+            'title': work.get('title') or '',
+            'userName': work.get('userName') or '',
+            'description': work.get('description') or '',
+            'series': '',
+            'tags': [t for t in (work.get('tags') or []) if isinstance(t, str) and t],
+            'date': work.get('createDate') or work.get('uploadDate') or '',
+        }
+
+    def _prefetch_illust_meta(self, user_id: str, ids: List[str]) -> Dict[str, Dict]:
+        """用 /ajax/user/{uid}/profile/illusts?ids[]=... 按批取回作品元数据；取不到的作品下载时再单独请求"""
+        metas = {}
+        for i in range(0, len(ids), self.META_BATCH_SIZE):
+            chunk = ids[i:i + self.META_BATCH_SIZE]
+            query = urllib.parse.urlencode(
+                [('ids[]', wid) for wid in chunk] + [('work_category', 'illustManga'), ('is_first_page', '0')]
+            )
+            data = self._request(f"{self.BASE_URL}/ajax/user/{user_id}/profile/illusts?{query}")
+            works = ((data or {}).get('body') or {}).get('works') or {}
+            if not isinstance(works, dict):
+                continue
+            for wid, work in works.items():
+                if isinstance(work, dict) and work.get('title') is not None:
+                    metas[str(wid)] = self._illust_meta_from_profile(work)
+        return metas
+
+    def _download_illust(self, iid: str, save_dir: str, temp_root: Optional[str] = None, db=None, file_hashes: Optional[Dict[str, str]] = None, meta: Optional[Dict] = None) -> bool:
+        cfg = self._cfg
         
         # 1. 检查数据库记录
         if db:
@@ -631,20 +858,17 @@ class PixivPlugin(DownloadPlugin):
                              work_id=f"illust:{iid}",
                              title=fname.split(" (")[0], # 简单提取标题
                              author="Unknown", 
-                             local_path=os.path.join(save_dir, fname)
+                             local_path=os.path.join(save_dir, fname),
+                             file_hash=sha256_file(os.path.join(save_dir, fname))
                          )
                      return True
         
-        data = self._request(f"{self.BASE_URL}/ajax/illust/{iid}/pages")
-        if not data: return False
-        pages = data.get('body', [])
-        if not pages: return False
-
-        meta_data = self._request(f"{self.BASE_URL}/ajax/illust/{iid}")
-        meta_body = meta_data.get('body', {}) if meta_data else {}
+        if not meta:
+            meta_data = self._request(f"{self.BASE_URL}/ajax/illust/{iid}")
+            meta = self._illust_meta_from_detail(meta_data.get('body', {}) if meta_data else {})
         
-        title = meta_body.get('title') or f"illust_{iid}"
-        author_name = meta_body.get('userName') or "Unknown"
+        title = meta.get('title') or f"illust_{iid}"
+        author_name = meta.get('userName') or "Unknown"
         base_name = sanitize_filename(f"{author_name} - {title} (pixiv:illust:{iid})")
         
         fmt = str(cfg.get("pixiv_format", "pdf") or "pdf").lower()
@@ -657,6 +881,11 @@ class PixivPlugin(DownloadPlugin):
             # tqdm.write(Colors.green(f"已存在跳过: {base_name}{output_ext}"))
             return True
 
+        data = self._request(f"{self.BASE_URL}/ajax/illust/{iid}/pages")
+        if not data: return False
+        pages = data.get('body', [])
+        if not pages: return False
+
         work_dir = os.path.join(temp_root or save_dir, f"_temp_{base_name}")
         os.makedirs(work_dir, exist_ok=True)
         
@@ -669,7 +898,7 @@ class PixivPlugin(DownloadPlugin):
                     path = os.path.join(work_dir, fname)
                     tasks.append((url, path))
             
-            futures = {executor.submit(self._download_image, url, path): path for url, path in tasks}
+            futures = {executor.submit(bind(self._download_image), url, path): path for url, path in tasks}
             iterator = as_completed(futures)
             if len(tasks) > 5:
                 iterator = tqdm(iterator, total=len(tasks), leave=False, unit="img", desc=f"DL {title[:10]}...")
@@ -691,39 +920,42 @@ class PixivPlugin(DownloadPlugin):
             success = create_cbz(
                 images=downloaded_images,
                 output_path=output_path,
-                title=meta_body.get('title', ''),
-                author=meta_body.get('userName', ''),
-                description=meta_body.get('description', ''),
-                series=(meta_body.get('seriesNavData') or {}).get('title', ''),
-                source_url=f"{self.BASE_URL}/artworks/{iid}",
-                tags=[t.get('tag') for t in (meta_body.get('tags') or {}).get('tags', []) if t.get('tag')],
-                published_time=meta_body.get('createDate') or meta_body.get('uploadDate')
+                title=meta.get('title', ''),
+                author=meta.get('userName', ''),
+                description=meta.get('description', ''),
+                series=meta.get('series', ''),
+                source_url=f"{self.SITE_URL}/artworks/{iid}",
+                tags=meta.get('tags', []),
+                published_time=meta.get('date') or None
             )
         else:
             success = create_pdf(
                 images=downloaded_images,
                 output_path=output_path,
-                title=meta_body.get('title', ''),
-                author=meta_body.get('userName', ''),
-                tags=[t.get('tag') for t in (meta_body.get('tags') or {}).get('tags', []) if t.get('tag')],
-                published_time=meta_body.get('createDate') or meta_body.get('uploadDate')
+                title=meta.get('title', ''),
+                author=meta.get('userName', ''),
+                tags=meta.get('tags', []),
+                published_time=meta.get('date') or None
             )
         
         shutil.rmtree(work_dir, ignore_errors=True)
 
+        output_hash = sha256_file(output_path) if success else ""
+        if output_hash and file_hashes is not None:
+            file_hashes[os.path.abspath(output_path)] = output_hash
+
         # 下载完成后，记录到数据库
         if success and db:
             try:
                 # 1. 插入到新的 posts 表
-                tags_list = [t.get('tag') for t in (meta_body.get('tags') or {}).get('tags', []) if t.get('tag')]
                 post_pk = db.upsert_post(
                     platform="pixiv",
                     work_id=f"illust:{iid}",
                     author=author_name,
                     title=title,
-                    content=meta_body.get('description', ''),
-                    tags=",".join(tags_list),
-                    published_at=meta_body.get('createDate') or meta_body.get('uploadDate')
+                    content=meta.get('description', ''),
+                    tags=",".join(meta.get('tags', [])),
+                    published_at=meta.get('date') or None
                 )
                 
                 # 2. 插入资源
@@ -731,7 +963,8 @@ class PixivPlugin(DownloadPlugin):
                     db.add_resource(
                         post_id=post_pk,
                         file_path=output_path,
-                        file_url=f"{self.BASE_URL}/artworks/{iid}",
+                        file_url=f"{self.SITE_URL}/artworks/{iid}",
+                        file_hash=output_hash or None,
                         file_size=os.path.getsize(output_path)
                     )
 
@@ -741,14 +974,18 @@ class PixivPlugin(DownloadPlugin):
                     work_id=f"illust:{iid}",
                     title=title,
                     author=author_name,
-                    local_path=output_path
+                    local_path=output_path,
+                    file_hash=output_hash
                 )
             except Exception:
                 pass
 
         return success
 
-    def _download_image(self, url: str, save_path: str) -> bool:
+    @traced("fetch")
+    def _download_image(self, url: str, save_path: str) -> str:
+        """下载单张图片，边写边算 SHA-256。成功返回哈希，失败返回空串。"""
+        annotate(url=url)
         try:
             os.makedirs(os.path.dirname(save_path), exist_ok=True)
         except Exception:
@@ -771,15 +1008,15 @@ class PixivPlugin(DownloadPlugin):
             res = None
 
         if not res:
-            return False
+            return ""
 
         if res.status_code in (416,):
             try:
                 if existing > 0:
-                    return True
+                    return sha256_file(save_path)
             except Exception:
                 pass
-            return False
+            return ""
 
         if existing > 0 and res.status_code != 206:
             try:
@@ -791,14 +1028,22 @@ class PixivPlugin(DownloadPlugin):
         try:
             res.raise_for_status()
         except Exception:
-            return False
+            return ""
 
         mode = 'ab' if existing > 0 and res.status_code == 206 else 'wb'
+        h = hashlib.sha256()
         try:
+            if mode == 'ab':
+                with open(save_path, 'rb') as f:
+                    for buf in iter(lambda: f.read(1024 * 1024), b""):
+                        h.update(buf)
+            bytes_ctr = DOWNLOAD_BYTES.labels(url_host(url))
             with open(save_path, mode) as f:
                 for chunk in res.iter_content(8192):
                     if chunk:
                         f.write(chunk)
-            return True
+                        h.update(chunk)
+                        bytes_ctr.inc(len(chunk))
+            return h.hexdigest()
         except Exception:
-            return False
+            return ""
@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from tqdm import tqdm
+
+from ...utils import Colors, DOWNLOAD_BYTES, url_host
+
+
+STATE_SUFFIX = ".segments.json"
+
+if hasattr(os, "pwrite"):
+    def _pwrite(fd: int, data: bytes, offset: int):
+        view = memoryview(data)
+        while view:
+            n = os.pwrite(fd, view, offset)
+            view = view[n:]
+            offset += n
+else:
+    # Windows 没有 pwrite，用锁把 seek+write 串起来
+    _SEEK_LOCK = threading.Lock()
+
+    def _pwrite(fd: int, data: bytes, offset: int):
+        with _SEEK_LOCK:
+            os.lseek(fd, offset, os.SEEK_SET)
+            view = memoryview(data)
+            while view:
+                n = os.write(fd, view)
+                view = view[n:]
+
+
+class RangeNotSupported(Exception):
+    """The server ignored a Range request; caller should fall back to a single stream."""
+
+
+class SegmentedDownloader:
+    """
+    Multi-connection downloader for large files.
+
+    The file is preallocated and split into N byte ranges that are fetched in
+    parallel and written in place with os.pwrite. Progress per segment is kept
+    in a sidecar "<file>.segments.json" so an interrupted download resumes only
+    the missing bytes. The finished file is checksummed (SHA-256) before the
+    sidecar is removed.
+    """
+
+    def __init__(self, session, cfg: Optional[Dict] = None):
+        cfg = cfg or {}
+        self.session = session
+        self.threshold = int(float(cfg.get("segmented_threshold_mb", 64) or 0) * 1024 * 1024)
+        self.parts = max(1, int(cfg.get("segmented_parts", 4) or 4))
+        self.timeout = int(cfg.get("timeout", 10) or 10)
+        self.max_retries = int(cfg.get("max_retries", 3) or 3)
+        self.chunk_size = 1024 * 1024
+        self.state_every = 16 * 1024 * 1024
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0 and self.parts > 1
+
+    @staticmethod
+    def state_path(path: str) -> str:
+        return path + STATE_SUFFIX
+
+    def has_state(self, path: str) -> bool:
+        return os.path.exists(self.state_path(path))
+
+    def discard(self, path: str):
+        for p in (path, self.state_path(path)):
+            try:
+                if os.path.exists(p):
+                    os.remove(p)
+            except Exception:
+                pass
+
+    def eligible(self, res) -> int:
+        """Return the total size if an open 200 response is worth segmenting, else 0."""
+        if not self.enabled or res is None or res.status_code != 200:
+            return 0
+        if str(res.headers.get("Accept-Ranges", "")).lower() != "bytes":
+            return 0
+        if res.headers.get("Content-Encoding"):
+            return 0
+        try:
+            total = int(res.headers.get("Content-Length") or 0)
+        except Exception:
+            return 0
+        return total if total >= self.threshold else 0
+
+    def probe(self, url: str) -> int:
+        """Ask for the first byte only; returns the total size when Range is honoured, else 0."""
+        try:
+            res = self.session.get(url, stream=True, timeout=self.timeout, headers={"Range": "bytes=0-0"})
+        except Exception:
+            return 0
+        try:
+            if res.status_code != 206:
+                return 0
+            cr = str(res.headers.get("Content-Range", ""))
+            if "/" not in cr:
+                return 0
+            total = cr.rsplit("/", 1)[1].strip()
+            return int(total) if total.isdigit() else 0
+        finally:
+            res.close()
+
+    def _plan(self, total: int) -> List[Dict]:
+        parts = min(self.parts, max(1, total // (1024 * 1024)))
+        step = total // parts
+        segs = []
+        for i in range(parts):
+            start = i * step
+            end = total - 1 if i == parts - 1 else (i + 1) * step - 1
+            segs.append({"start": start, "end": end, "done": 0})
+        return segs
+
+    def _load_state(self, url: str, path: str, total: int) -> Optional[List[Dict]]:
+        try:
+            with open(self.state_path(path), "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("url") != url or int(state.get("size") or 0) != total:
+                return None
+            if not os.path.exists(path) or os.path.getsize(path) != total:
+                return None
+            segs = list(state.get("segments") or [])
+            return segs or None
+        except Exception:
+            return None
+
+    def _save_state(self, url: str, path: str, total: int, segs: List[Dict]):
+        tmp = self.state_path(path) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"url": url, "size": total, "segments": segs}, f)
+        os.replace(tmp, self.state_path(path))
+
+    def download(self, url: str, path: str, total: int, expected_hash: str = "",
+                 progress: Optional[Callable[[int, int], None]] = None) -> str:
+        """Download url into path using ranged requests. Returns the SHA-256 of the result."""
+        segs = self._load_state(url, path, total)
+        if segs is None:
+            segs = self._plan(total)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0))
+            try:
+                if hasattr(os, "posix_fallocate"):
+                    try:
+                        os.posix_fallocate(fd, 0, total)
+                    except OSError:
+                        os.ftruncate(fd, total)
+                else:
+                    os.ftruncate(fd, total)
+            finally:
+                os.close(fd)
+            self._save_state(url, path, total, segs)
+
+        lock = threading.Lock()
+        counters = {"done": sum(int(s["done"]) for s in segs), "since_save": 0}
+
+        def on_bytes(n: int):
+            with lock:
+                counters["done"] += n
+                counters["since_save"] += n
+                if counters["since_save"] >= self.state_every:
+                    counters["since_save"] = 0
+                    self._save_state(url, path, total, segs)
+                done = counters["done"]
+            if progress:
+                progress(done, total)
+
+        fd = os.open(path, os.O_RDWR | getattr(os, "O_BINARY", 0))
+        try:
+            with ThreadPoolExecutor(max_workers=len(segs)) as executor:
+                futures = [executor.submit(self._fetch_segment, url, fd, seg, total, on_bytes) for seg in segs]
+                errors = []
+                for f in futures:
+                    try:
+                        f.result()
+                    except Exception as e:
+                        errors.append(e)
+            with lock:
+                self._save_state(url, path, total, segs)
+            for e in errors:
+                if isinstance(e, RangeNotSupported):
+                    raise e
+            if errors:
+                raise errors[0]
+        finally:
+            os.close(fd)
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for buf in iter(lambda: f.read(self.chunk_size), b""):
+                h.update(buf)
+        digest = h.hexdigest()
+        if expected_hash and digest != expected_hash:
+            self.discard(path)
+            raise Exception(f"分段下载校验失败 (期望 {expected_hash[:12]}…，实际 {digest[:12]}…)")
+
+        try:
+            os.remove(self.state_path(path))
+        except Exception:
+            pass
+        return digest
+
+    def _fetch_segment(self, url: str, fd: int, seg: Dict, total: int, on_bytes: Callable[[int], None]):
+        for attempt in range(self.max_retries):
+            start = int(seg["start"]) + int(seg["done"])
+            end = int(seg["end"])
+            if start > end:
+                return
+            try:
+                res = self.session.get(url, stream=True, timeout=self.timeout,
+                                       headers={"Range": f"bytes={start}-{end}"})
+            except Exception:
+                if attempt == self.max_retries - 1:
+                    raise
+                time.sleep(1 + attempt)
+                continue
+
+            try:
+                if res.status_code == 200:
+                    raise RangeNotSupported(f"服务器不支持分段下载: {url}")
+                res.raise_for_status()
+                cr = str(res.headers.get("Content-Range", ""))
+                if not cr.startswith(f"bytes {start}-") or not cr.endswith(f"/{total}"):
+                    raise RangeNotSupported(f"分段响应范围不符: {cr}")
+
+                offset = start
+                bytes_ctr = DOWNLOAD_BYTES.labels(url_host(url))
+                for chunk in res.iter_content(chunk_size=self.chunk_size):
+                    if not chunk:
+                        continue
+                    room = end + 1 - offset
+                    if len(chunk) > room:
+                        chunk = chunk[:room]
+                    _pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+                    bytes_ctr.inc(len(chunk))
+                    seg["done"] = offset - int(seg["start"])
+                    on_bytes(len(chunk))
+                    if offset > end:
+                        break
+                if offset > end:
+                    return
+                raise Exception(f"分段提前结束 ({offset}/{end + 1})")
+            except RangeNotSupported:
+                raise
+            except Exception as e:
+                if attempt == self.max_retries - 1:
+                    raise
+                tqdm.write(Colors.yellow(f"分段下载中断，正在重试 ({attempt + 1}/{self.max_retries}): {e}"))
+                time.sleep(1 + attempt)
+            finally:
+                res.close()
@@ -1,11 +1,21 @@
+import io
 import os
+import re
+import hashlib
+import tempfile
+import threading
+import time
 import zipfile
 import xml.etree.ElementTree as ET
+from collections import deque
 from datetime import datetime
-from typing import List, Optional, Union
+from html.parser import HTMLParser
+from typing import Iterable, List, Optional, Union
 from PIL import Image
-from core.utils import Colors
+from core.utils import Colors, PACK_SECONDS
+from core.tracing import traced
 from tqdm import tqdm
+from .pack_pool import normalize_pages, transcode_page
 
 def sanitize_filename(name: str, max_length: int = 200) -> str:
     """
@@ -35,6 +45,128 @@ def sanitize_filename(name: str, max_length: int = 200) -> str:
         
     return cleaned
 
+class PostContent:
+    """
+    Result of parsing one post body: <img> sources in document order and the text nodes.
+    For well-formed markup ``get_text(separator)`` gives the same text as
+    BeautifulSoup(html, "html.parser").get_text(separator) on bs4 >= 4.10 (script/style/template
+    contents and <rt>/<rp> ruby annotations are left out). Character references are decoded with
+    the standard library's HTML5 rules, so unknown or unterminated ones (``&bogus;``, ``&notit;``)
+    can come out differently from BeautifulSoup.
+    """
+
+    __slots__ = ("images", "strings")
+
+    def __init__(self, images: List[str], strings: List[str]):
+        self.images = images
+        self.strings = strings
+
+    def get_text(self, separator: str = "") -> str:
+        return separator.join(self.strings)
+
+class _PostContentParser(HTMLParser):
+    # 与 BeautifulSoup 的 get_text 保持一致：跳过 script/style/template 和注音 (rt/rp)，纯空白文本折叠成单个换行或空格
+    SKIP_TAGS = {"script", "style", "template"}
+    RUBY_TAGS = {"rt", "rp"}
+    PRESERVE_TAGS = {"pre", "textarea"}
+    ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.images = []
+        self.strings = []
+        self._buf = []
+        self._skip = 0
+        self._ruby = 0
+        self._preserve = 0
+
+    def _flush(self):
+        if not self._buf:
+            return
+        data = "".join(self._buf)
+        self._buf = []
+        if not self._preserve and not data.strip(self.ASCII_SPACES):
+            data = "\n" if "\n" in data else " "
+        self.strings.append(data)
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag == "img":
+            src = None
+            for k, v in attrs:
+                if k == "src":
+                    src = v
+            if src:
+                self.images.append(src)
+        elif tag in self.SKIP_TAGS:
+            self._skip += 1
+        elif tag in self.RUBY_TAGS:
+            self._ruby += 1
+        elif tag in self.PRESERVE_TAGS:
+            self._preserve += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+        if tag == "img":
+            self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag in self.SKIP_TAGS and self._skip:
+            self._skip -= 1
+        elif tag in self.RUBY_TAGS and self._ruby:
+            self._ruby -= 1
+        elif tag == "ruby":
+            # 省略了结束标签的 rt/rp 随 </ruby> 一起结束
+            self._ruby = 0
+        elif tag in self.PRESERVE_TAGS and self._preserve:
+            self._preserve -= 1
+
+    def handle_data(self, data):
+        if not self._skip and not self._ruby:
+            self._buf.append(data)
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.startswith("CDATA[") and not self._skip and not self._ruby:
+            self.strings.append(data[len("CDATA["):])
+
+    def close(self):
+        super().close()
+        self._flush()
+
+def parse_post_content(html: Optional[str]) -> PostContent:
+    """
+    Parse a post's HTML body once, streaming, without building a tree.
+    """
+    parser = _PostContentParser()
+    if html:
+        parser.feed(html)
+    parser.close()
+    return PostContent(parser.images, parser.strings)
+
+def sha256_file(filepath: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Compute the SHA-256 of a file on disk. Returns "" if the file cannot be read.
+    """
+    h = hashlib.sha256()
+    try:
+        with open(filepath, "rb") as f:
+            for buf in iter(lambda: f.read(chunk_size), b""):
+                h.update(buf)
+    except Exception:
+        return ""
+    return h.hexdigest()
+
 def set_file_time(filepath: str, date_val: Union[str, float, datetime, None]):
     """
     Set the modification time of a file.
@@ -61,6 +193,45 @@ def set_file_time(filepath: str, date_val: Union[str, float, datetime, None]):
     except Exception:
         pass
 
+def _comic_info_xml(title: str, author: str, description: str, source_url: str,
+                    tags: Optional[List[str]], series: str,
+                    published_time: Union[str, datetime, None], page_count: int) -> bytes:
+    """
+    Build the ComicInfo.xml payload shared by create_cbz and StreamingCbzWriter.
+    """
+    root = ET.Element("ComicInfo")
+    ET.SubElement(root, "Title").text = title
+    if series:
+        ET.SubElement(root, "Series").text = series
+    ET.SubElement(root, "Summary").text = description
+    ET.SubElement(root, "Writer").text = author
+    ET.SubElement(root, "PageCount").text = str(page_count)
+    if source_url:
+        ET.SubElement(root, "Web").text = source_url
+
+    if tags:
+        ET.SubElement(root, "Tags").text = ",".join(tags).replace(",", "，")
+
+    if published_time:
+        try:
+            dt = None
+            if isinstance(published_time, str):
+                dt = datetime.fromisoformat(published_time.replace("Z", "+00:00"))
+            elif isinstance(published_time, datetime):
+                dt = published_time
+
+            if dt:
+                ET.SubElement(root, "Year").text = str(dt.year)
+                ET.SubElement(root, "Month").text = str(dt.month)
+                ET.SubElement(root, "Day").text = str(dt.day)
+        except Exception:
+            pass
+
+    if hasattr(ET, 'indent'):
+        ET.indent(root, space="  ")
+    return ET.tostring(root, encoding='utf-8', method='xml')
+
+@traced("create_cbz")
 def create_cbz(images: List[str], output_path: str, 
                title: str, author: str, 
                description: str = "", 
@@ -71,6 +242,7 @@ def create_cbz(images: List[str], output_path: str,
     """
     Create a CBZ file from a list of images with ComicInfo.xml metadata.
     """
+    t0 = time.perf_counter()
     try:
         with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_STORED) as zf:
             # Write images
@@ -80,90 +252,482 @@ def create_cbz(images: List[str], output_path: str,
                 zf.write(img_path, f"{i+1:03d}{ext}")
             
             # Create ComicInfo.xml
-            root = ET.Element("ComicInfo")
-            ET.SubElement(root, "Title").text = title
-            if series:
-                ET.SubElement(root, "Series").text = series
-            ET.SubElement(root, "Summary").text = description
-            ET.SubElement(root, "Writer").text = author
-            ET.SubElement(root, "PageCount").text = str(len(images))
-            if source_url:
-                ET.SubElement(root, "Web").text = source_url
-            
-            if tags:
-                ET.SubElement(root, "Tags").text = ",".join(tags).replace(",", "，")
-            
-            if published_time:
-                try:
-                    dt = None
-                    if isinstance(published_time, str):
-                        dt = datetime.fromisoformat(published_time.replace("Z", "+00:00"))
-                    elif isinstance(published_time, datetime):
-                        dt = published_time
-                        
-                    if dt:
-                        ET.SubElement(root, "Year").text = str(dt.year)
-                        ET.SubElement(root, "Month").text = str(dt.month)
-                        ET.SubElement(root, "Day").text = str(dt.day)
-                except Exception:
-                    pass
-            
-            if hasattr(ET, 'indent'):
-                ET.indent(root, space="  ")
-            zf.writestr("ComicInfo.xml", ET.tostring(root, encoding='utf-8', method='xml'))
+            zf.writestr("ComicInfo.xml", _comic_info_xml(
+                title, author, description, source_url, tags, series, published_time, len(images)
+            ))
             
         # Update timestamp
         set_file_time(output_path, published_time)
+        PACK_SECONDS.observe(time.perf_counter() - t0, "cbz")
         tqdm.write(Colors.green(f"已生成 CBZ: {os.path.basename(output_path)}"))
         return True
     except Exception as e:
         tqdm.write(Colors.red(f"CBZ 打包失败: {e}"))
         return False
 
+CBZ_PAGE_EXTS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
+
+def _natural_key(name: str):
+    return [int(t) if t.isdigit() else t.lower() for t in re.split(r'(\d+)', name)]
+
+def cbz_page_names(names: Iterable[str]) -> List[str]:
+    """
+    Image members of a CBZ in reading order.
+    create_cbz / StreamingCbzWriter name pages 001.ext, 002.ext...; a natural sort keeps
+    that order past page 999 and also handles archives packed by other tools.
+    """
+    pages = [
+        n for n in names
+        if not n.endswith('/')
+        and not n.startswith('__MACOSX/')
+        and os.path.splitext(n)[1].lower() in CBZ_PAGE_EXTS
+    ]
+    pages.sort(key=_natural_key)
+    return pages
+
+class StreamingCbzWriter:
+    """
+    Build a CBZ incrementally from image byte streams (HTTP bodies, nested ZIP members...).
+
+    Slots are numbered from 0 in reading order; each slot holds zero or more images
+    (a nested ZIP expands into several pages, a failed download is an empty slot).
+    A slot's pages are read into SpooledTemporaryFile buffers first and appended to the
+    archive once the whole slot has been read and all earlier slots are done. Once the
+    buffers' combined in-memory size exceeds ``max_buffer_bytes`` they roll over to files
+    in ``spill_dir`` (checked after every page, so one huge slot cannot blow the budget either).
+
+    A page that fails to read only drops its own slot: nothing of that slot has reached
+    the archive yet, so its buffers are discarded and the rest of the archive is kept.
+
+    ``put`` may be called from several threads; only one of them writes to the archive
+    at a time. The archive is written to ``<output_path>.part`` and renamed on ``finish``.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, output_path: str, spill_dir: Optional[str] = None,
+                 max_buffer_bytes: int = 64 * 1024 * 1024):
+        self.output_path = output_path
+        self.part_path = output_path + ".part"
+        self.spill_dir = spill_dir
+        self.max_buffer_bytes = max(1, int(max_buffer_bytes))
+        self.pages = 0
+        self._zf = zipfile.ZipFile(self.part_path, 'w', zipfile.ZIP_STORED)
+        self._lock = threading.Lock()
+        self._next = 0
+        self._writing = False
+        self._pending = {}  # slot -> [[ext, spool, size, in_memory], ...]
+        self._filling = {}  # 正在缓冲、还没交齐的 slot，同样计入内存预算
+        self._buffered = 0
+        self._error = None
+        # 只统计写归档花的时间，不含等待下载的时间
+        self._pack_seconds = 0.0
+
+    def _append(self, ext: str, stream):
+        self.pages += 1
+        info = zipfile.ZipInfo(f"{self.pages:03d}{ext}", date_time=datetime.now().timetuple()[:6])
+        info.compress_type = zipfile.ZIP_STORED
+        with self._zf.open(info, 'w') as dst:
+            for buf in iter(lambda: stream.read(self.CHUNK_SIZE), b""):
+                dst.write(buf)
+
+    def _write_slot(self, images):
+        """写入一个已经完整缓冲好的 slot；这时只会是归档本身写不下去，只能整体放弃"""
+        t0 = time.perf_counter()
+        try:
+            if self._error is None:
+                for ext, stream in images:
+                    self._append(ext, stream)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._pack_seconds += time.perf_counter() - t0
+            with self._lock:
+                self._next += 1
+                self._writing = False
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if self._writing or self._next not in self._pending:
+                    return
+                entries = self._pending.pop(self._next)
+                self._writing = True
+                for entry in entries:
+                    if entry[3]:
+                        self._buffered -= entry[2]
+            try:
+                self._write_slot((ext, sp) for ext, sp, _, _ in entries)
+            finally:
+                for entry in entries:
+                    entry[1].close()
+
+    def _spool(self, stream):
+        # 预算还有余量时先放内存，超过余量就落盘；预算已用完则直接写临时文件
+        with self._lock:
+            room = self.max_buffer_bytes - self._buffered
+        if room > 0:
+            sp = tempfile.SpooledTemporaryFile(max_size=room, dir=self.spill_dir)
+        else:
+            sp = tempfile.TemporaryFile(dir=self.spill_dir)
+        size = 0
+        try:
+            for buf in iter(lambda: stream.read(self.CHUNK_SIZE), b""):
+                sp.write(buf)
+                size += len(buf)
+        except Exception:
+            sp.close()
+            raise
+        sp.seek(0)
+        return sp, size, 0 < room and size <= room
+
+    def _enforce_budget(self):
+        # 内存里积压的页超出预算时，从最靠后的页开始落盘，先写的页留在内存
+        if self._buffered <= self.max_buffer_bytes:
+            return
+        for slot in sorted(list(self._pending) + list(self._filling), reverse=True):
+            for entry in self._pending.get(slot) or self._filling.get(slot) or ():
+                if entry[3]:
+                    entry[1].rollover()
+                    entry[3] = False
+                    self._buffered -= entry[2]
+                    if self._buffered <= self.max_buffer_bytes:
+                        return
+
+    def put(self, slot: int, images=()) -> bool:
+        """
+        Hand over the images of one slot as (ext, readable binary stream) pairs.
+        Streams are fully consumed before this returns. Pass no images to skip the slot.
+        Returns False when a stream failed to read; the slot is then left empty.
+        """
+        # 整组读完才写进归档，读到一半出错时归档里没有这一组的任何内容，不需要回滚。
+        # 逐页计入预算：一个 slot 可能有几百页 (嵌套 ZIP)，不能等整组缓冲完才检查
+        entries = []
+        ok = True
+        with self._lock:
+            self._filling[slot] = entries
+        try:
+            for ext, stream in images:
+                sp, size, in_memory = self._spool(stream)
+                with self._lock:
+                    entries.append([ext, sp, size, in_memory])
+                    if in_memory:
+                        self._buffered += size
+                    self._enforce_budget()
+        except Exception as e:
+            ok = False
+            tqdm.write(Colors.yellow(f"有页面读取失败，已跳过这一组 ({e})"))
+        finally:
+            with self._lock:
+                self._filling.pop(slot, None)
+                if not ok:
+                    for entry in entries:
+                        if entry[3]:
+                            self._buffered -= entry[2]
+                        entry[1].close()
+                    entries = []
+                self._pending[slot] = entries
+            self._drain()
+        return ok
+
+    def abort(self):
+        for entries in self._pending.values():
+            for entry in entries:
+                entry[1].close()
+        self._pending = {}
+        try:
+            self._zf.close()
+        except Exception:
+            pass
+        try:
+            os.remove(self.part_path)
+        except Exception:
+            pass
+
+    @traced("create_cbz_stream")
+    def finish(self, title: str, author: str,
+               description: str = "",
+               source_url: str = "",
+               tags: List[str] = None,
+               series: str = "",
+               published_time: Union[str, datetime, None] = None) -> bool:
+        """
+        Flush any slots left behind a gap, write ComicInfo.xml and move the archive into place.
+        Returns False (and removes the partial archive) when no page was written.
+        """
+        for slot in sorted(self._pending):
+            with self._lock:
+                self._next = slot
+            self._drain()
+
+        if self._error is not None or self.pages == 0:
+            if self._error is not None:
+                tqdm.write(Colors.red(f"CBZ 打包失败: {self._error}"))
+            self.abort()
+            return False
+
+        t0 = time.perf_counter()
+        try:
+            self._zf.writestr("ComicInfo.xml", _comic_info_xml(
+                title, author, description, source_url, tags, series, published_time, self.pages
+            ))
+            self._zf.close()
+            os.replace(self.part_path, self.output_path)
+            PACK_SECONDS.observe(self._pack_seconds + time.perf_counter() - t0, "cbz")
+        except Exception as e:
+            tqdm.write(Colors.red(f"CBZ 打包失败: {e}"))
+            self.abort()
+            return False
+
+        set_file_time(self.output_path, published_time)
+        tqdm.write(Colors.green(f"已生成 CBZ: {os.path.basename(self.output_path)}"))
+        return True
+
+def _pdf_string(text: str) -> bytes:
+    """Encode a document info string: plain literal for ASCII, UTF-16BE hex otherwise."""
+    text = "" if text is None else str(text)
+    try:
+        raw = text.encode("ascii")
+    except UnicodeEncodeError:
+        return b"<FEFF" + text.encode("utf-16-be").hex().upper().encode("ascii") + b">"
+    raw = raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+    return b"(" + raw + b")"
+
+class StreamingPdfWriter:
+    """
+    Write a PDF one page at a time, so memory stays bounded by a single page.
+
+    JPEG pages are embedded as-is with /DCTDecode (no decode, no re-encode);
+    any other format is decoded, converted to RGB and re-encoded as JPEG on its own.
+    Page size follows the image at ``resolution`` dpi (Pillow's PDF default is 100).
+    The file is written to ``<output_path>.part`` and renamed on ``close``.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+    PASSTHROUGH_MODES = {"L": b"/DeviceGray", "RGB": b"/DeviceRGB", "CMYK": b"/DeviceCMYK"}
+
+    def __init__(self, output_path: str, title: str = "", author: str = "",
+                 keywords: str = "", resolution: float = 100.0):
+        self.output_path = output_path
+        self.part_path = output_path + ".part"
+        self.resolution = float(resolution)
+        self.info = {"Title": title, "Author": author, "Keywords": keywords}
+        self.pages = 0
+        self._f = open(self.part_path, "wb")
+        self._offsets = {}
+        self._page_ids = []
+        # 1: Catalog, 2: Pages, 3: Info；页对象从 4 开始按顺序分配
+        self._next_id = 4
+        self._f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _begin(self, obj_id: int):
+        self._offsets[obj_id] = self._f.tell()
+        self._f.write(b"%d 0 obj\n" % obj_id)
+
+    def _write_object(self, obj_id: int, body: bytes):
+        self._begin(obj_id)
+        self._f.write(body + b"\nendobj\n")
+
+    def _write_stream(self, obj_id: int, header: bytes, length: int, src):
+        self._begin(obj_id)
+        self._f.write(b"<< " + header + b" /Length %d >>\nstream\n" % length)
+        remaining = length
+        while remaining > 0:
+            buf = src.read(min(self.CHUNK_SIZE, remaining))
+            if not buf:
+                raise IOError("图片数据长度不一致")
+            self._f.write(buf)
+            remaining -= len(buf)
+        self._f.write(b"\nendstream\nendobj\n")
+
+    @classmethod
+    def _probe(cls, fp):
+        img = Image.open(fp)
+        return img.size, img.format, img.mode, "adobe" in img.info
+
+    @staticmethod
+    def _has_eoi(fp) -> bool:
+        """
+        True when the file ends with the JPEG EOI marker (FFD9), ignoring trailing padding.
+        A truncated download only has a valid header; embedding it as-is gives a page that won't render.
+        """
+        fp.seek(0, os.SEEK_END)
+        size = fp.tell()
+        fp.seek(max(0, size - 4096))
+        tail = fp.read().rstrip(b"\x00\r\n ")
+        fp.seek(0)
+        return tail.endswith(b"\xff\xd9")
+
+    @classmethod
+    def passthrough_info(cls, src):
+        """
+        Probe ``src`` (a path) once. Returns (width, height, mode, adobe, length) when it is a
+        complete JPEG that can be embedded without re-encoding (see ``add_passthrough``), else None.
+        """
+        try:
+            with open(src, "rb") as fp:
+                (width, height), fmt, mode, adobe = cls._probe(fp)
+                if fmt != "JPEG" or mode not in cls.PASSTHROUGH_MODES or not cls._has_eoi(fp):
+                    return None
+                fp.seek(0, os.SEEK_END)
+                return width, height, mode, adobe, fp.tell()
+        except Exception:
+            return None
+
+    @classmethod
+    def is_passthrough(cls, src) -> bool:
+        """True when ``src`` (a path) is a complete JPEG that can be embedded without re-encoding."""
+        return cls.passthrough_info(src) is not None
+
+    def _add_dct(self, width: int, height: int, mode: str, adobe: bool, data, length: int):
+        header = b"/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s /BitsPerComponent 8 /Filter /DCTDecode" % (
+            width, height, self.PASSTHROUGH_MODES[mode]
+        )
+        if mode == "CMYK" and adobe:
+            # Photoshop 导出的 CMYK JPEG 通道是反相存储的
+            header += b" /Decode [1 0 1 0 1 0 1 0]"
+
+        image_id, content_id, page_id = self._next_id, self._next_id + 1, self._next_id + 2
+        self._next_id += 3
+
+        self._write_stream(image_id, header, length, data)
+
+        w_pt = width * 72.0 / self.resolution
+        h_pt = height * 72.0 / self.resolution
+        content = b"q %.4f 0 0 %.4f 0 0 cm /Im0 Do Q" % (w_pt, h_pt)
+        self._write_stream(content_id, b"", len(content), io.BytesIO(content))
+
+        self._write_object(page_id, (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.4f %.4f] "
+            b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>"
+        ) % (w_pt, h_pt, image_id, content_id))
+        self._page_ids.append(page_id)
+        self.pages += 1
+
+    def add_passthrough(self, src, info) -> bool:
+        """Append a JPEG page already probed by ``passthrough_info``; its bytes are copied without decoding it again."""
+        width, height, mode, adobe, length = info
+        try:
+            fp = open(src, "rb")
+        except OSError:
+            return False
+        with fp:
+            self._add_dct(width, height, mode, adobe, fp, length)
+        return True
+
+    def add_transcoded(self, width: int, height: int, jpeg: bytes):
+        """Append a page already re-encoded as an RGB JPEG (see pack_pool.transcode_page)."""
+        self._add_dct(width, height, "RGB", False, io.BytesIO(jpeg), len(jpeg))
+
+    def add_image(self, src) -> bool:
+        """
+        Append one page. ``src`` is a path or a seekable binary file object.
+        Returns False (and writes nothing) when the image cannot be read.
+        """
+        own = isinstance(src, (str, bytes, os.PathLike))
+        fp = open(src, "rb") if own else src
+        try:
+            try:
+                (width, height), fmt, mode, adobe = self._probe(fp)
+            except Exception:
+                return False
+
+            if fmt == "JPEG" and mode in self.PASSTHROUGH_MODES and self._has_eoi(fp):
+                # 只读了文件头和文件尾，原始字节直接写进 PDF
+                fp.seek(0, os.SEEK_END)
+                length = fp.tell()
+                fp.seek(0)
+                self._add_dct(width, height, mode, adobe, fp, length)
+                return True
+
+            # 非 JPEG 页 (以及不完整的 JPEG) 单独解码转码，处理完立刻释放；截断的图片在这里读取失败
+            fp.seek(0)
+            try:
+                width, height, jpeg = transcode_page(fp)
+            except Exception:
+                return False
+            self.add_transcoded(width, height, jpeg)
+            return True
+        finally:
+            if own:
+                fp.close()
+
+    def abort(self):
+        try:
+            self._f.close()
+        except Exception:
+            pass
+        try:
+            os.remove(self.part_path)
+        except Exception:
+            pass
+
+    def close(self):
+        """Write the page tree, document info and cross-reference table, then move the file into place."""
+        kids = b" ".join(b"%d 0 R" % pid for pid in self._page_ids)
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._write_object(2, b"<< /Type /Pages /Kids [ %s ] /Count %d >>" % (kids, len(self._page_ids)))
+        info = b" ".join(b"/%s %s" % (k.encode("ascii"), _pdf_string(v)) for k, v in self.info.items() if v)
+        self._write_object(3, b"<< " + info + b" >>")
+
+        xref_at = self._f.tell()
+        size = self._next_id
+        self._f.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        for obj_id in range(1, size):
+            self._f.write(b"%010d 00000 n \n" % self._offsets[obj_id])
+        self._f.write(b"trailer\n<< /Size %d /Root 1 0 R /Info 3 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref_at))
+        self._f.close()
+        os.replace(self.part_path, self.output_path)
+
+@traced("create_pdf")
 def create_pdf(images: List[str], output_path: str, 
                title: str, author: str, 
                tags: List[str] = None,
                published_time: Union[str, datetime, None] = None) -> bool:
     """
-    Create a PDF file from a list of images.
-    Requires Pillow (PIL).
+    Create a PDF file from a list of images, one page in memory at a time.
+    JPEG pages are embedded without re-encoding; other pages are transcoded on
+    the shared pack pool. Requires Pillow (PIL).
     """
     if not Image:
         tqdm.write(Colors.red("PDF 生成失败: 未安装 PIL (Pillow) 库喵！请运行 `pip install Pillow`"))
         return False
         
+    writer = None
+    t0 = time.perf_counter()
     try:
-        pil_images = []
-        for img_path in images:
-            try:
-                img = Image.open(img_path)
-                # Convert to RGB (e.g. for PNG with transparency or CMYK)
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                pil_images.append(img)
-            except Exception:
-                pass
+        keywords = ", ".join(tags) if tags else ""
+        writer = StreamingPdfWriter(output_path, title=title, author=author, keywords=keywords)
+        # 需要转码的页交给共享进程池，JPEG 页按顺序原样写入；
+        # 判断能否直写时探测到的尺寸/色彩模式留着写入时用，每页只用 PIL 打开一次
+        # (normalize_pages 按输入顺序产出，探测结果按同样的顺序排队)
+        probes = deque()
+
+        def needs_transcode(path):
+            probes.append(StreamingPdfWriter.passthrough_info(path))
+            return probes[-1] is None
+
+        for img_path, result in normalize_pages(images, needs_transcode):
+            info = probes.popleft()
+            if result is None:
+                writer.add_passthrough(img_path, info)
+            elif not isinstance(result, Exception):
+                writer.add_transcoded(*result)
         
-        if not pil_images:
+        if not writer.pages:
+            writer.abort()
             tqdm.write(Colors.red("PDF 生成失败: 没有有效的图片喵..."))
             return False
             
-        keywords = ", ".join(tags) if tags else ""
-        
-        # Save PDF
-        pil_images[0].save(
-            output_path, "PDF", resolution=100.0, save_all=True, append_images=pil_images[1:],
-            title=title, author=author, keywords=keywords
-        )
-        
-        # Close images
-        for img in pil_images:
-            img.close()
+        writer.close()
+        PACK_SECONDS.observe(time.perf_counter() - t0, "pdf")
             
         # Update timestamp
         set_file_time(output_path, published_time)
         tqdm.write(Colors.green(f"已生成 PDF: {os.path.basename(output_path)}"))
         return True
     except Exception as e:
+        if writer is not None:
+            writer.abort()
         tqdm.write(Colors.red(f"PDF 生成失败: {e}"))
         return False
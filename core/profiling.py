@@ -0,0 +1,214 @@
+"""命令级性能分析
+
+- cProfile: 精确的调用次数与耗时，只覆盖执行命令的线程；结果存成 .pstats (可用 python -m pstats / snakeviz 打开)
+- 采样 (--sample): 后台线程定时抓取所有线程的调用栈，能看到下载线程池里的热点；结果存成 collapsed stacks
+  文本 (每行 "栈;栈;栈 次数"，可直接喂给 flamegraph.pl / speedscope)
+- tracemalloc (--mem): 记录命令执行期间的 Python 内存峰值，以及结束时仍占用内存最多的代码行
+
+每种方式都会在输出文件旁边写一份同名 .txt 热点摘要。
+"""
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_TOP = 25
+SORT_KEYS = ("cumulative", "tottime", "calls")
+
+
+def default_output(name: str, ext: str) -> str:
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    safe = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in (name or "session")) or "session"
+    return os.path.join(os.getcwd(), "logs", "profile", f"{safe}-{stamp}{ext}")
+
+
+def _short_path(path: str) -> str:
+    """站点包和本项目里的文件显示相对路径，其余保持原样"""
+    path = str(path or "")
+    for base in sorted((p for p in sys.path if p and os.path.isdir(p)), key=len, reverse=True):
+        if path.startswith(base + os.sep):
+            return path[len(base) + 1:]
+    return path
+
+
+def _func_label(filename: str, lineno: int, name: str) -> str:
+    if filename == "~":
+        # cProfile 对内建函数的记法
+        return name
+    return f"{name} ({_short_path(filename)}:{lineno})"
+
+
+class SamplingProfiler:
+    """每隔 interval 秒抓一次所有线程的栈 (不含自己)，按栈计数"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = max(0.001, float(interval))
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="neko-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                # 空闲等待中的线程 (锁、队列、sleep) 栈顶也是 Python 帧，照样计数：等待本身也是墙钟时间
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def hot_functions(self, top: int = DEFAULT_TOP) -> List[Dict]:
+        """[{func, self, total}]：self 为处在栈顶的采样数，total 为出现在栈中的采样数"""
+        own = Counter()
+        total = Counter()
+        for stack, n in self.stacks.items():
+            if not stack:
+                continue
+            own[stack[-1]] += n
+            for fn in set(stack):
+                total[fn] += n
+        rows = [{"func": _func_label(*fn), "self": own[fn], "total": total[fn]} for fn in total]
+        rows.sort(key=lambda r: (r["self"], r["total"]), reverse=True)
+        return rows[:top]
+
+    def write_collapsed(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(";".join(_func_label(*fn).replace(";", ",") for fn in stack) + f" {n}\n")
+
+
+def _pstats_lines(profiler: cProfile.Profile, sort: str, top: int) -> List[str]:
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, lineno, name), (cc, nc, tt, ct, _callers) in stats.stats.items():
+        rows.append((filename, lineno, name, cc, nc, tt, ct))
+    key = {"tottime": lambda r: r[5], "calls": lambda r: r[4]}.get(sort, lambda r: r[6])
+    rows.sort(key=key, reverse=True)
+    lines = [f"{'调用次数':>12} {'自身(s)':>10} {'累计(s)':>10}  函数"]
+    for filename, lineno, name, cc, nc, tt, ct in rows[:top]:
+        calls = str(nc) if cc == nc else f"{nc}/{cc}"
+        lines.append(f"{calls:>12} {tt:>10.3f} {ct:>10.3f}  {_func_label(filename, lineno, name)}")
+    return lines
+
+
+def _memory_lines(snapshot, peak: int, top: int) -> List[str]:
+    lines = [f"内存峰值: {peak / 1024 / 1024:.1f}MB (仅统计 Python 分配)", "结束时仍占用最多的代码行:"]
+    for stat in snapshot.statistics("lineno")[:top]:
+        frame = stat.traceback[0]
+        lines.append(f"  {stat.size / 1024:>10.1f}KB {stat.count:>8} 块  {_short_path(frame.filename)}:{frame.lineno}")
+    return lines
+
+
+def profile_call(
+    fn: Callable[[], object],
+    name: str = "",
+    out: Optional[str] = None,
+    top: int = DEFAULT_TOP,
+    sort: str = "cumulative",
+    mem: bool = False,
+    sample_interval: Optional[float] = None,
+) -> Dict:
+    """在分析器下执行 fn()，写出结果文件和 .txt 摘要。
+
+    返回 {"elapsed", "output", "summary_path", "lines", "interrupted"}；fn 里的 KeyboardInterrupt 会被吞掉，
+    已经收集到的数据照样写出 (长时间命令中途 Ctrl+C 也能拿到结果)，其他异常在写出结果后继续抛出。
+    """
+    sampling = sample_interval is not None
+    out = out or default_output(name, ".folded" if sampling else ".pstats")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    if sort not in SORT_KEYS:
+        sort = "cumulative"
+
+    tracing_mem = mem and not tracemalloc.is_tracing()
+    if tracing_mem:
+        tracemalloc.start()
+    if mem:
+        tracemalloc.reset_peak()
+
+    sampler = None
+    profiler = None
+    if sampling:
+        sampler = SamplingProfiler(sample_interval)
+        sampler.start()
+    else:
+        profiler = cProfile.Profile()
+
+    interrupted = False
+    error = None
+    started = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        try:
+            fn()
+        finally:
+            if profiler is not None:
+                profiler.disable()
+    except KeyboardInterrupt:
+        interrupted = True
+    except BaseException as e:
+        error = e
+    elapsed = time.perf_counter() - started
+
+    lines = []
+    if sampler is not None:
+        sampler.stop()
+        sampler.write_collapsed(out)
+        lines.append(f"采样 {sampler.samples} 次 (间隔 {sampler.interval * 1000:g}ms，覆盖所有线程)")
+        lines.append(f"{'栈顶':>8} {'在栈中':>8}  函数")
+        for row in sampler.hot_functions(top):
+            lines.append(f"{row['self']:>8} {row['total']:>8}  {row['func']}")
+    else:
+        profiler.dump_stats(out)
+        lines.extend(_pstats_lines(profiler, sort, top))
+
+    if mem:
+        _current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        if tracing_mem:
+            tracemalloc.stop()
+        lines.append("")
+        lines.extend(_memory_lines(snapshot, peak, min(top, 15)))
+
+    header = f"{name or 'session'}: 用时 {elapsed:.2f}s" + (" (已中断)" if interrupted else "")
+    summary_path = os.path.splitext(out)[0] + ".txt"
+    try:
+        with open(summary_path, "w", encoding="utf-8") as f:
+            f.write(header + "\n" + "\n".join(lines) + "\n")
+    except OSError:
+        summary_path = ""
+
+    if error is not None:
+        raise error
+    return {
+        "elapsed": elapsed,
+        "output": out,
+        "summary_path": summary_path,
+        "lines": lines,
+        "interrupted": interrupted,
+    }
@@ -0,0 +1,53 @@
+"""追更调度
+
+根据每个订阅的更新历史估算下次值得检查的时间：
+- 平均更新间隔 (avg_interval) 越长，检查得越稀疏 (约为间隔的 1/4)；
+- 连续多次空检查 (empty_checks) 时逐步退避；
+- 结果限制在 [pull_min_interval_hours, pull_max_interval_hours] 之间。
+"""
+
+import datetime
+from typing import Any, Dict, Optional
+
+
+def parse_time(value) -> Optional[datetime.datetime]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime.datetime):
+        return value
+    try:
+        return datetime.datetime.fromisoformat(str(value).replace("T", " "))
+    except Exception:
+        return None
+
+
+def check_interval(avg_interval: Optional[float], empty_checks: int, cfg: Dict[str, Any]) -> float:
+    """返回下次检查前应等待的秒数"""
+    min_s = float(cfg.get("pull_min_interval_hours", 6) or 0) * 3600
+    max_s = float(cfg.get("pull_max_interval_hours", 168) or 0) * 3600
+    if max_s < min_s:
+        max_s = min_s
+
+    base = float(avg_interval) / 4.0 if avg_interval else min_s
+    interval = base * (1.5 ** min(max(int(empty_checks or 0), 0), 6))
+    return max(min_s, min(max_s, interval))
+
+
+def next_due(
+    checked_at: datetime.datetime,
+    avg_interval: Optional[float],
+    empty_checks: int,
+    cfg: Dict[str, Any],
+) -> datetime.datetime:
+    return checked_at + datetime.timedelta(seconds=check_interval(avg_interval, empty_checks, cfg))
+
+
+def is_due(sub, now: Optional[datetime.datetime] = None) -> bool:
+    """sub 为 subscriptions 表的一行；从未排期 (next_due 为空) 的订阅总是到期"""
+    try:
+        due = parse_time(sub["next_due"])
+    except Exception:
+        due = None
+    if due is None:
+        return True
+    return due <= (now or datetime.datetime.now())
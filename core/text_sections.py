@@ -0,0 +1,112 @@
+"""TXT 小说章节索引
+
+导入时扫描一遍文本，记录每章的 (标题, 字节偏移, 字节长度) 和文件编码，
+阅读接口按章 seek 读取并即时转成 UTF-8，不必把十几 MB 的整本书发给客户端。
+按行扫描依赖换行符是单字节 "\\n"，所以只支持 UTF-8 / GB18030 (GBK) 这类兼容 ASCII 的编码。
+"""
+
+import codecs
+import os
+import re
+from typing import List, Optional, Tuple
+
+HEADING_RE = re.compile(
+    r"^(?:"
+    # "第一章初入江湖" 这种标题紧跟在 章/卷 后面很常见；回/节/部/集 等后面必须有分隔符或直接结束，
+    # 否则 "第一回合他输了。"、"第十节课开始了" 这类正文会被当成章节
+    r"第[0-9０-９零〇一二两三四五六七八九十百千万]+[章卷].{0,40}"
+    r"|第[0-9０-９零〇一二两三四五六七八九十百千万]+[节回集部篇话話](?:[\s:：·、.\-—].{0,40})?"
+    r"|(?:序章|序言|序|楔子|引子|尾声|终章|后记|番外)(?:[\s:：·、.\-—].{0,40})?"
+    r"|(?:chapter|prologue|epilogue)\b.{0,40}"
+    r"|\[chapter:.{1,60}\]"
+    r")$",
+    re.IGNORECASE,
+)
+MAX_HEADING_CHARS = 60
+# 找不到章节标题时按这个大小 (在行边界上) 切分，保证仍然可以随机读取
+FALLBACK_CHUNK_BYTES = 128 * 1024
+SNIFF_BYTES = 64 * 1024
+
+
+def detect_encoding(path: str) -> Optional[str]:
+    """返回 utf-8-sig / utf-8 / gb18030；UTF-16 等不兼容 ASCII 的编码返回 None"""
+    with open(path, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return None
+    try:
+        # 读到的片段可能在多字节字符中间截断，用增量解码器不把结尾当作错误
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "gb18030"
+
+
+def _heading(line: str) -> str:
+    text = line.strip().strip("　")
+    if not text or len(text) > MAX_HEADING_CHARS:
+        return ""
+    if not HEADING_RE.match(text):
+        return ""
+    if text.lower().startswith("[chapter:"):
+        text = text[len("[chapter:"):-1].strip()
+    return text
+
+
+def scan_sections(path: str, encoding: str) -> List[Tuple[str, int, int]]:
+    """返回 [(标题, 字节偏移, 字节长度)]，覆盖整个文件且首尾相接"""
+    starts = []
+    size = 0
+    with open(path, "rb") as f:
+        for raw in f:
+            if len(raw) <= MAX_HEADING_CHARS * 4 + 2:
+                title = _heading(raw.decode(encoding, errors="ignore"))
+                if title:
+                    starts.append((title, size))
+            size += len(raw)
+
+    if not starts:
+        return _fixed_chunks(path, size)
+
+    sections = []
+    if starts[0][1] > 0:
+        # 第一章之前的文件头/简介
+        starts.insert(0, ("开头", 0))
+    for i, (title, offset) in enumerate(starts):
+        end = starts[i + 1][1] if i + 1 < len(starts) else size
+        sections.append((title, offset, end - offset))
+    return sections
+
+
+def _fixed_chunks(path: str, size: int) -> List[Tuple[str, int, int]]:
+    sections = []
+    offset = 0
+    with open(path, "rb") as f:
+        while offset < size:
+            f.seek(min(size, offset + FALLBACK_CHUNK_BYTES))
+            f.readline()
+            end = min(size, f.tell())
+            sections.append((f"第 {len(sections) + 1} 部分", offset, end - offset))
+            offset = end
+    return sections
+
+
+def index_book_sections(db, book_id: int, path: str) -> int:
+    """扫描书籍文件并写入 book_sections；返回章节数 (编码不支持时为 0)"""
+    encoding = detect_encoding(path)
+    if encoding is None:
+        db.replace_book_sections(book_id, [], None, None, None)
+        return 0
+    st = os.stat(path)
+    sections = scan_sections(path, encoding)
+    db.replace_book_sections(book_id, sections, encoding, int(st.st_size), float(st.st_mtime))
+    return len(sections)
+
+
+def read_section(path: str, offset: int, length: int, encoding: str) -> str:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        raw = f.read(length)
+    return raw.decode(encoding or "utf-8", errors="replace")
@@ -0,0 +1,322 @@
+"""下载→导入流水线的分段计时 (span)
+
+一个 span 是一段有名字的计时，可以嵌套，带若干属性；结束时以一行 JSON 追加写入 trace 文件：
+
+    {"trace": "...", "id": "...", "parent": "...", "name": "fetch", "ts": 1700000000.1,
+     "dur": 0.42, "thread": "ThreadPoolExecutor-0_3", "attrs": {"url": "..."}, "error": "..."}
+
+同一个 trace ID 下的 span 属于一次运行 (一个链接从下载到导入)。用法：
+
+    with span("download", url=url) as sp: ...       # 上下文管理器
+    @traced("create_pdf")                          # 装饰器
+    executor.submit(bind(fn), ...)                 # 把当前 span 带进线程池
+
+没有配置 trace_file (或环境变量 NEKOSHELF_TRACE_FILE) 时 span 是空操作，开销只有一次判断。
+`trace summary` 命令读取这个文件，统计每类 span 占用的墙钟时间。
+"""
+
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from . import config
+
+_current = contextvars.ContextVar("neko_trace_span", default=None)
+_lock = threading.Lock()
+_path: Optional[str] = None
+_file = None
+_configured = False
+
+
+def _resolve_path() -> str:
+    path = os.environ.get("NEKOSHELF_TRACE_FILE", "")
+    if not path:
+        try:
+            path = str(config.get_download_config(reload=False).get("trace_file", "") or "")
+        except Exception:
+            path = ""
+    return os.path.abspath(os.path.expanduser(path)) if path else ""
+
+
+def configure(path: Optional[str] = None):
+    """指定 trace 文件 (空串关闭记录)；不传参数时按配置/环境变量重新确定"""
+    global _path, _file, _configured
+    with _lock:
+        if _file is not None:
+            try:
+                _file.close()
+            except Exception:
+                pass
+            _file = None
+        _path = (os.path.abspath(os.path.expanduser(path)) if path else "") if path is not None else _resolve_path()
+        _configured = True
+
+
+def trace_path() -> str:
+    if not _configured:
+        configure()
+    return _path or ""
+
+
+def enabled() -> bool:
+    if not _configured:
+        configure()
+    return bool(_path)
+
+
+def _write(record: Dict):
+    global _file
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+    with _lock:
+        if not _path:
+            return
+        try:
+            if _file is None:
+                os.makedirs(os.path.dirname(_path), exist_ok=True)
+                _file = open(_path, "a", encoding="utf-8")
+            # 每行单独 flush：多个进程 (worker/daemon) 追加同一个文件时行不会交错
+            _file.write(line)
+            _file.flush()
+        except Exception:
+            pass
+
+
+def _new_id() -> str:
+    return os.urandom(8).hex()
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attrs", "ts", "_t0", "_token")
+
+    def __init__(self, name: str, trace: Optional[str] = None, attrs: Optional[Dict] = None):
+        parent = _current.get()
+        if trace:
+            # 显式给出 trace ID：接到已有的运行上 (如导入阶段在另一个线程里接续下载阶段)
+            self.trace_id = trace
+            self.parent_id = parent.span_id if parent is not None and parent.trace_id == trace else None
+        elif parent is not None:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+        else:
+            self.trace_id = _new_id()
+            self.parent_id = None
+        self.name = name
+        self.span_id = _new_id()
+        self.attrs = attrs or {}
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.ts = time.time()
+        self._t0 = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dur = time.perf_counter() - self._t0
+        _current.reset(self._token)
+        record = {
+            "trace": self.trace_id,
+            "id": self.span_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "ts": round(self.ts, 6),
+            "dur": round(dur, 6),
+            "thread": threading.current_thread().name,
+        }
+        if self.attrs:
+            record["attrs"] = self.attrs
+        if exc_type is not None:
+            record["error"] = f"{exc_type.__name__}: {exc}"
+        _write(record)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+    trace_id = None
+    span_id = None
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+def span(name: str, trace: Optional[str] = None, **attrs):
+    """with span("name", key=value) as sp: ...；未启用时返回空操作对象"""
+    if not enabled():
+        return _NULL
+    return Span(name, trace=trace, attrs=attrs)
+
+
+def traced(name: Optional[str] = None, **attrs):
+    """装饰器：每次调用记录一个 span，名字默认为函数名"""
+    def deco(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return fn(*args, **kwargs)
+            with Span(span_name, attrs=dict(attrs)):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def annotate(**attrs):
+    """给当前 span 补充属性 (如装饰器包住的函数在内部才知道的 URL/文件名)"""
+    sp = _current.get()
+    if sp is not None:
+        sp.attrs.update(attrs)
+
+
+def record(name: str, start: float, end: float, **attrs):
+    """把已经量好的一段 (perf_counter 起止) 记为当前 span 的子 span"""
+    parent = _current.get()
+    if parent is None or not enabled():
+        return
+    _write({
+        "trace": parent.trace_id,
+        "id": _new_id(),
+        "parent": parent.span_id,
+        "name": name,
+        "ts": round(time.time() - (time.perf_counter() - start), 6),
+        "dur": round(max(0.0, end - start), 6),
+        "thread": threading.current_thread().name,
+        **({"attrs": attrs} if attrs else {}),
+    })
+
+
+def bind(fn):
+    """返回在当前 span 下执行 fn 的包装函数，用于提交到线程池 (contextvars 不会自动带进工作线程)"""
+    parent = _current.get()
+    if parent is None:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _current.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return wrapper
+
+
+def iter_spans(path: str) -> Iterator[Dict]:
+    """逐行读取 trace 文件；跳过写了一半或损坏的行"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(rec, dict) and rec.get("trace") and rec.get("name"):
+                yield rec
+
+
+def list_runs(path: str) -> List[Dict]:
+    """按开始时间排序的运行列表：[{trace, name, url, start, wall, spans, errors}]"""
+    runs = {}
+    for rec in iter_spans(path):
+        ts = float(rec.get("ts") or 0)
+        end = ts + float(rec.get("dur") or 0)
+        run = runs.get(rec["trace"])
+        if run is None:
+            run = runs[rec["trace"]] = {"trace": rec["trace"], "name": "", "url": "", "start": ts, "end": end, "spans": 0, "errors": 0}
+        run["start"] = min(run["start"], ts)
+        run["end"] = max(run["end"], end)
+        run["spans"] += 1
+        if rec.get("error"):
+            run["errors"] += 1
+        if not rec.get("parent"):
+            # 根 span 可能有几个 (下载、导入)，取最早的那个作为这次运行的名字
+            if not run["name"] or ts <= run.get("_root_ts", ts):
+                run["name"] = rec["name"]
+                run["_root_ts"] = ts
+            url = (rec.get("attrs") or {}).get("url")
+            if url and not run["url"]:
+                run["url"] = url
+    out = []
+    for run in runs.values():
+        run.pop("_root_ts", None)
+        run["wall"] = run["end"] - run["start"]
+        out.append(run)
+    out.sort(key=lambda r: r["start"])
+    return out
+
+
+def _union_length(intervals: List[tuple]) -> float:
+    total = 0.0
+    cur_start = cur_end = None
+    for start, end in sorted(intervals):
+        if cur_end is None or start > cur_end:
+            if cur_end is not None:
+                total += cur_end - cur_start
+            cur_start, cur_end = start, end
+        else:
+            cur_end = max(cur_end, end)
+    if cur_end is not None:
+        total += cur_end - cur_start
+    return total
+
+
+def summarize(path: str, traces: Optional[set] = None) -> Dict:
+    """按 span 名汇总：次数、累计耗时、自身耗时 (扣除子 span)、覆盖的墙钟时间、最长一次。
+
+    并发下载时同名 span 会重叠，累计耗时可能超过墙钟；“墙钟”一列按时间区间的并集计算，
+    表示这一阶段在多长时间里有活在干，用来判断真正的瓶颈。
+    """
+    spans = [rec for rec in iter_spans(path) if traces is None or rec["trace"] in traces]
+    child_time = {}
+    for rec in spans:
+        if rec.get("parent"):
+            child_time[rec["parent"]] = child_time.get(rec["parent"], 0.0) + float(rec.get("dur") or 0)
+
+    by_name = {}
+    start = end = None
+    for rec in spans:
+        ts = float(rec.get("ts") or 0)
+        dur = float(rec.get("dur") or 0)
+        start = ts if start is None else min(start, ts)
+        end = ts + dur if end is None else max(end, ts + dur)
+        row = by_name.get(rec["name"])
+        if row is None:
+            row = by_name[rec["name"]] = {"name": rec["name"], "count": 0, "total": 0.0, "self": 0.0, "max": 0.0, "errors": 0, "_iv": []}
+        row["count"] += 1
+        row["total"] += dur
+        row["self"] += max(0.0, dur - child_time.get(rec["id"], 0.0))
+        row["max"] = max(row["max"], dur)
+        if rec.get("error"):
+            row["errors"] += 1
+        row["_iv"].append((ts, ts + dur))
+
+    rows = []
+    for row in by_name.values():
+        row["wall"] = _union_length(row.pop("_iv"))
+        rows.append(row)
+    rows.sort(key=lambda r: r["wall"], reverse=True)
+    return {
+        "spans": len(spans),
+        "start": start,
+        "wall": (end - start) if start is not None else 0.0,
+        "rows": rows,
+    }
@@ -1,6 +1,10 @@
+import bisect
 import logging
 import os
+import threading
+import time
 from logging.handlers import RotatingFileHandler
+from urllib.parse import urlsplit
 
 import functools
 
@@ -324,3 +328,277 @@ def path_complete(text):
         pass
         
     return candidates
+
+
+# ---------------------------------------------------------------------------
+# 进程内指标
+#
+# 计数器 / 仪表 / 直方图都只在内存里累加，记录一次只是加锁改几个数字；
+# 没有后台线程，也不主动上报——serve 的 /metrics (Prometheus 文本格式) 或 metrics 命令读取时才格式化。
+# ---------------------------------------------------------------------------
+
+_METRICS = {}
+_METRICS_LOCK = threading.Lock()
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_str(names, values):
+    if not names:
+        return ""
+    parts = []
+    for k, v in zip(names, values):
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _fmt_value(v):
+    if v == float("inf"):
+        return "+Inf"
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return repr(v) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_text="", labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def labels(self, *values):
+        """按标签取子指标；热点路径上先取一次再反复调用，省去每次查表"""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def children(self):
+        """[(标签值元组, 子指标)]，按标签排序"""
+        with self._lock:
+            return sorted(self._children.items())
+
+    def samples(self):
+        """[(后缀, 标签名, 标签值, 数值)]"""
+        items = self.children()
+        out = []
+        for key, child in items:
+            out.extend(child.samples(self.labelnames, key))
+        return out
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, names, key):
+        return [("", names, key, self.value)]
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+    def quantile(self, q):
+        """按桶估算分位数：返回累计占比首次达到 q 的桶上界 (落在最后一个桶之外时为 inf)"""
+        with self._lock:
+            counts = list(self.counts)
+            n = self.count
+        if not n:
+            return 0.0
+        target = q * n
+        acc = 0
+        for le, c in zip(self.buckets + (float("inf"),), counts):
+            acc += c
+            if acc >= target:
+                return le
+        return float("inf")
+
+    def samples(self, names, key):
+        with self._lock:
+            counts = list(self.counts)
+            total, n = self.sum, self.count
+        out = []
+        acc = 0
+        for le, c in zip(self.buckets + (float("inf"),), counts):
+            acc += c
+            out.append(("_bucket", names + ("le",), key + (_fmt_value(float(le)),), acc))
+        out.append(("_sum", names, key, total))
+        out.append(("_count", names, key, n))
+        return out
+
+
+class _Timer:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1, *labels):
+        self.labels(*labels).inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value, *labels):
+        self.labels(*labels).set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text="", labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value, *labels):
+        self.labels(*labels).observe(value)
+
+    def time(self, *labels):
+        """with HISTOGRAM.time("label"): ... 记录代码块耗时 (秒)"""
+        return _Timer(self.labels(*labels))
+
+
+def _register(metric):
+    with _METRICS_LOCK:
+        existing = _METRICS.get(metric.name)
+        if existing is not None:
+            return existing
+        _METRICS[metric.name] = metric
+        return metric
+
+
+def counter(name, help_text="", labelnames=()):
+    return _register(Counter(name, help_text, labelnames))
+
+
+def gauge(name, help_text="", labelnames=()):
+    return _register(Gauge(name, help_text, labelnames))
+
+
+def histogram(name, help_text="", labelnames=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, help_text, labelnames, buckets))
+
+
+def iter_metrics():
+    with _METRICS_LOCK:
+        return sorted(_METRICS.values(), key=lambda m: m.name)
+
+
+def render_metrics():
+    """Prometheus 文本格式 (text/plain; version=0.0.4)"""
+    lines = []
+    for m in iter_metrics():
+        samples = m.samples()
+        if m.help:
+            lines.append(f"# HELP {m.name} {m.help}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        for suffix, names, values, v in samples:
+            lines.append(f"{m.name}{suffix}{_label_str(names, values)} {_fmt_value(v)}")
+    return "\n".join(lines) + "\n"
+
+
+DOWNLOAD_BYTES = counter("nekoshelf_download_bytes_total", "下载的文件字节数 (按站点)", ("host",))
+HTTP_REQUEST_SECONDS = histogram("nekoshelf_http_request_seconds", "HTTP 请求从发出到收到响应头的耗时", ("host",))
+HTTP_RESPONSES = counter("nekoshelf_http_responses_total", "HTTP 响应数 (按站点和状态码)", ("host", "code"))
+HTTP_RATE_LIMITED = counter("nekoshelf_http_429_total", "被限流 (429) 的响应数", ("host",))
+QUEUE_ITEMS = gauge("nekoshelf_queue_items", "下载队列 (download_jobs) 各状态条目数", ("state",))
+PACK_SECONDS = histogram("nekoshelf_pack_seconds", "打包 PDF/CBZ 的耗时", ("format",))
+IMPORT_STAGE_SECONDS = histogram("nekoshelf_import_stage_seconds", "导入单个文件各阶段的耗时", ("stage",))
+DB_STATEMENT_SECONDS = histogram(
+    "nekoshelf_db_statement_seconds", "SQLite 语句耗时 (按语句类型)", ("op",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+
+
+def url_host(url):
+    try:
+        return urlsplit(url).hostname or ""
+    except Exception:
+        return ""
+
+
+def _record_response(res, *args, **kwargs):
+    try:
+        host = url_host(res.url)
+        HTTP_REQUEST_SECONDS.labels(host).observe(res.elapsed.total_seconds())
+        HTTP_RESPONSES.labels(host, res.status_code).inc()
+        if res.status_code == 429:
+            HTTP_RATE_LIMITED.labels(host).inc()
+    except Exception:
+        pass
+    return res
+
+
+def instrument_session(session):
+    """给 requests.Session 挂上响应钩子，记录请求耗时、状态码和 429 次数"""
+    hooks = session.hooks.setdefault("response", [])
+    if _record_response not in hooks:
+        hooks.append(_record_response)
+    return session
@@ -0,0 +1,125 @@
+"""下载队列工作进程
+
+用法:
+  nekoshelf-worker [--processes=N] [--threads=M] [--job=任务ID] [--wait] [--poll=秒]
+  python -m core.worker ...
+
+启动 N 个进程，每个进程内 M 个线程，各自从 download_jobs 队列领取条目下载并导入。
+打包 PDF / 解析 HTML 等 CPU 密集的工作分散到多个进程，网络 I/O 在进程内用线程并发；
+所有进程共享同一个 SQLite 数据库 (WAL 模式)，通过租约保证同一条目只会被一个线程处理。
+"""
+
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+from typing import Optional
+
+from . import config
+from .database import DatabaseManager
+from .download_service import DownloadImportService
+from .file_manager import FileManager
+from .plugins.download import pack_pool
+from .utils import Colors
+
+
+def _drain(db_file: str, library_dir: str, job_id: Optional[str], totals: dict, lock: threading.Lock):
+    # sqlite3 连接不能跨线程使用：每个线程各自持有一套 db / service / 插件会话
+    db = DatabaseManager(db_file)
+    try:
+        svc = DownloadImportService(db, FileManager(library_dir))
+        pid = os.getpid()
+
+        def on_item(row, out):
+            if out.get("success") and not out.get("errors"):
+                print(Colors.green(f"[{pid}] ✅ {row['item_key']}: 已归档 {out.get('imported', 0)}"), flush=True)
+            else:
+                print(Colors.red(f"[{pid}] ❌ {row['item_key']}: {out.get('message') or '下载失败'}"), flush=True)
+
+        stats = svc.run_worker(job_id=job_id, quiet=True, on_item=on_item)
+        with lock:
+            for k, v in stats.items():
+                totals[k] = totals.get(k, 0) + int(v or 0)
+    finally:
+        db.close()
+
+
+def _process_main(db_file: str, library_dir: str, processes: int, threads: int, job_id: Optional[str], wait: bool, poll: float):
+    # 每个工作进程都会按需建自己的转码进程池，CPU 核数在各进程间均分
+    pack_pool.set_sibling_processes(processes)
+    while True:
+        totals = {}
+        lock = threading.Lock()
+        pool = [
+            threading.Thread(target=_drain, args=(db_file, library_dir, job_id, totals, lock), daemon=True)
+            for _ in range(max(1, threads))
+        ]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+
+        if totals.get("done") or totals.get("failed"):
+            print(Colors.cyan(
+                f"[{os.getpid()}] 本轮完成 {totals.get('done', 0)} 个，失败 {totals.get('failed', 0)} 个，"
+                f"下载 {float(totals.get('bytes', 0)) / 1024 / 1024:.1f}MB"
+            ), flush=True)
+        if not wait:
+            return
+        time.sleep(poll)
+
+
+def main(argv=None):
+    cfg = config.load(reload=True)
+    dl_cfg = cfg["download_config"]
+
+    parser = argparse.ArgumentParser(prog="nekoshelf-worker", description="并行处理下载队列 (download_jobs)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="工作进程数 (默认: CPU 核数)")
+    parser.add_argument("--threads", type=int, default=int(dl_cfg.get("worker_threads", 2) or 2), help="每个进程内的下载线程数")
+    parser.add_argument("--job", default=None, help="只处理指定任务 ID")
+    parser.add_argument("--wait", action="store_true", help="队列清空后继续等待新条目，而不是退出")
+    parser.add_argument("--poll", type=float, default=30.0, help="--wait 模式下轮询队列的间隔 (秒)")
+    args = parser.parse_args(argv)
+
+    db_file = cfg["db_file"]
+    library_dir = cfg["library_dir"]
+
+    # 主进程先建表/切换 WAL，并回收失联进程遗留的租约
+    db = DatabaseManager(db_file)
+    try:
+        reclaimed = DownloadImportService(db, FileManager(library_dir)).reclaim_stale_leases()
+    finally:
+        db.close()
+    if reclaimed:
+        print(Colors.yellow(f"回收了 {reclaimed} 个失联进程遗留的条目喵"))
+
+    processes = max(1, args.processes)
+    print(Colors.cyan(f"启动 {processes} 个工作进程 × {max(1, args.threads)} 线程，开始处理下载队列喵..."))
+
+    if processes == 1:
+        _process_main(db_file, library_dir, processes, args.threads, args.job, args.wait, args.poll)
+        return
+
+    procs = [
+        multiprocessing.Process(
+            target=_process_main,
+            args=(db_file, library_dir, processes, args.threads, args.job, args.wait, args.poll),
+        )
+        for _ in range(processes)
+    ]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        print(Colors.pink("\n正在停止工作进程，未完成的条目会在下次启动时回收喵~"))
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.join()
+
+
+if __name__ == "__main__":
+    main()
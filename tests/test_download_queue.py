@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import DatabaseManager
+
+
+class DownloadQueueLeaseTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(os.path.join(self.tmp.name, "library.db"))
+        self.db.enqueue_download_items("job1", "https://example.com/a", [{"key": "a", "url": "https://example.com/a"}])
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def _state(self):
+        return tuple(self.db.conn.execute("SELECT state, attempts FROM download_jobs").fetchone())
+
+    def _expire_leases(self):
+        self.db.conn.execute("UPDATE download_jobs SET lease_expires = ? WHERE state = 'leased'", (time.time() - 1,))
+        self.db.conn.commit()
+
+    def test_expired_last_attempt_is_marked_failed(self):
+        for _ in range(3):
+            self.assertIsNotNone(self.db.lease_download_item("host:1", max_attempts=3))
+            self._expire_leases()
+            self.db.reclaim_download_leases(max_attempts=3)
+        self.assertEqual(self._state(), ("failed", 3))
+        # 失败条目可以重试，也不再挡住重新入队
+        self.assertEqual(self.db.retry_failed_download_items(), 1)
+        self.assertIsNotNone(self.db.lease_download_item("host:1", max_attempts=3))
+
+    def test_reclaim_by_id_respects_attempt_limit(self):
+        row = self.db.lease_download_item("host:1", max_attempts=1)
+        self.db.reclaim_download_leases(item_ids=[row["id"]], max_attempts=1)
+        self.assertEqual(self._state(), ("failed", 1))
+
+    def test_released_item_gets_attempt_back(self):
+        row = self.db.lease_download_item("host:1", max_attempts=3)
+        self.assertTrue(self.db.release_download_item(row["id"], row["lease_owner"]))
+        self.assertEqual(self._state(), ("pending", 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
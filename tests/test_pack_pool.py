@@ -0,0 +1,34 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.plugins.download import pack_pool
+
+
+class PackWorkersTest(unittest.TestCase):
+    def tearDown(self):
+        pack_pool.set_sibling_processes(1)
+
+    def _workers(self, configured, cpus=8):
+        with mock.patch.object(pack_pool.config, "get_download_config", return_value={"pack_workers": configured}), \
+                mock.patch.object(pack_pool.os, "cpu_count", return_value=cpus):
+            return pack_pool.pack_workers()
+
+    def test_auto_size_is_split_between_worker_processes(self):
+        self.assertEqual(self._workers(0), 8)
+        pack_pool.set_sibling_processes(4)
+        self.assertEqual(self._workers(0), 2)
+        # 进程数不少于核数时各进程在下载线程内直接转码
+        pack_pool.set_sibling_processes(8)
+        self.assertEqual(self._workers(0), 1)
+
+    def test_explicit_setting_is_kept(self):
+        pack_pool.set_sibling_processes(8)
+        self.assertEqual(self._workers(3), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
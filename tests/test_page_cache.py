@@ -0,0 +1,50 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.page_cache import CbzIndex, PageCache
+
+
+class PageCacheOpenTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cbz = os.path.join(self.tmp.name, "book.cbz")
+        buf = io.BytesIO()
+        Image.new("RGB", (64, 96), (200, 100, 50)).save(buf, "PNG")
+        with zipfile.ZipFile(self.cbz, "w") as zf:
+            zf.writestr("001.png", buf.getvalue())
+        self.cache = PageCache(os.path.join(self.tmp.name, "cache"), 10 * 1024 * 1024)
+        self.index = CbzIndex(self.cbz)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_open_regenerates_page_evicted_after_get(self):
+        real_get = self.cache.get
+        calls = []
+
+        def racing_get(*args):
+            path = real_get(*args)
+            if not calls:
+                # 模拟其他线程在 get 返回后、打开前把文件淘汰掉
+                os.remove(path)
+            calls.append(path)
+            return path
+
+        self.cache.get = racing_get
+        with self.cache.open("abcd", self.index, 0, 32) as f:
+            with Image.open(f) as img:
+                self.assertEqual(img.size[0], 32)
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(os.path.exists(calls[-1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
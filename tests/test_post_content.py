@@ -0,0 +1,44 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.plugins.download.utils import parse_post_content
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+SAMPLES = [
+    "",
+    "<p>第一段</p>\n\n<p>第二段<br/>换行</p>",
+    '<p>图<img src="https://example.com/1.jpg">后<img src="/2.png"/></p>',
+    "<div>a<script>var x = '<p>';</script>b<style>p{}</style>c</div>",
+    "<pre>  保留\n  空白  </pre>   <p> x </p>",
+    "<ruby>漢<rp>(</rp><rt>kan</rt><rp>)</rp></ruby>字",
+    "<ruby>a<rt>b</ruby>c",
+    "<p>a<template>t</template>z</p>",
+    "<p>&amp; &lt;tag&gt; &copy; &#x4e2d;&#25991;</p><!-- 注释 --><p>x<![CDATA[q]]>y</p>",
+]
+
+
+class PostContentTest(unittest.TestCase):
+    def test_images_in_document_order(self):
+        parsed = parse_post_content(SAMPLES[2])
+        self.assertEqual(parsed.images, ["https://example.com/1.jpg", "/2.png"])
+
+    def test_ruby_annotations_are_dropped(self):
+        self.assertEqual(parse_post_content(SAMPLES[5]).get_text(), "漢字")
+
+    @unittest.skipIf(BeautifulSoup is None, "bs4 not installed")
+    def test_text_matches_beautifulsoup(self):
+        for html in SAMPLES:
+            for sep in ("", "\n"):
+                expected = BeautifulSoup(html, "html.parser").get_text(sep)
+                self.assertEqual(parse_post_content(html).get_text(sep), expected, html)
+
+
+if __name__ == "__main__":
+    unittest.main()
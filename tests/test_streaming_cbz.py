@@ -0,0 +1,91 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.plugins.download.utils import StreamingCbzWriter
+
+
+class _BrokenStream:
+    """读到一半出错，模拟嵌套 ZIP 成员 CRC 校验失败"""
+
+    def __init__(self, data):
+        self._buf = io.BytesIO(data)
+
+    def read(self, n=-1):
+        chunk = self._buf.read(n)
+        if not chunk:
+            raise zipfile.BadZipFile("Bad CRC-32")
+        return chunk
+
+
+def _page(n, size=1000):
+    return bytes([n % 256]) * size
+
+
+class StreamingCbzWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.out = os.path.join(self.tmp.name, "book.cbz")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _pages(self):
+        with zipfile.ZipFile(self.out) as zf:
+            self.assertIsNone(zf.testzip())
+            names = [n for n in sorted(zf.namelist()) if n != "ComicInfo.xml"]
+            # 跳过的组不留空号，页名连续
+            self.assertEqual(names, [f"{i:03d}.jpg" for i in range(1, len(names) + 1)])
+            return [zf.read(n) for n in names]
+
+    def test_bad_member_on_direct_path_drops_only_its_slot(self):
+        w = StreamingCbzWriter(self.out, spill_dir=self.tmp.name)
+        self.assertTrue(w.put(0, [(".jpg", io.BytesIO(_page(1)))]))
+        self.assertFalse(w.put(1, [(".jpg", io.BytesIO(_page(2))), (".jpg", _BrokenStream(_page(3)))]))
+        self.assertTrue(w.put(2, [(".jpg", io.BytesIO(_page(4)))]))
+        self.assertTrue(w.finish("t", "a"))
+        self.assertEqual(self._pages(), [_page(1), _page(4)])
+
+    def test_bad_member_on_buffered_path_drops_only_its_slot(self):
+        w = StreamingCbzWriter(self.out, spill_dir=self.tmp.name)
+        self.assertFalse(w.put(1, [(".jpg", io.BytesIO(_page(2))), (".jpg", _BrokenStream(_page(3)))]))
+        self.assertTrue(w.put(2, [(".jpg", io.BytesIO(_page(4)))]))
+        self.assertTrue(w.put(0, [(".jpg", io.BytesIO(_page(1)))]))
+        self.assertTrue(w.finish("t", "a"))
+        self.assertEqual(self._pages(), [_page(1), _page(4)])
+
+    def test_large_buffered_slot_stays_within_budget(self):
+        w = StreamingCbzWriter(self.out, spill_dir=self.tmp.name, max_buffer_bytes=5000)
+        spools = []
+        peak = [0]
+        real = tempfile.SpooledTemporaryFile
+
+        def tracking(*args, **kwargs):
+            sp = real(*args, **kwargs)
+            spools.append(sp)
+            return sp
+
+        def pages():
+            for n in range(50):
+                # 每交出一页前统计一次仍在内存里的缓冲
+                peak[0] = max(peak[0], sum(len(sp._file.getvalue()) for sp in spools if not sp._rolled and not sp.closed))
+                yield ".jpg", io.BytesIO(_page(n))
+
+        with mock.patch("core.plugins.download.utils.tempfile.SpooledTemporaryFile", tracking):
+            self.assertTrue(w.put(1, pages()))
+        self.assertLessEqual(peak[0], 5000)
+        self.assertLessEqual(w._buffered, 5000)
+        self.assertTrue(w.put(0, [(".jpg", io.BytesIO(_page(99)))]))
+        self.assertTrue(w.finish("t", "a"))
+        self.assertEqual(len(self._pages()), 51)
+        self.assertEqual(w._buffered, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.plugins.download.utils import StreamingPdfWriter, create_pdf
+
+
+def _jpeg(color=(10, 20, 30)):
+    buf = io.BytesIO()
+    Image.new("RGB", (40, 60), color).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+class StreamingPdfWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _file(self, name, data):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_truncated_jpeg_is_not_passed_through(self):
+        data = _jpeg()
+        good = self._file("good.jpg", data)
+        padded = self._file("padded.jpg", data + b"\x00\x00")
+        truncated = self._file("truncated.jpg", data[: len(data) // 2])
+        self.assertTrue(StreamingPdfWriter.is_passthrough(good))
+        self.assertTrue(StreamingPdfWriter.is_passthrough(padded))
+        self.assertFalse(StreamingPdfWriter.is_passthrough(truncated))
+
+        writer = StreamingPdfWriter(os.path.join(self.tmp.name, "w.pdf"))
+        try:
+            self.assertFalse(writer.add_image(truncated))
+            self.assertTrue(writer.add_image(good))
+            self.assertEqual(writer.pages, 1)
+        finally:
+            writer.abort()
+
+    def test_create_pdf_drops_truncated_page(self):
+        data = _jpeg()
+        pages = [self._file("1.jpg", data), self._file("2.jpg", data[:200]), self._file("3.jpg", _jpeg((200, 0, 0)))]
+        out = os.path.join(self.tmp.name, "book.pdf")
+        self.assertTrue(create_pdf(pages, out, "t", "a"))
+        with open(out, "rb") as f:
+            self.assertIn(b"/Count 2", f.read())
+
+    def test_create_pdf_probes_each_jpeg_once(self):
+        pages = [self._file(f"{i}.jpg", _jpeg((i * 40, 0, 0))) for i in range(3)]
+        pages.append(pages[0])
+        out = os.path.join(self.tmp.name, "book.pdf")
+        with mock.patch("core.plugins.download.utils.Image.open", wraps=Image.open) as opened:
+            self.assertTrue(create_pdf(pages, out, "t", "a"))
+        self.assertEqual(opened.call_count, len(pages))
+        with open(out, "rb") as f:
+            self.assertIn(b"/Count 4", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import codecs
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import text_sections
+from core.text_sections import _heading, detect_encoding, read_section, scan_sections
+
+
+class HeadingTest(unittest.TestCase):
+    def test_chapter_headings(self):
+        for line in ["第一章", "第一章 初入江湖", "第一章初入江湖", "第12回：大战", "第三节", "第二卷　风起",
+                     "序章", "楔子", "Chapter 3 The End", "  第五话 再会  "]:
+            self.assertTrue(_heading(line), line)
+        self.assertEqual(_heading("[chapter:番外篇]"), "番外篇")
+
+    def test_prose_is_not_a_heading(self):
+        for line in ["第一回合他输了。", "第十节课开始了", "第一部电影很好看。", "第二集中营", "", "他说第一章很好看",
+                     "第一章 " + "长" * 80]:
+            self.assertEqual(_heading(line), "", line)
+
+
+class ScanSectionsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "book.txt")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, text, encoding="utf-8", bom=b""):
+        with open(self.path, "wb") as f:
+            f.write(bom + text.encode(encoding))
+
+    def _read_all(self, sections, encoding):
+        return [read_section(self.path, offset, length, encoding) for _, offset, length in sections]
+
+    def test_utf8_bom(self):
+        self._write("简介\n第一章 开始\n正文一\n第二章 结束\n正文二\n", bom=codecs.BOM_UTF8)
+        encoding = detect_encoding(self.path)
+        self.assertEqual(encoding, "utf-8-sig")
+        sections = scan_sections(self.path, encoding)
+        self.assertEqual([s[0] for s in sections], ["开头", "第一章 开始", "第二章 结束"])
+        # 各章首尾相接，覆盖整个文件
+        self.assertEqual(sections[0][1], 0)
+        self.assertEqual(sum(s[2] for s in sections), os.path.getsize(self.path))
+        self.assertEqual(self._read_all(sections, encoding)[2], "第二章 结束\n正文二\n")
+
+    def test_heading_on_first_line_after_bom(self):
+        self._write("第一章 开始\n正文\n", bom=codecs.BOM_UTF8)
+        sections = scan_sections(self.path, "utf-8-sig")
+        self.assertEqual([s[0] for s in sections], ["第一章 开始"])
+
+    def test_gb18030(self):
+        text = "第一章 风起\n天色渐暗。\n第二章 云涌\n第一回合他输了。\n"
+        self._write(text, encoding="gb18030")
+        encoding = detect_encoding(self.path)
+        self.assertEqual(encoding, "gb18030")
+        sections = scan_sections(self.path, encoding)
+        self.assertEqual([s[0] for s in sections], ["第一章 风起", "第二章 云涌"])
+        self.assertEqual("".join(self._read_all(sections, encoding)), text)
+
+    def test_no_heading_falls_back_to_fixed_chunks(self):
+        line = "没有章节标题的一行正文。\n"
+        self._write(line * 200)
+        with mock.patch.object(text_sections, "FALLBACK_CHUNK_BYTES", 1000):
+            sections = scan_sections(self.path, "utf-8")
+        self.assertGreater(len(sections), 1)
+        self.assertEqual(sections[0][0], "第 1 部分")
+        self.assertEqual(sum(s[2] for s in sections), os.path.getsize(self.path))
+        # 切分点落在行边界上
+        for chunk in self._read_all(sections, "utf-8"):
+            self.assertTrue(chunk.endswith("\n"))
+            self.assertEqual(chunk, line * (len(chunk) // len(line)))
+
+    def test_read_section_replaces_broken_bytes(self):
+        self._write("第一章\n中文\n")
+        # 从多字节字符中间开始读不抛异常
+        self.assertIn("�", read_section(self.path, len("第一章\n".encode()) + 1, 5, "utf-8"))
+
+
+if __name__ == "__main__":
+    unittest.main()